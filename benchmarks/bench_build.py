@@ -0,0 +1,140 @@
+"""
+end-to-end benchmark for the naming, table-building, and loading stages
+of the grassius build, using synthetic inputs (see synthetic_data.py)
+
+database stages require a postgres server with the chado schema loaded,
+given with --conn-str. The server is only a stand-in, because the benchmark
+deletes all features before each run. Without --conn-str, only the stages
+that do not use the database are measured.
+
+results for each size are saved to a json file, with one entry per stage
+(wall time, cpu time, peak memory, rows per second) and all nested spans,
+so that scaling can be charted.
+
+usage: python benchmarks/bench_build.py [--conn-str STR] [--output PATH] [n_transcripts ...]
+e.g.   python benchmarks/bench_build.py 1000 10000 100000
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import psycopg2
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# local imports
+from gdb.instrumentation import span, get_finished_spans, clear_finished_spans
+from gdb.fasta import get_transcript_gene_dict, GeneVersionIndex
+from gdb.hmmer import get_family_criteria
+from gdb.grassius import *
+from gdb.chado import ChadoBuilder
+from synthetic_data import write_synthetic_inputs, use_synthetic_inputs, get_synthetic_gene_families
+
+
+def run_benchmark( n_transcripts, conn_str=None ):
+    """
+    Run all stages once with synthetic inputs of the given size
+
+    return a dictionary with keys "n_transcripts", "stages", and "spans"
+    """
+    folder = tempfile.mkdtemp()
+    try:
+        clear_finished_spans()
+
+        with span("generate inputs"):
+            paths = write_synthetic_inputs( folder, n_transcripts )
+        use_synthetic_inputs( paths )
+
+        with span("load inputs"):
+            old_grassius_names = get_old_grassius_names()
+            old_grassius_tfomes = get_old_grassius_tfomes()
+            mgdb_assoc = get_maizegdb_associations()
+            transcript_genes = get_transcript_gene_dict( paths["maize_v5_proteins"] )
+            family_criteria_df = get_family_criteria()
+            family_desc_df = get_family_descriptions()
+            domain_descriptions = get_domain_descriptions()
+            domain_annotations = get_domain_annotations()
+            gene_interactions = pd.read_excel( paths["gene_interactions"] )
+            gene_families = get_synthetic_gene_families( paths )
+
+        with span("naming"):
+            protein_names = assign_protein_names( gene_families, old_grassius_names, mgdb_assoc )
+
+        with span("metadata"):
+            metadata = protein_names.copy()
+            categories = dict(zip( family_criteria_df["GRASSIUS"], family_criteria_df["category"] ))
+            metadata["class"] = [
+                "Orphans" if family == "Orphans" else
+                "Coreg" if categories[family] == "coregulators" else "TF"
+                for family in metadata["family"] ]
+
+        with span("gene versions"):
+            gene_versions = GeneVersionIndex({ v:paths[f"maize_{v}_proteins"] for v in ["v3","v4","v5"] })
+
+        if conn_str is not None:
+            _clear_database( conn_str )
+            cb = ChadoBuilder( conn_str=conn_str )
+
+            with span("table build"):
+                cb.build_grassius_tables( metadata, gene_versions, family_desc_df,
+                                         old_grassius_names, old_grassius_tfomes,
+                                         gene_interactions, domain_descriptions )
+
+            with span("bulk load"), cb.bulk_load():
+                with span("sequence load"):
+                    for version in ["v3","v4","v5"]:
+                        for suffix in ["cdna","proteins"]:
+                            cb.insert_sequences( f"Maize_{version}", metadata,
+                                                paths[f"maize_{version}_{suffix}"],
+                                                is_protein=(suffix=="proteins") )
+
+                with span("annotations"):
+                    cb.insert_secondary_structures()
+                    cb.insert_domain_annotations( domain_annotations )
+
+                with span("tfomes"):
+                    cb.insert_tfomes( old_grassius_tfomes )
+
+        spans = [s.to_dict() for s in get_finished_spans()]
+        return {
+            "n_transcripts": n_transcripts,
+            "stages": { s["name"]:s for s in spans if s["path"] == s["name"] },
+            "spans": spans,
+        }
+
+    finally:
+        shutil.rmtree(folder)
+
+
+def _clear_database( conn_str ):
+    """
+    remove all features, so that sequences will be inserted again
+    """
+    with psycopg2.connect(conn_str) as conn:
+        with conn.cursor() as cur:
+            cur.execute("TRUNCATE feature CASCADE")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser( description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter )
+    parser.add_argument( "sizes", nargs="*", type=int, default=[1000, 10000] )
+    parser.add_argument( "--conn-str", default=None,
+                        help='e.g. "dbname=chado host=localhost user=postgres password=postgres"' )
+    parser.add_argument( "--output", default="bench_build_results.json" )
+    args = parser.parse_args()
+
+    results = []
+    for n in args.sizes:
+        print( f"running build benchmark with {n} transcripts per genome version..." )
+        result = run_benchmark( n, args.conn_str )
+        results.append( result )
+        for name,stage in result["stages"].items():
+            print( f'\t{name:>16}: {stage["wall_time"]:8.2f} s, peak {stage["peak_rss_mb"]:.0f} MB' )
+
+    with open(args.output, "w") as fout:
+        json.dump( {"results":results}, fout, indent=2 )
+    print( "results saved to " + args.output )
@@ -0,0 +1,73 @@
+"""
+benchmark for categorize_all_transcripts() over a synthetic proteome
+
+compares the compiled FamilyRuleEngine with the original approach
+(find_matching_transcripts() once for each rule) and checks that
+both give the same families
+
+usage: python benchmarks/bench_family_criteria.py [n_transcripts]
+"""
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# local imports
+from gdb.hmmer import get_family_criteria, get_relevant_accessions, categorize_all_transcripts, find_matching_transcripts
+
+
+def build_synthetic_acc_dict( family_criteria_df, n_transcripts, seed=0 ):
+    """
+    build a summary of hmmscan results (like get_acc_dict output)
+    where each transcript has 0-5 accessions, mostly relevant to the criteria
+    """
+    rng = random.Random(seed)
+    relevant = sorted(get_relevant_accessions(family_criteria_df))
+    other = [f"PF9{i:04d}" for i in range(500)]
+    result = {}
+    for i in range(n_transcripts):
+        n = rng.randint(0,5)
+        result[f"Zm00001eb{i:06d}_P001"] = [
+            rng.choice(relevant) if rng.random() < 0.7 else rng.choice(other)
+            for _ in range(n)
+        ]
+    return result
+
+
+def categorize_per_rule( acc_dict, family_criteria_df ):
+    """
+    the original approach: one pass over all transcripts for each rule
+    """
+    df = family_criteria_df
+    tids_by_family = {}
+    for row in df.index:
+        required_accs = df.loc[row,"Required"].split(":")
+        forbidden_accs = df.loc[row,"Forbidden"].split(":")
+        family_name = df.loc[row,"GRASSIUS"]
+        family_tids = find_matching_transcripts( acc_dict, required_accs, forbidden_accs )
+        if family_name not in tids_by_family.keys():
+            tids_by_family[family_name] = []
+        tids_by_family[family_name] += family_tids
+    return tids_by_family
+
+
+if __name__ == "__main__":
+    n_transcripts = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    
+    family_criteria_df = get_family_criteria()
+    acc_dict = build_synthetic_acc_dict( family_criteria_df, n_transcripts )
+    
+    t0 = time.perf_counter()
+    expected = categorize_per_rule( acc_dict, family_criteria_df )
+    t1 = time.perf_counter()
+    result = categorize_all_transcripts( acc_dict, family_criteria_df )
+    t2 = time.perf_counter()
+    
+    assert result == expected, "compiled rules gave different families"
+    n_matches = sum(len(tids) for tids in result.values())
+    print( f"{n_transcripts} transcripts, {len(family_criteria_df.index)} rules, {n_matches} matches" )
+    print( f"per-rule evaluation: {t1-t0:.3f} s" )
+    print( f"compiled rules:      {t2-t1:.3f} s" )
@@ -0,0 +1,300 @@
+"""
+microbenchmarks for the input parsers, with a regression gate
+
+each parser is run on fixed synthetic fixtures (the same content every run,
+for a given --size) and its throughput (lines or records per second) and
+peak memory (python allocations, measured with tracemalloc) are reported
+
+the first run with --save-baseline stores the results in a json file.
+later runs compare against the baseline, and exit with status 1 if any
+parser is more than --max-slowdown percent slower. Throughput depends on
+the machine, so the baseline is not shared between machines
+(benchmarks/parser_baseline.json is ignored by git)
+
+this is an opt-in local tool. It is not run by the tests or by CI,
+so save a baseline before making changes and compare afterwards
+
+usage: python benchmarks/bench_parsers.py [--size N] [--repeat N] [--baseline PATH]
+                                          [--save-baseline] [--max-slowdown PCT] [parser names ...]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# local imports
+from gdb.hmmer import read_hmmscan_output
+from gdb.blast import read_blast_output
+from gdb.grassius import get_maizegdb_associations, get_maize_v3_uniprot_ids
+from gdb.itak import read_itak_output
+from gdb.fasta import *
+from synthetic_data import write_synthetic_inputs, use_synthetic_inputs, version_id_formats
+
+
+default_baseline_path = os.path.join(os.path.dirname(__file__), "parser_baseline.json")
+
+
+def write_parser_fixtures( output_folder, size, seed=0 ):
+    """
+    Write synthetic inputs for all parsers
+
+    The synthetic inputs from write_synthetic_inputs() are used where
+    possible, and hmmscan, blast, and itak outputs are added
+
+    return a dictionary where keys are fixture names, values are file or folder paths
+
+    Arguments:
+    ----------
+    output_folder -- (str) an existing folder where files will be created
+    size -- (int) the number of transcripts for each genome version
+    seed -- (optional) (int) seed for the random number generator
+    """
+
+    rng = random.Random(seed)
+    paths = write_synthetic_inputs( output_folder, size, seed=seed )
+    pid_fmt = version_id_formats["v5"][1]
+
+    # hmmscan --domtblout output, with about 2 domains per transcript
+    paths["hmmscan_output"] = os.path.join( output_folder, "hmmscan.domtblout" )
+    with open( paths["hmmscan_output"], "w" ) as fout:
+        fout.write( "#                                                                            --- full sequence --- -------------- this domain -------------   hmm coord   ali coord   env coord\n" )
+        fout.write( "# target name        accession   tlen query name           accession   qlen   E-value  score  bias   #  of  c-Evalue  i-Evalue  score  bias  from    to  from    to  from    to  acc description of target\n" )
+        fout.write( "#------------------- ---------- ----- -------------------- ---------- ----- --------- ------ ----- --- --- --------- --------- ------ ----- ----- ----- ----- ----- ----- ----- ---- ---------------------\n" )
+        for i in range(size*2):
+            tid = pid_fmt.format(i//4, i%2+1)
+            acc = rng.randrange(1000)
+            start = rng.randint(1,200)
+            fout.write( " ".join([ f"domain_{acc}", f"PF{acc:05d}.{rng.randint(1,20)}", "60", tid, "-", "350",
+                f"{rng.random():.1e}", f"{rng.uniform(5,200):.1f}", "0.1", "1", "1", f"{rng.random():.1e}",
+                f"{rng.random():.1e}", f"{rng.uniform(5,200):.1f}", "0.1", "1", "59", str(start), str(start+58),
+                str(start), str(start+58), "0.95", "synthetic domain description"]) + "\n" )
+        fout.write( "#\n# Program:         hmmscan\n# [ok]\n" )
+
+    # blastn output with several hits per query
+    paths["blast_output"] = os.path.join( output_folder, "blast_output.txt" )
+    with open( paths["blast_output"], "w" ) as fout:
+        fout.write( "BLASTN 2.9.0+\n\n\nDatabase: synthetic.fa\n           10 sequences; 2,000,000,000 total letters\n\n\n\n" )
+        for q in range(size//4):
+            fout.write( f"Query= q{q}\nLength=60\n\n" )
+            for h in range(rng.randint(0,4)):
+                start = rng.randint(1,10**8)
+                fout.write( f">chr{rng.randint(1,10)}\nLength=200000000\n\n" )
+                fout.write( " Score = 37.4 bits (40),  Expect = 1e-05\n" )
+                fout.write( f" Identities = 55/60 ({rng.randint(80,100)}%), Gaps = 0/60 (0%)\n Strand=Plus/Plus\n\n" )
+                for k in range(2):
+                    seq = "".join(rng.choices("ACGT", k=30))
+                    fout.write( f"Query  {k*30+1}    {seq}  {k*30+30}\n" )
+                    fout.write( f"            {'|'*30}\n" )
+                    fout.write( f"Sbjct  {start+k*30}  {seq}  {start+k*30+29}\n\n" )
+            fout.write( "\n\nLambda      K        H\n    1.33    0.621     1.12\n\nEffective search space used: 18000\n\n\n" )
+        fout.write( "  Database: synthetic.fa\n  Number of sequences in database:  10\n" )
+
+    # itak output folder, where most transcripts are in the traditional output
+    folder = os.path.join( output_folder, "itak_output" )
+    os.makedirs( folder )
+    paths["itak_output"] = folder
+    families = [f"FAM{i}" for i in range(50)]
+    with open( os.path.join(folder,"tf_all_matches.txt"), "w" ) as fall, \
+            open( os.path.join(folder,"tf_classification.txt"), "w" ) as fcls:
+        for i in range(size):
+            tid = pid_fmt.format(i//2, i%2+1)
+            matches = rng.sample(families, rng.randint(1,3))
+            for family in matches:
+                fall.write( f"{tid}\t{family}\tTF\n" )
+            if rng.random() < 0.9:
+                fcls.write( f"{tid}\t{matches[0]}\tTF\n" )
+
+    return paths
+
+
+def get_parser_benchmarks( paths ):
+    """
+    Get the parsers to measure, with the amount of input that they process
+
+    return a dictionary where keys are benchmark names, values are
+    (function, n_units, unit) tuples. function is called with no arguments
+
+    Arguments:
+    ----------
+    paths -- (dict) output from write_parser_fixtures()
+    """
+
+    v4_proteins = paths["maize_v4_proteins"]
+    n_records = _count_lines( v4_proteins, ">" )
+    some_genes = set(list(get_all_gene_ids(v4_proteins))[::10])
+    split_folder = os.path.join( os.path.dirname(v4_proteins), "split" )
+    itak_folder = paths["itak_output"]
+
+    def split():
+        if os.path.exists(split_folder):
+            shutil.rmtree(split_folder)
+        os.makedirs(split_folder)
+        split_fasta( v4_proteins, 4, split_folder )
+
+    return {
+        "read_hmmscan_output": ( lambda: read_hmmscan_output(paths["hmmscan_output"]),
+                                 _count_lines(paths["hmmscan_output"]), "lines" ),
+        "read_blast_output": ( lambda: read_blast_output(paths["blast_output"]),
+                               _count_lines(paths["blast_output"]), "lines" ),
+        "get_maizegdb_associations": ( get_maizegdb_associations,
+                                       _count_lines(paths["maizegdb_gene_id_associations"]), "lines" ),
+        "get_maize_v3_uniprot_ids": ( get_maize_v3_uniprot_ids,
+                                      _count_lines(paths["maize_v3_gff3"]), "lines" ),
+        "read_itak_output": ( lambda: read_itak_output(itak_folder),
+                              _count_lines(os.path.join(itak_folder,"tf_all_matches.txt"))
+                              + _count_lines(os.path.join(itak_folder,"tf_classification.txt")), "lines" ),
+        "get_transcript_gene_dict": ( lambda: get_transcript_gene_dict(v4_proteins), n_records, "records" ),
+        "get_gene_transcript_dict": ( lambda: get_gene_transcript_dict(v4_proteins), n_records, "records" ),
+        "get_all_gene_ids": ( lambda: get_all_gene_ids(v4_proteins), n_records, "records" ),
+        "read_records_for_gene_ids": ( lambda: list(read_records_for_gene_ids(v4_proteins, some_genes)),
+                                       n_records, "records" ),
+        "split_fasta": ( split, n_records, "records" ),
+    }
+
+
+def measure( func, n_units, repeat ):
+    """
+    Measure the throughput and peak memory of one parser
+
+    The fastest of several runs is used for throughput, and one
+    separate run with tracemalloc is used for memory, so that
+    tracing does not affect the timing
+
+    return a dictionary with keys "best_time", "throughput", "peak_memory_mb"
+    """
+
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append( time.perf_counter() - start )
+
+    tracemalloc.start()
+    try:
+        func()
+        _,peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    best = min(times)
+    return {
+        "best_time": best,
+        "throughput": n_units / best,
+        "peak_memory_mb": peak / (1<<20),
+    }
+
+
+def find_regressions( results, baseline, max_slowdown ):
+    """
+    Compare results with a baseline
+
+    return a list of messages, one for each parser that is
+    more than max_slowdown percent slower than the baseline
+
+    Arguments:
+    ----------
+    results -- (dict) output from run_benchmarks()
+    baseline -- (dict) output from run_benchmarks(), from an earlier run
+    max_slowdown -- (float) the allowed slowdown in percent
+    """
+
+    if results["size"] != baseline["size"]:
+        raise Exception( f'baseline was measured with --size {baseline["size"]}, not {results["size"]}' )
+
+    messages = []
+    for name,result in results["parsers"].items():
+        if name not in baseline["parsers"].keys():
+            continue
+        old_rate = baseline["parsers"][name]["throughput"]
+        slowdown = (old_rate / result["throughput"] - 1) * 100
+        if slowdown > max_slowdown:
+            messages.append( f'{name} is {slowdown:.0f}% slower than the baseline '
+                             f'({result["throughput"]:.0f} vs {old_rate:.0f} {result["unit"]}/s)' )
+    return messages
+
+
+def run_benchmarks( size, repeat, names=None ):
+    """
+    Write fixtures and measure all parsers (or the given parsers)
+
+    return a json-compatible dictionary
+    """
+
+    folder = tempfile.mkdtemp()
+    try:
+        paths = write_parser_fixtures( folder, size )
+        use_synthetic_inputs( paths )
+        benchmarks = get_parser_benchmarks( paths )
+        if names is None:
+            names = list(benchmarks.keys())
+
+        results = {}
+        for name in names:
+            if name not in benchmarks.keys():
+                raise Exception( f'unrecognized parser benchmark "{name}"' )
+            func,n_units,unit = benchmarks[name]
+            results[name] = { "units": n_units, "unit": unit, **measure(func, n_units, repeat) }
+            r = results[name]
+            print( f'\t{name:>26}: {r["throughput"]:12.0f} {unit}/s, peak {r["peak_memory_mb"]:7.1f} MB' )
+
+        return {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "size": size,
+            "parsers": results,
+        }
+
+    finally:
+        shutil.rmtree(folder)
+
+
+def _count_lines( path, prefix=None ):
+    """
+    used in get_parser_benchmarks()
+    """
+    with open(path) as fin:
+        if prefix is None:
+            return sum(1 for line in fin)
+        return sum(1 for line in fin if line.startswith(prefix))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser( description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter )
+    parser.add_argument( "names", nargs="*", help="parsers to measure (default all)" )
+    parser.add_argument( "--size", type=int, default=20000, help="transcripts per genome version in the fixtures" )
+    parser.add_argument( "--repeat", type=int, default=3 )
+    parser.add_argument( "--baseline", default=default_baseline_path )
+    parser.add_argument( "--save-baseline", action="store_true", help="replace the baseline with these results" )
+    parser.add_argument( "--max-slowdown", type=float, default=20, help="allowed slowdown in percent" )
+    args = parser.parse_args()
+
+    print( f"measuring parsers with fixture size {args.size}..." )
+    results = run_benchmarks( args.size, args.repeat, args.names or None )
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as fout:
+            json.dump( results, fout, indent=2 )
+        print( "baseline saved to " + args.baseline )
+
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as fin:
+            baseline = json.load(fin)
+        messages = find_regressions( results, baseline, args.max_slowdown )
+        for message in messages:
+            print( "REGRESSION: " + message )
+        if len(messages) > 0:
+            sys.exit(1)
+        print( f"no parser is more than {args.max_slowdown:.0f}% slower than the baseline" )
+
+    else:
+        print( "no baseline found at " + args.baseline + ", use --save-baseline to create one" )
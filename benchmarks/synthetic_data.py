@@ -0,0 +1,252 @@
+"""
+generator for scaled synthetic inputs, for measuring build performance
+without the private inputs or the public multi-GB genomes
+
+the generated files have the same formats as the real inputs (see inputs/input_list.csv),
+and may be used in place of them with use_synthetic_inputs()
+
+usage: python benchmarks/synthetic_data.py output_folder [n_transcripts]
+"""
+
+import os
+import sys
+import gzip
+import json
+import random
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# local imports
+from gdb import InputManager
+
+
+# gene and transcript ID formats for each genome version
+# (gene_id, protein transcript_id, cdna transcript_id)
+version_id_formats = {
+    "v3": ("GRMZM2G{0:06d}", "GRMZM2G{0:06d}_P{1:02d}", "GRMZM2G{0:06d}_T{1:02d}"),
+    "v4": ("Zm00001d{0:06d}", "Zm00001d{0:06d}_P{1:03d}", "Zm00001d{0:06d}_T{1:03d}"),
+    "v5": ("Zm00001eb{0:06d}", "Zm00001eb{0:06d}_P{1:03d}", "Zm00001eb{0:06d}_T{1:03d}"),
+}
+
+amino_acids = "ACDEFGHIKLMNPQRSTVWY"
+nucleotides = "ACGT"
+
+
+def write_synthetic_inputs( output_folder, n_transcripts, n_families=50,
+                            mean_protein_length=300, seed=0 ):
+    """
+    Write a full set of synthetic inputs
+
+    Each genome version has n_transcripts transcripts, with two transcripts per gene.
+    Gene number i is associated across versions (e.g. GRMZM2G000001,
+    Zm00001d000001, and Zm00001eb000001)
+
+    return a dictionary where keys are input names, values are file paths
+
+    Arguments:
+    ----------
+    output_folder -- (str) an existing folder where files will be created
+    n_transcripts -- (int) the number of transcripts for each genome version
+    n_families -- (optional) (int) the number of transcription factor families
+    mean_protein_length -- (optional) (int) the average length of protein sequences
+    seed -- (optional) (int) seed for the random number generator
+    """
+
+    rng = random.Random(seed)
+    n_genes = max(1, n_transcripts // 2)
+    families = [_get_family_name(i) for i in range(n_families)]
+    paths = {}
+
+    def path( name, filename ):
+        paths[name] = os.path.join( output_folder, filename )
+        return paths[name]
+
+    # fasta files for each genome version
+    for version,(gid_fmt,pid_fmt,tid_fmt) in version_id_formats.items():
+        with open( path(f"maize_{version}_proteins", f"{version}_proteins.fa"), "w" ) as fprot, \
+                open( path(f"maize_{version}_cdna", f"{version}_cdna.fa"), "w" ) as fcdna:
+            for i in range(n_transcripts):
+                g,t = i//2, i%2+1
+                gid,pid,tid = gid_fmt.format(g), pid_fmt.format(g,t), tid_fmt.format(g,t)
+                length = rng.randint( mean_protein_length//2, mean_protein_length*3//2 )
+                protein = "".join(rng.choices(amino_acids, k=length))
+                cdna = "".join(rng.choices(nucleotides, k=length*3))
+                if version == "v5":
+                    fprot.write( f">{pid}\n" )
+                    fcdna.write( f">{tid}\n" )
+                else:
+                    fprot.write( f">{pid} pep gene:{gid} transcript:{tid}\n" )
+                    fcdna.write( f">{tid} cdna gene:{gid}\n" )
+                for seq,fout in [(protein,fprot),(cdna,fcdna)]:
+                    for j in range(0, len(seq), 60):
+                        fout.write( seq[j:j+60] + "\n" )
+
+    # maizegdb gene id associations
+    with open( path("maizegdb_gene_id_associations", "pangene.tsv"), "w" ) as fout:
+        fout.write( "pan_gene\tB73v3\tB73v4\tB73v5\n" )
+        for g in range(n_genes):
+            ids = [f"B73v3_{version_id_formats['v3'][0].format(g)}",
+                   version_id_formats['v4'][0].format(g),
+                   version_id_formats['v5'][0].format(g)]
+            fout.write( "\t".join([f"pan_gene_{g}"] + ids) + "\n" )
+
+    # old grassius names for 10% of genes, and a few orphans
+    rows = []
+    for g in rng.sample(range(n_genes), max(1, n_genes//10)):
+        family = "Orphans" if rng.random() < 0.05 else rng.choice(families)
+        rows.append({
+            "class": "TF", "family": family,
+            "name": f"Zm{family}_{len(rows)+1}", "accepted": "yes", "synonym": "",
+            "v3_id": version_id_formats['v3'][0].format(g),
+        })
+    pd.DataFrame(rows).to_excel( path("old_grassius_names", "old_grassius_names.xlsx"), index=False )
+
+    # family rules and descriptions
+    pd.DataFrame({
+        "GRASSIUS": families,
+        "Required": [f"PF{i:05d}#1" for i in range(n_families)],
+        "Forbidden": [f"PF{i+1:05d}#1" if i%5 == 0 else "" for i in range(n_families)],
+        "category": ["coregulators" if i%4 == 0 else "TF" for i in range(n_families)],
+    }).to_excel( path("family_rules", "family_rules.xlsx"), index=False )
+    pd.DataFrame({
+        "familyname": families,
+        "abbr": [f"F{i}" for i in range(n_families)],
+        "category": ["TF"] * n_families,
+        "description": [f"description of family {f}" for f in families],
+    }).to_csv( path("family_descriptions", "family_descriptions.csv"), index=False )
+
+    # tfomes for 1% of v3 genes
+    tfome_columns = ['vector', 'insert_gene_bank_id',
+            'five_prime_name', 'five_prime_seq', 'five_prime_temp',
+            'three_prime_name', 'three_prime_seq', 'three_prime_temp',
+            'pcr_condition', 'request_info', 'notes','template']
+    rows = []
+    for g in rng.sample(range(n_genes), max(1, n_genes//100)):
+        length = rng.randint( mean_protein_length//2, mean_protein_length*3//2 )
+        row = {
+            "utname": f"UT{len(rows)+1:05d}",
+            "gene_id": version_id_formats['v3'][0].format(g),
+            "transcript_number": "T01",
+            "sequence": "".join(rng.choices(nucleotides, k=length*3)),
+            "translation": "".join(rng.choices(amino_acids, k=length)),
+        }
+        row.update({ c:"" for c in tfome_columns })
+        rows.append(row)
+    pd.DataFrame(rows).to_csv( path("old_grassius_tfomes", "tfomes.txt"), sep="\t", index=False )
+
+    # domain annotations for 30% of v5 proteins
+    annotations = {}
+    for i in range(0, n_transcripts, 3):
+        acc = f"PF{rng.randrange(n_families):05d}.1"
+        start = rng.randint(1, mean_protein_length//2)
+        annotations[version_id_formats['v5'][1].format(i//2, i%2+1)] = [{
+            "@name": f"domain_{acc}", "@acc": acc,
+            "domains": [{"@alisqfrom": str(start), "@alisqto": str(start+50)}],
+        }]
+    with gzip.open( path("domain_annotations", "domain_annotations.json.gz"), "wt" ) as fout:
+        json.dump( annotations, fout )
+    pd.DataFrame({
+        "accession": [f"PF{i:05d}" for i in range(n_families)],
+        "title": [f"domain {i}" for i in range(n_families)],
+        "description": [f"description of domain {i}" for i in range(n_families)],
+    }).to_csv( path("domain_descriptions", "domain_descriptions.csv"), index=False )
+
+    # secondary structures for 10% of v5 proteins
+    with open( path("secondary_structures", "secondary_structures.csv"), "w" ) as fout:
+        for i in range(0, n_transcripts, 10):
+            tid = version_id_formats['v5'][1].format(i//2, i%2+1)
+            fout.write( f'{tid},"<span>{"".join(rng.choices("HEC", k=40))}</span>"\n' )
+
+    # uniprot ids in v3 gene annotations
+    with open( path("maize_v3_gff3", "v3.gff3"), "w" ) as fout:
+        fout.write( "##gff-version 3\n" )
+        for g in range(n_genes):
+            gid = version_id_formats['v3'][0].format(g)
+            fout.write( "\t".join(["1", "synthetic", "gene", str(g*1000+1), str(g*1000+900), ".", "+", ".",
+                f"ID=gene:{gid};biotype=protein_coding;description=synthetic [Source:UniProtKB/TrEMBL%3BAcc:U{g:06d}]"]) + "\n" )
+
+    # gene interactions between pairs of genes with old names
+    gids = [version_id_formats['v3'][0].format(g) for g in range(n_genes)]
+    pd.DataFrame({
+        "gene Locus ": rng.choices(gids, k=max(1, n_genes//20)),
+        "target locus": rng.choices(gids, k=max(1, n_genes//20)),
+        "pubmed ID": [12345] * max(1, n_genes//20),
+        "Interaction type": ["TF-target"] * max(1, n_genes//20),
+        "experiment": ["ChIP-seq"] * max(1, n_genes//20),
+    }).to_excel( path("gene_interactions", "gene_interactions.xlsx"), index=False )
+
+    # species descriptions
+    pd.DataFrame({
+        "common_name": ["Maize"],
+        "description": ["synthetic maize"],
+    }).to_csv( path("species_descriptions", "species_descriptions.csv"), index=False )
+
+    return paths
+
+
+def _get_family_name( i ):
+    """
+    get a unique family name, where the first three letters are also unique,
+    so that new protein name prefixes will not conflict
+
+    used in write_synthetic_inputs()
+    """
+    letters = [chr(ord("A") + (i // 26**k) % 26) for k in [2,1,0]]
+    return "".join(letters) + "fam"
+
+
+def use_synthetic_inputs( paths ):
+    """
+    Make all instances of InputManager use the given synthetic inputs
+
+    Arguments:
+    ----------
+    paths -- (dict) output from write_synthetic_inputs()
+    """
+    for name,path in paths.items():
+        InputManager.set_override( name, path )
+
+
+def get_synthetic_gene_families( paths ):
+    """
+    Get an assignment of families for the synthetic v5 genes,
+    in the form of gdb.itak.get_gene_families() output
+
+    About 5% of genes are assigned to a family.
+    Genes with old grassius names keep their old family
+
+    Arguments:
+    ----------
+    paths -- (dict) output from write_synthetic_inputs()
+    """
+    old_names = pd.read_excel( paths["old_grassius_names"] )
+    families = list(pd.read_excel( paths["family_rules"] )["GRASSIUS"])
+    old_families = dict(zip( old_names["v3_id"].str[len("GRMZM2G"):].astype(int), old_names["family"] ))
+
+    with open( paths["maizegdb_gene_id_associations"] ) as fin:
+        n_genes = sum(1 for line in fin) - 1
+    rows = []
+    for g in range(n_genes):
+        if g in old_families.keys():
+            family = old_families[g]
+            if family == "Orphans":
+                continue
+        elif g % 20 == 0:
+            family = families[g % len(families)]
+        else:
+            continue
+        gid = version_id_formats["v5"][0].format(g)
+        rows.append({ "gene_id": gid, "family": family,
+                     "transcript_id": version_id_formats["v5"][1].format(g,1) })
+    df = pd.DataFrame(rows, columns=["gene_id","family","transcript_id"])
+    df.index = df["gene_id"].values
+    return df
+
+
+if __name__ == "__main__":
+    output_folder = sys.argv[1]
+    n_transcripts = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    os.makedirs( output_folder, exist_ok=True )
+    for name,path in write_synthetic_inputs( output_folder, n_transcripts ).items():
+        print( f"{name}: {path}" )
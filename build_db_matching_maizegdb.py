@@ -24,10 +24,12 @@ raise Exception("test")
             
     
 # insert sequences from fasta files
-for version in ["v3","v4","v5"]:
-    organism = f"Maize_{version}"
-    fasta_filepath = im[f"maize_{version}_cdna"]
-    cb.insert_sequences( organism, metadata_df, fasta_filepath, is_protein=False )
+# (indexes and foreign keys are rebuilt once, after loading)
+with cb.bulk_load():
+    for version in ["v3","v4","v5"]:
+        organism = f"Maize_{version}"
+        fasta_filepath = im[f"maize_{version}_cdna"]
+        cb.insert_sequences( organism, metadata_df, fasta_filepath, is_protein=False )
 
 
 # save a snapshot of the database that was built
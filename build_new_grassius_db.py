@@ -1,13 +1,22 @@
 """
 build a database compatible with the grassius website
 using new protein naming pipeline discussed Mar31-2022
+
+the build is split into stages (see gdb/pipeline.py). Stages are only
+re-run when their code, the library modules they list, or their inputs
+have changed, and independent stages are run at the same time. Database stages are the exception: they are
+not idempotent, so every run builds the database from scratch.
+
+usage:
+    python build_new_grassius_db.py [stage names...]
+
+with no arguments, all stages are run.
+Otherwise only the given stages (and the stages they depend on) are run.
 """
 
-import tempfile
-import shutil
-import os
-import pickle
+import sys
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 
 # local imports
 import gdb
@@ -16,177 +25,268 @@ from gdb.hmmer import *
 from gdb.itak import *
 from gdb.grassius import *
 from gdb.chado import *
+from gdb.chado.chado_builder import default_port
+from gdb.patches import apply_all_patches
 
 
 im = gdb.InputManager()
-old_grassius_names = get_old_grassius_names()
-old_grassius_tfomes = get_old_grassius_tfomes()
-mgdb_assoc = get_maizegdb_associations()
-transcript_genes = get_transcript_gene_dict( im['maize_v5_proteins'] )
-gene_interactions = pd.read_excel(im['gene_interactions'])
-domain_descriptions = get_domain_descriptions()
-domain_annotations = get_domain_annotations()
-    
+pipeline = gdb.Pipeline("build_new_grassius_db")
 
-# load family criteria and descriptions
-family_criteria_df = get_family_criteria()
-family_desc_df = get_family_descriptions()
 
+# input files
+# each stage that reads an input should list it as an argument,
+# so that the stage will be re-run if the input changes
+for name in ['old_grassius_names', 'old_grassius_tfomes',
+             'maizegdb_gene_id_associations', 'gene_interactions',
+             'domain_descriptions', 'domain_annotations', 'family_rules',
+             'family_descriptions', 'secondary_structures',
+             'pfam_hmm', 'selfbuild_hmm', 'itak_git_repo']:
+    pipeline.add_file( name + "_path", im[name] )
+for version in ['v3','v4','v5']:
+    for suffix in ['cdna','proteins']:
+        name = f'maize_{version}_{suffix}'
+        pipeline.add_file( name + "_path", im[name] )
 
-# compare new family names with old family names
-#old_df = pd.read_excel( im['old_grassius_names'] )
-#old_df = old_df[old_df['family'] != 'Orphans']
-#old_families = set(old_df['family'])
-#new_families = set(family_criteria_df["GRASSIUS"])
 
-if False:
-    # build subset of maize v3 protein fasta
-    # containing only genes that where myb-related in old grassius
-    df = old_grassius_names
-    mybr_gene_ids = df.loc[ df['family']=='MYB-related', 'v3_id' ].values
-    with open('test.fa','w') as fout:
-        for rec in read_records_for_gene_ids( im['maize_v3_proteins'], mybr_gene_ids ):
-            fout.write( ">{0}\n{1}\n".format( rec.id, str(rec.seq) ) )
+# library modules called by stages
+# each stage lists the modules it calls with "depends", so that
+# the stage will be re-run if their code changes
+grassius_code = [gdb.grassius.grassius_util]
+fasta_code = [gdb.fasta.fasta_util]
+family_criteria_code = [gdb.hmmer.family_criteria, gdb.hmmer.family_rule_engine]
+itak_code = [gdb.itak.itak_runner, gdb.itak.itak_util, gdb.itak.itak_database,
+             gdb.hmmer.hmmer_util, gdb.hmmer.hmm_index, gdb.fasta.fasta_util]
 
-    raise Exception('test')
 
-if False:
-    
+# input prep
+
+@pipeline.stage( depends=grassius_code )
+def old_grassius_names( old_grassius_names_path ):
+    return get_old_grassius_names()
+
+@pipeline.stage( depends=grassius_code )
+def old_grassius_tfomes( old_grassius_tfomes_path ):
+    return get_old_grassius_tfomes()
+
+@pipeline.stage( depends=grassius_code )
+def mgdb_assoc( maizegdb_gene_id_associations_path ):
+    return get_maizegdb_associations()
+
+@pipeline.stage( depends=fasta_code )
+def transcript_genes( maize_v5_proteins_path ):
+    return get_transcript_gene_dict( maize_v5_proteins_path )
+
+@pipeline.stage()
+def gene_interactions( gene_interactions_path ):
+    return pd.read_excel( gene_interactions_path )
+
+@pipeline.stage( depends=grassius_code )
+def domain_descriptions( domain_descriptions_path ):
+    return get_domain_descriptions()
+
+@pipeline.stage( depends=grassius_code )
+def domain_annotations( domain_annotations_path ):
+    return get_domain_annotations()
+
+@pipeline.stage( depends=family_criteria_code )
+def family_criteria_df( family_rules_path ):
+    return get_family_criteria()
+
+@pipeline.stage( depends=grassius_code )
+def family_desc_df( family_descriptions_path ):
+    return get_family_descriptions()
+
+
+# itak
+
+@pipeline.stage( depends=itak_code + family_criteria_code )
+def itak_results( family_criteria_df, pfam_hmm_path, selfbuild_hmm_path,
+                  itak_git_repo_path, maize_v5_proteins_path ):
+
     # run itak with all rules
     desired_accessions = get_relevant_accessions(family_criteria_df)
-    build_minified_hmm( im["pfam_hmm"], desired_accessions, "pfam_min.hmm" )
-    concatenate_hmms( ["pfam_min.hmm",im["selfbuild_hmm"]], "combined.hmm" )
-    ir = ItakRunner(reset=True)
+    build_minified_hmm( pfam_hmm_path, desired_accessions, "pfam_min.hmm" )
+    concatenate_hmms( ["pfam_min.hmm",selfbuild_hmm_path], "combined.hmm" )
+    ir = ItakRunner()
     ir.set_database( "combined.hmm", family_criteria_df )
-    itak_results = ir.run_itak( 'test.fa' )
-    #itak_results = ir.run_itak( im["maize_v3_proteins"] )
-
-    # save results
-    itak_results.to_csv("itak_results.txt", sep="\t", index=False)
-
-    raise Exception('test')
-
-# load results as if we had just run iTAK (above)
-itak_results = pd.read_csv('applied_rules.csv')
-
-# based on iTAK results, pick one family for each transcript
-# give certain families priority
-# give MYB-Related priority over ARR-B and MYB
-# except for cases where there is agreement with old grassius
-all_transcripts = set(itak_results['transcript_id'])
-transcript_families = {}
-priority_families = ['AP2/ERF-AP2','MYB']
-df = old_grassius_names
-old_myb_gids = df.loc[ df['family']=='MYB', 'v3_id' ].values
-old_arrb_gids = df.loc[ df['family']=='ARR-B', 'v3_id' ].values
-for tid in all_transcripts:
-    matched_families = itak_results.loc[
-            itak_results['transcript_id'] == tid,
-            'family'].values
-    gid = transcript_genes[tid]
-    matching_priority_families = [fam for fam in priority_families if fam in matched_families]
-    
-    # check for special cases
-    if ('MYB' in matched_families) and (gid in old_myb_gids):
-        transcript_families[tid] = 'MYB'
-    elif ('ARR-B' in matched_families) and (gid in old_arrb_gids):
-        transcript_families[tid] = 'ARR-B'
-        
-    # check for prioritized families
-    elif len(matching_priority_families) > 0:
-        transcript_families[tid] = matching_priority_families[0]
-        
-    # default to an arbitrary matching family
-    else:
-        transcript_families[tid] = list(matched_families)[0]
-        
-# convert itak results (based on transcript IDs)
-# to gene -> family classifications
-gene_families = get_gene_families( transcript_families, transcript_genes, "conflicts.txt" )
-
-
-# set order of RAV family (previously called 'ABI3-VP1')
-# based on old-grassius 'ABI3-VP1' protein names
-# this will effect the suffixes of the new protein names
-df = gene_families
-df1 = df[df['family'] == 'RAV'].copy()
-df2 = df[df['family'] != 'RAV'].copy()
-for row in df1.index:
-    gid = df1.loc[row,"gene_id"]
-    old_match = old_grassius_names[old_grassius_names["v3_id"] == gid]
-    
-    if len(old_match.index) == 0:
-        order = 9999
-    else:
-        old_family = old_match['family'].values[0]
-        if old_family != 'ABI3-VP1':
+    return ir.run_itak( maize_v5_proteins_path, deduplicate=True )
+
+
+# family resolution
+
+# report files are declared as outputs, so they are written
+# again when a stage is skipped (see Pipeline.stage)
+
+@pipeline.stage( depends=[gdb.itak.itak_util],
+                 outputs=["conflicts.txt", "gene_families.csv"] )
+def gene_families( itak_results, transcript_genes, old_grassius_names ):
+
+    # based on iTAK results, pick one family for each transcript
+    # give certain families priority
+    # give MYB-Related priority over ARR-B and MYB
+    # except for cases where there is agreement with old grassius
+    df = old_grassius_names
+    transcript_families = resolve_transcript_families( itak_results, transcript_genes,
+        priority_families = ['AP2/ERF-AP2','MYB'],
+        special_cases = {
+            'MYB': df.loc[ df['family']=='MYB', 'v3_id' ].values,
+            'ARR-B': df.loc[ df['family']=='ARR-B', 'v3_id' ].values,
+        })
+
+    # convert itak results (based on transcript IDs)
+    # to gene -> family classifications
+    gene_families = get_gene_families( transcript_families, transcript_genes, "conflicts.txt" )
+
+    # set order of RAV family (previously called 'ABI3-VP1')
+    # based on old-grassius 'ABI3-VP1' protein names
+    # this will effect the suffixes of the new protein names
+    df = gene_families
+    df1 = df[df['family'] == 'RAV'].copy()
+    df2 = df[df['family'] != 'RAV'].copy()
+    for row in df1.index:
+        gid = df1.loc[row,"gene_id"]
+        old_match = old_grassius_names[old_grassius_names["v3_id"] == gid]
+
+        if len(old_match.index) == 0:
             order = 9999
         else:
-            order = old_match['suffix'].values[0]
-    df1.loc[row,'order'] = order
-df1 = df1.sort_values('order').drop(columns=['order'])
-gene_families = pd.concat([df1,df2])
-gene_families.sort_values("family").to_csv("gene_families.csv", index=False)
-
-
-# assign protein names
-protein_names = assign_protein_names( gene_families, old_grassius_names, mgdb_assoc, 
-                            report_folder = "." )
-
-
-# build metadata 
-df = protein_names
-for row in df.index:
-    gid,name,family = df.loc[row,["gene_id","name","family"]]
-    if family == 'Orphans':
-        clazz = 'Orphans'
-    else:
-        raw_clazz = family_criteria_df.loc[family_criteria_df["GRASSIUS"]==family,"category"].values[0]
-        clazz = "Coreg" if (raw_clazz == "coregulators") else "TF"
-    df.loc[row,"class"] = clazz
-df.sort_values("name").to_csv("metadata.csv", index=False)
-    
-    
-# build gene_id -> genome_version dictionary
-gene_versions = {}
-for version in ['v3','v4','v5']:
-    all_gene_ids = get_all_gene_ids( im[f'maize_{version}_proteins'] )
-    for gid in all_gene_ids:
-        gene_versions[gid] = version
-    
-    
-# start a new database or connect to an existing database
-cb = ChadoBuilder()
+            old_family = old_match['family'].values[0]
+            if old_family != 'ABI3-VP1':
+                order = 9999
+            else:
+                order = old_match['suffix'].values[0]
+        df1.loc[row,'order'] = order
+    df1 = df1.sort_values('order').drop(columns=['order'])
+    gene_families = pd.concat([df1,df2])
+    gene_families.sort_values("family").to_csv("gene_families.csv", index=False)
+    return gene_families
 
-# create non-chado tables
-cb.build_grassius_tables( df, gene_versions, family_desc_df, 
-                         old_grassius_names, old_grassius_tfomes, 
-                         gene_interactions, domain_descriptions )
 
+# naming
 
-    
-    
+@pipeline.stage( depends=grassius_code, outputs=[
+    "reassigned_names.txt", "assoc_conflicts.txt", "new_prefixes.txt"] )
+def protein_names( gene_families, old_grassius_names, mgdb_assoc ):
+    return assign_protein_names( gene_families, old_grassius_names, mgdb_assoc,
+                                report_folder = "." )
+
+
+# metadata
+
+@pipeline.stage( outputs=["metadata.csv"] )
+def metadata( protein_names, family_criteria_df ):
+    df = protein_names.copy()
+    for row in df.index:
+        gid,name,family = df.loc[row,["gene_id","name","family"]]
+        if family == 'Orphans':
+            clazz = 'Orphans'
+        else:
+            raw_clazz = family_criteria_df.loc[family_criteria_df["GRASSIUS"]==family,"category"].values[0]
+            clazz = "Coreg" if (raw_clazz == "coregulators") else "TF"
+        df.loc[row,"class"] = clazz
+    df.sort_values("name").to_csv("metadata.csv", index=False)
+    return df
+
+
+# build gene_id -> genome_version index
+# (GeneVersionIndex keeps its own cache)
+@pipeline.stage( cache=False )
+def gene_versions( maize_v3_proteins_path, maize_v4_proteins_path, maize_v5_proteins_path ):
+    return GeneVersionIndex({ 'v3':maize_v3_proteins_path,
+                              'v4':maize_v4_proteins_path,
+                              'v5':maize_v5_proteins_path })
+
+
+# database stages
+# each stage connects to the database container with ChadoBuilder().
+# stages insert rows without checking for rows from previous runs,
+# so a new container is started and all database stages are re-run every time
+
+@pipeline.stage( cache=False )
+def database():
+    # start a new, empty database
+    init_db_container( default_port, replace=True )
+    return ChadoBuilder().docker_container.id
 
 
-# insert sequences from fasta files
-for suffix in ["cdna","proteins"]:
-    for version in ["v3","v4","v5"]:
+# table build
+
+@pipeline.stage( cache=False )
+def grassius_tables( database, metadata, gene_versions, family_desc_df,
+                     old_grassius_names, old_grassius_tfomes,
+                     gene_interactions, domain_descriptions ):
+
+    # create non-chado tables
+    ChadoBuilder().build_grassius_tables( metadata, gene_versions, family_desc_df,
+                                         old_grassius_names, old_grassius_tfomes,
+                                         gene_interactions, domain_descriptions )
+
+
+# row load
+# insert sequences, domain annotations, and tfomes inside ChadoBuilder.bulk_load(),
+# so that indexes and foreign keys are rebuilt once instead of maintained per row.
+# genome versions are loaded at the same time, each with its own ChadoBuilder
+
+@pipeline.stage( cache=False )
+def rows_loaded( database, metadata, domain_annotations, old_grassius_tfomes,
+                 maize_v3_cdna_path, maize_v3_proteins_path,
+                 maize_v4_cdna_path, maize_v4_proteins_path,
+                 maize_v5_cdna_path, maize_v5_proteins_path ):
+    paths = {
+        'v3': (maize_v3_cdna_path, maize_v3_proteins_path),
+        'v4': (maize_v4_cdna_path, maize_v4_proteins_path),
+        'v5': (maize_v5_cdna_path, maize_v5_proteins_path),
+    }
+
+    def insert_sequences( version ):
+        cb = ChadoBuilder()
+        cdna_path,proteins_path = paths[version]
         organism = f"Maize_{version}"
-        fasta_filepath = im[f"maize_{version}_{suffix}"]
-        cb.insert_sequences( organism, df, fasta_filepath, 
-                            is_protein=(suffix=='proteins') )
+        cb.insert_sequences( organism, metadata, cdna_path, is_protein=False )
+        cb.insert_sequences( organism, metadata, proteins_path, is_protein=True )
+
+    with ChadoBuilder().bulk_load():
+        with ThreadPoolExecutor() as pool:
+            for future in [pool.submit(insert_sequences,v) for v in paths.keys()]:
+                future.result()
+
+        # annotations and tfomes refer to the inserted sequences
+        with ThreadPoolExecutor() as pool:
+            futures = [
+                pool.submit( lambda: ChadoBuilder().insert_domain_annotations( domain_annotations ) ),
+                # add tfome sequences
+                pool.submit( lambda: ChadoBuilder().insert_tfomes( old_grassius_tfomes ) ),
+            ]
+            for future in futures:
+                future.result()
 
-# insert Jan2022 secondary structure
-cb.insert_secondary_structures()
 
-cb.insert_domain_annotations( domain_annotations )
-        
+# annotations
 
-# add tfome sequences
-cb.insert_tfomes( old_grassius_tfomes )
+@pipeline.stage( cache=False )
+def secondary_structures( database, grassius_tables, rows_loaded, secondary_structures_path ):
+    # insert Jan2022 secondary structure
+    ChadoBuilder().insert_secondary_structures()
 
-# apply patches
-apply_all_patches(cb)
 
-# save a snapshot of the database that was built
-cb.write_snapshot( "build_db.sql.tar.gz" )
\ No newline at end of file
+# patches
+
+@pipeline.stage( cache=False )
+def patches( database, grassius_tables, secondary_structures, rows_loaded ):
+    apply_all_patches( ChadoBuilder() )
+
+
+# snapshot
+
+@pipeline.stage( cache=False )
+def snapshot( database, patches ):
+    # save a snapshot of the database that was built
+    ChadoBuilder().write_snapshot( "build_db.sql.tar.gz" )
+
+
+if __name__ == "__main__":
+    targets = sys.argv[1:] if len(sys.argv) > 1 else None
+    pipeline.run( targets )
+    
+    # save timing, row-rate, and memory measurements for each stage
+    gdb.write_report( "build_report.json" )
@@ -1,2 +1,5 @@
 from .input_manager import InputManager
-from .util import load_gene_annotations
\ No newline at end of file
+from .util import load_gene_annotations
+from .gene_interval_index import GeneIntervalIndex
+from .pipeline import Pipeline
+from .instrumentation import span, instrument, add_rows, write_report
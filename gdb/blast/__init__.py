@@ -1,4 +1,4 @@
 from .blast_result import BlastResult
 from .blast_commands import prepare_blast_db, run_blastn
-from .util import read_blast_output,annotate_blast_result
-from .blast_pipeline import run_blast_and_annotate
\ No newline at end of file
+from .util import read_blast_output,iter_blast_hits,annotate_blast_result
+from .blast_pipeline import run_blast_and_annotate,iter_blast_and_annotate
\ No newline at end of file
@@ -1,64 +1,193 @@
 from .blast_commands import prepare_blast_db,run_blastn
 from .util import annotate_blast_result
 from ..util import load_gene_annotations
+from ..gene_interval_index import GeneIntervalIndex
 from ..fasta import read_records_for_gene_ids,get_gene_id_from_record
 import pandas as pd
+import csv
 
-def run_blast_and_annotate( 
-    needle_dna_fasta, haystack_dna_fasta, haystack_gff, gene_id_subset ):
+
+# columns in the results of run_blast_and_annotate()
+result_columns = [
+    "v3_gene_id","v3_transcript_id",
+    "matching_chrom","matching_start_pos","matching_stop_pos",
+    "matching_gene_id","Identities%"
+]
+
+# parquet types for result_columns, so that every batch has the same
+# schema, even if a column is empty or all-NaN in the first batch
+result_parquet_types = {
+    "v3_gene_id": "string", "v3_transcript_id": "string",
+    "matching_chrom": "string", "matching_start_pos": "int64", "matching_stop_pos": "int64",
+    "matching_gene_id": "string", "Identities%": "float64",
+}
+
+
+def run_blast_and_annotate(
+    needle_dna_fasta, haystack_dna_fasta, haystack_gff, gene_id_subset, output_path=None ):
     """
     run blast and get a dataframe with annotated results
-    
+
     if this task is interrupted, the partially-complete results are returned
-    
+
     Arguments:
     ----------
     needle_dna_fasta -- (str) path to a fasta file containing DNA sequences to search for
     haystack_dna_fasta -- (str) path to a fasta file containing a full genome of DNA (blast database)
     haystack_gff -- (str) path to a gff3 file containing annotations corresponding with the genome
     gene_id_subset -- (list of str) subset of ids to consider from the needle_fasta
+    output_path -- (optional) (str) path to a ".csv" or ".parquet" file. If given,
+                    results are written to this file as they are produced instead
+                    of being kept in memory, and the number of written rows is returned
     """
-    
+
+    hits = iter_blast_and_annotate( needle_dna_fasta, haystack_dna_fasta,
+                                    haystack_gff, gene_id_subset )
+
+    if output_path is not None:
+        return _write_hits( hits, output_path )
+
+    # collect results in column buffers
+    columns = {col:[] for col in result_columns}
+    try:
+        for hit in hits:
+            for col in result_columns:
+                columns[col].append(hit[col])
+    except (KeyboardInterrupt,Exception) as e:
+        print(e)
+
+    return pd.DataFrame(data=columns)
+
+
+def iter_blast_and_annotate(
+    needle_dna_fasta, haystack_dna_fasta, haystack_gff, gene_id_subset ):
+    """
+    run blast and yield annotated results one hit at a time
+
+    yields dictionaries with keys matching result_columns
+
+    Arguments:
+    ----------
+    see run_blast_and_annotate()
+    """
+
     # prepare blast database with maize v5 genome (DNA)
     prepare_blast_db(haystack_dna_fasta)
 
 
     # load maize v5 gene annotations
-    gff_data = load_gene_annotations(haystack_gff)
+    gff_data = GeneIntervalIndex( load_gene_annotations(haystack_gff) )
 
 
-    # prepare final results dataframe
-    result_df = pd.DataFrame()
-
     # iterate over protein sequences related to the list of ids
     for r in read_records_for_gene_ids(needle_dna_fasta,gene_id_subset):
+        print(r.id)
+
+        # blast each protein sequence against maize v5 genome dna
+        blast_result = run_blastn( str(r.seq), haystack_dna_fasta )
+        if blast_result.data is None:
+            continue
+
+        # filter blast results
+        df = blast_result.data
+        blast_result.data = pd.DataFrame(df[df["Identities%"] >= 90])
+
+        # annotate blast results
+        annotate_blast_result( blast_result, gff_data )
+
+        # yield results
+        df = blast_result.data
+        gene_id = get_gene_id_from_record(r)
+        for chrom,start_pos,stop_pos,matching_gene_id,identities in df[[
+                "Chrom","Start_Pos","Stop_Pos","Gene ID","Identities%"]].values:
+            yield dict(zip(result_columns,[
+                gene_id, r.id, chrom, start_pos, stop_pos, matching_gene_id, identities
+            ]))
+
+
+def _write_hits( hits, output_path, batch_size=10000 ):
+    """
+    write results from iter_blast_and_annotate() to a csv or parquet file
+
+    if this task is interrupted, the partially-complete results are kept
+
+    return the number of rows written
+
+    used in run_blast_and_annotate()
+    """
+
+    if output_path.endswith(".parquet"):
+        writer = _ParquetHitWriter( output_path, batch_size )
+    else:
+        writer = _CsvHitWriter( output_path )
+
+    n = 0
+    try:
+        for hit in hits:
+            writer.write(hit)
+            n += 1
+    except (KeyboardInterrupt,Exception) as e:
+        print(e)
+    finally:
+        writer.close()
+
+    return n
+
+
+class _CsvHitWriter:
+    """
+    write one row at a time to a csv file
+
+    used in _write_hits()
+    """
+
+    def __init__(self, output_path):
+        self.fout = open(output_path, "w", newline="")
+        self.writer = csv.DictWriter(self.fout, fieldnames=result_columns)
+        self.writer.writeheader()
+
+    def write(self, hit):
+        self.writer.writerow(hit)
+
+    def close(self):
+        self.fout.close()
+
+
+class _ParquetHitWriter:
+    """
+    write batches of rows to a parquet file
+
+    requires pyarrow, which is not needed for the rest of the pipeline
+
+    used in _write_hits()
+    """
+
+    def __init__(self, output_path, batch_size):
         try:
-            print(r.id)
-
-            # blast each protein sequence against maize v5 genome dna
-            blast_result = run_blastn( str(r.seq), haystack_dna_fasta )
-
-            # filter blast results
-            df = blast_result.data
-            blast_result.data = pd.DataFrame(df[df["Identities%"] >= 90])
-
-            # annotate blast results
-            annotate_blast_result( blast_result, gff_data )
-
-            # append to final results
-            df = blast_result.data
-            for row in df.index:
-                new_row_index = len(result_df.index)
-                result_df.loc[new_row_index,"v3_gene_id"] = get_gene_id_from_record(r)
-                result_df.loc[new_row_index,"v3_transcript_id"] = r.id
-                result_df.loc[new_row_index,"matching_chrom"] = df.loc[row,"Chrom"]
-                result_df.loc[new_row_index,"matching_start_pos"] = df.loc[row,"Start_Pos"]
-                result_df.loc[new_row_index,"matching_stop_pos"] = df.loc[row,"Stop_Pos"]
-                result_df.loc[new_row_index,"matching_gene_id"] = df.loc[row,"Gene ID"]
-                result_df.loc[new_row_index,"Identities%"] = df.loc[row,"Identities%"]
-                
-        except (KeyboardInterrupt,Exception) as e:
-            print(e)
-            return result_df
-            
-    return result_df
\ No newline at end of file
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise Exception("pyarrow is required to write parquet files")
+        self.pa = pyarrow
+        self.batch_size = batch_size
+        self.schema = pyarrow.schema([ (col, pyarrow.type_for_alias(result_parquet_types[col]))
+                                       for col in result_columns ])
+        self.writer = pyarrow.parquet.ParquetWriter( output_path, self.schema )
+        self.columns = {col:[] for col in result_columns}
+
+    def write(self, hit):
+        for col in result_columns:
+            self.columns[col].append(hit[col])
+        if len(self.columns[result_columns[0]]) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        df = pd.DataFrame(data=self.columns)
+        table = self.pa.Table.from_pandas( df, schema=self.schema, preserve_index=False )
+        self.writer.write_table(table)
+        self.columns = {col:[] for col in result_columns}
+
+    def close(self):
+        if len(self.columns[result_columns[0]]) > 0:
+            self._flush()
+        self.writer.close()
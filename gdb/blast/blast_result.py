@@ -14,9 +14,9 @@ class BlastResult:
         raw text from beginning of blast output (up to the first line starting with ">")
     data : DataFrame
         parsed data where each row is a hit
-        includes "Chrom","Start_Pos","Stop_Pos","Identities%",... for each hit
+        includes "Query ID","Chrom","Start_Pos","Stop_Pos","Identities%",... for each hit
     footer : 
-        raw text from end of blast output (starting at the first line starting with "lamdba")
+        raw text from end of blast output (starting at the last line starting with "Lambda")
     """
     
     def __init__(self, header,data,footer):
@@ -1,4 +1,5 @@
 from .blast_result import BlastResult
+from ..gene_interval_index import GeneIntervalIndex
 import pandas as pd
 import os
 
@@ -7,109 +8,147 @@ def annotate_blast_result( blast_result, gff3_data ):
     """
     Add annotations to a blast result 
     
-    This will add a new column "Gene_ID" to blast_result.data 
+    This will add a new column "Gene ID" to blast_result.data 
+    
+    Arguments:
+    ----------
+    blast_result -- an instance of BlastResult
+    gff3_data -- (GeneIntervalIndex) an index of gene regions
+                    for backwards compatibility, the DataFrame output from 
+                    gdb.load_gene_annotations() is also accepted, but then 
+                    the index is rebuilt for every call
     """
 
+    if blast_result.data is None:
+        return
+        
+    if not isinstance( gff3_data, GeneIntervalIndex ):
+        gff3_data = GeneIntervalIndex( gff3_data )
+
     df = blast_result.data
-    
-    for row in df.index:
-        chrom,start_pos,stop_pos = df.loc[row,["Chrom","Start_Pos","Stop_Pos"]]
-        df.loc[row,"Gene ID"] = _get_matching_gene_id( chrom,start_pos,stop_pos, gff3_data )
+    df["Gene ID"] = gff3_data.get_matching_gene_ids( 
+        df["Chrom"].values, df["Start_Pos"].values, df["Stop_Pos"].values )
         
     
 def read_blast_output(path):
     """
-    Parse a file containing output from TBLASTN
+    Parse a file containing output from TBLASTN or BLASTN
+    
+    The file is read in a single pass. Output containing multiple 
+    queries is supported, and the query for each hit is given in 
+    the column "Query ID"
+    
     return an instance of BlastResult
     """
     
-    # load the whole file
+    # prepare to accumulate data in plain lists
+    columns = {col:[] for col in _blast_data_columns}
+    header_lines = []
+    footer_lines = []
+    
+    # parse the whole file
     with open(path,'r') as fin:
-        lines = fin.readlines()
-        
-    # identify section breaks
-    data_start_index, data_end_index = _find_section_breaks(lines)
+        for hit in _parse_blast_lines( fin, header_lines, footer_lines ):
+            for col,value in zip(_blast_data_columns,hit):
+                columns[col].append(value)
     
     # return empty result if there is no data
-    if data_start_index is None:
-        return BlastResult("\n".join(lines),None,None)
+    if len(columns["Chrom"]) == 0:
+        return BlastResult("".join(header_lines),None,None)
     
-    # parse data
-    data_lines = lines[data_start_index:data_end_index]
-    data = _parse_data(data_lines)
+    data = pd.DataFrame(data=columns)
+    return BlastResult("".join(header_lines),data,"".join(footer_lines))
+
+
+def iter_blast_hits(path):
+    """
+    Lazily parse a file containing output from TBLASTN or BLASTN
     
-    # prepare text
-    header = "\n".join(lines[:data_start_index])
-    footer = "\n".join(lines[data_end_index:])
+    Use this instead of read_blast_output() for very large outputs
     
-    return BlastResult(header,data,footer)
+    yields one dictionary per hit, with the same keys as the 
+    columns in BlastResult.data
+    """
+    with open(path,'r') as fin:
+        for hit in _parse_blast_lines( fin ):
+            yield dict(zip(_blast_data_columns,hit))
 
 
 
-def _find_section_breaks(lines):
-    data_start_index = None
-    data_end_index = None
-    for i,line in enumerate(lines):
-        if (data_start_index is None) and line.startswith(">"):
-            data_start_index = i
-        if (data_start_index is not None) and line.startswith("lambda"):
-            data_end_index = i
-            
-    return data_start_index,data_end_index
+_blast_data_columns = ["Query ID","Chrom","Start_Pos","Stop_Pos","Identities%"]
+    
+    
+def _parse_blast_lines( lines, header_lines=None, footer_lines=None ):
+    """
+    Parse blast output one line at a time
     
+    yields one tuple per hit, with values corresponding to _blast_data_columns
     
-def _parse_data(data_lines):
-    result = pd.DataFrame(columns=["Chrom","Positions","Identities%"])
-    entry_index = -1
+    Arguments:
+    ----------
+    lines -- (iterable of str) lines of blast output, e.g. an open file
+    header_lines -- (optional) (list) will be filled with text from the beginning 
+                        of the output (up to the first line starting with ">")
+    footer_lines -- (optional) (list) will be filled with text from the end 
+                        of the output (starting at the last line starting 
+                        with "Lambda" that follows a hit)
+    """
+    query_id = ""
     chrom = ""
+    hit = None
+    in_header = True
+    in_footer = False
+    
+    for line in lines:
     
-    for line in data_lines:
+        # start of a new query
+        if line.startswith("Query="):
+            parts = line.split()
+            query_id = parts[1] if len(parts) > 1 else ""
+            in_footer = False
     
         # start of a new chromosome
-        if line.startswith(">"):
+        elif line.startswith(">"):
             chrom = line.strip()[1:]
+            in_header = False
+            in_footer = False
     
         # start of a new entry
-        if line.startswith(" Score"):
-            entry_index += 1
-            result.at[entry_index,"Chrom"] = chrom
-            result.at[entry_index,"Positions"] = []
+        elif line.startswith(" Score"):
+            if hit is not None:
+                yield tuple(hit)
+            hit = [query_id,chrom,None,None,None]
             
         # second line of new entry
-        if line.startswith(" Identities"):
-            result.at[entry_index,"Identities%"] = int(line.split()[3][1:-3])
+        elif line.startswith(" Identities"):
+            hit[4] = int(line.split()[3][1:-3])
             
-        # start of genomic coordinates 
-        if line.startswith("Sbjct"):
+        # genomic coordinates
+        # each entry may have >2 genomic positions
+        # summarize all genomic coordinates into two values: start and stop
+        elif line.startswith("Sbjct") and (hit is not None):
             parts = line.split()
             for pi in 1,3:
                 pos = int(parts[pi])
-                result.at[entry_index,"Positions"].append(pos)
+                if (hit[2] is None) or (pos < hit[2]):
+                    hit[2] = pos
+                if (hit[3] is None) or (pos > hit[3]):
+                    hit[3] = pos
+                    
+        # end of data for one query
+        elif line.startswith("Lambda") and (not in_header) and (not in_footer):
+            if hit is not None:
+                yield tuple(hit)
+                hit = None
+            in_footer = True
+            if footer_lines is not None:
+                footer_lines.clear()
                 
-    # now the result may have >2 genomic positions for each row
-    # summarize all genomic coordinates into two values: start and stop
-    result['Start_Pos'] = [min(result.at[row,"Positions"]) for row in result.index]
-    result['Stop_Pos'] = [max(result.at[row,"Positions"]) for row in result.index]
-    result = result[["Chrom","Start_Pos","Stop_Pos","Identities%"]]
-                
-    return result
-                
-    
-        
-def _get_matching_gene_id( chrom, start_pos, stop_pos, df ):
-    df = df[df['chrom'] == chrom]
-    df_sub = df[
-        ((start_pos >= df['start']) & (stop_pos <= df['end'])) |  # blast region inside gff region
-        ((df['start'] >= start_pos) & (df['end'] <= stop_pos)) |  # gff region inside blast region
-        ((df['start'] >= start_pos) & (df['end'] <= start_pos))| # regions partially overlap
-        ((df['start'] >= stop_pos) & (df['end'] <= stop_pos))     # regions partially overlap
-    ]
-    if len(df_sub) > 0:
-        identifiers = df_sub["identifiers"].values[0]
-        assert identifiers.startswith("ID=")
-        return identifiers.split(";")[0][3:]
-        
-    return ""
+        # collect raw text
+        if in_header and (header_lines is not None):
+            header_lines.append(line)
+        elif in_footer and (footer_lines is not None):
+            footer_lines.append(line)
             
-        
-    
\ No newline at end of file
+    if hit is not None:
+        yield tuple(hit)
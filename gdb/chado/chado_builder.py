@@ -4,18 +4,41 @@ from ..fasta import *
 from ..grassius import *
 from .chado_cvterms import init_dbxrefs,init_cvs,init_cvterms
 from .chado_organisms import init_organisms
+from ..instrumentation import instrument, add_rows, span
 
+import io
+import csv
 import psycopg2
+from psycopg2.extras import execute_values
 import hashlib
 import gzip
+import numpy as np
+import pandas as pd
 from Bio import SeqIO
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 default_port = 8642
 
+# the number of feature relationships inserted in one statement
+frel_batch_size = 10000
+
+# tables affected by ChadoBuilder.bulk_load()
+bulk_load_tables = ["feature", "featureprop", "feature_relationship"]
+
+# indexes that are kept during ChadoBuilder.bulk_load(), because
+# they are used for lookups while loading. Keys are table names, 
+# values are the first column of indexes that will be kept.
+# indexes for primary keys and unique constraints are also kept
+bulk_load_lookup_columns = {
+    "feature": "uniquename",
+}
+
 
 class ChadoBuilder:
     
-    def __init__(self, port=None):
+    @instrument()
+    def __init__(self, port=None, conn_str=None):
         """
         Construct a new instance of ChadoBuilder
         
@@ -32,22 +55,30 @@ class ChadoBuilder:
         Arguments:
         ----------
         port -- (int) (optional) the host port that will be used to access the database
+        conn_str -- (str) (optional) connect to an existing postgres database instead 
+                        of a docker container, e.g. a local server for benchmarks. 
+                        The chado schema must already be loaded. 
+                        write_snapshot() is not available in this case.
         """
         
-        if port is None:
-            port = default_port
-        
-        # find or create docker container
-        container = get_existing_db_container()
-        if (container is None) or (not container_maps_to_port( container, port )):
-            container = init_db_container( port, replace=True )
+        if conn_str is not None:
+            container = None
         else:
-            print( "connected to existing database container" )
+            if port is None:
+                port = default_port
+            
+            # find or create docker container
+            container = get_existing_db_container()
+            if (container is None) or (not container_maps_to_port( container, port )):
+                container = init_db_container( port, replace=True )
+            else:
+                print( "connected to existing database container" )
+            conn_str = f"dbname=postgres host=localhost port={port} user=postgres password=postgres"
                     
         # set instance variables
         self.port = port
         self.docker_container = container
-        self.conn_str = f"dbname=postgres host=localhost port={port} user=postgres password=postgres"
+        self.conn_str = conn_str
         
         with psycopg2.connect(self.conn_str) as conn:
             with conn.cursor() as cur:
@@ -60,6 +91,10 @@ class ChadoBuilder:
                 init_cvs(cur)
                 self.cvterms = init_cvterms(cur)
                 self.organisms = init_organisms(cur) 
+        
+        # feature relationships inserted by this instance
+        # (subject_id, type_id, object_id) tuples
+        self.seen_frels = set()
                 
                 
     def _test_db_connection(self,cur):
@@ -76,6 +111,7 @@ class ChadoBuilder:
         
         
         
+    @instrument()
     def query( self, sql, vars=None ):
         """
         Run a query against the database that is being built
@@ -91,12 +127,144 @@ class ChadoBuilder:
                 return cur.fetchall()
             
         
+    @contextmanager
+    def bulk_load( self, maintenance_work_mem="1GB", max_workers=4 ):
+        """
+        Context manager to speed up large inserts, e.g.
+        
+            with cb.bulk_load():
+                cb.insert_sequences(...)
+                cb.insert_domain_annotations(...)
+                cb.insert_tfomes(...)
+        
+        On entry, indexes, foreign keys, and triggers on the tables "feature", 
+        "featureprop", and "feature_relationship" are dropped or disabled, 
+        except for primary keys, unique constraints, and indexes used for 
+        lookups while loading (see bulk_load_lookup_columns).
+        
+        On exit, indexes are recreated in parallel, foreign keys are added 
+        again (which checks the integrity of all rows at once), triggers are 
+        enabled, and the tables are analyzed. Indexes and triggers are restored 
+        even if an exception occurs.
+        
+        Arguments:
+        ----------
+        maintenance_work_mem -- (optional) (str) postgres setting used while
+                                    recreating indexes and foreign keys
+        max_workers -- (optional) (int) the maximum number of indexes 
+                                    that will be created at the same time
+        """
+        
+        with psycopg2.connect(self.conn_str) as conn:
+            with conn.cursor() as cur:
+                indexes = self._get_bulk_load_indexes( cur )
+                foreign_keys = self._get_bulk_load_foreign_keys( cur )
+                
+                print( f"dropping {len(indexes)} indexes and {len(foreign_keys)} foreign keys for bulk load..." )
+                for table,name,definition in foreign_keys:
+                    cur.execute( f'ALTER TABLE {table} DROP CONSTRAINT "{name}"' )
+                for name,definition in indexes:
+                    cur.execute( f'DROP INDEX "{name}"' )
+                for table in bulk_load_tables:
+                    cur.execute( f"ALTER TABLE {table} DISABLE TRIGGER USER" )
+                    
+        succeeded = False
+        try:
+            yield self
+            succeeded = True
+            
+        finally:
+            with span( "ChadoBuilder.bulk_load restore" ):
+            
+                # recreate indexes in parallel
+                print( f"recreating {len(indexes)} indexes..." )
+                def create_index( definition ):
+                    with psycopg2.connect(self.conn_str) as conn:
+                        with conn.cursor() as cur:
+                            cur.execute( "SET maintenance_work_mem = %s", (maintenance_work_mem,) )
+                            cur.execute( definition )
+                with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                    for future in [pool.submit(create_index,d) for n,d in indexes]:
+                        future.result()
+                
+                with psycopg2.connect(self.conn_str) as conn:
+                    with conn.cursor() as cur:
+                        cur.execute( "SET maintenance_work_mem = %s", (maintenance_work_mem,) )
+                        for table in bulk_load_tables:
+                            cur.execute( f"ALTER TABLE {table} ENABLE TRIGGER USER" )
+                            
+                        # add foreign keys again, checking all rows once
+                        # if loading failed, skip checking rows that may be incomplete
+                        print( f"checking integrity with {len(foreign_keys)} foreign keys..." )
+                        not_valid = "" if succeeded else " NOT VALID"
+                        for table,name,definition in foreign_keys:
+                            cur.execute( f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}{not_valid}' )
+                    
+                        # update statistics for the query planner
+                        for table in bulk_load_tables:
+                            cur.execute( f"ANALYZE {table}" )
+                    
+                    
+    def _get_bulk_load_indexes( self, cur ):
+        """
+        get indexes that may be dropped during bulk_load()
+        
+        return a list of (index name, index definition) tuples
+        
+        used in bulk_load()
+        """
+        cur.execute("""
+            SELECT c.relname, t.relname, a.attname, pg_get_indexdef(i.indexrelid)
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            JOIN pg_class t ON t.oid = i.indrelid
+            LEFT JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = i.indkey[0]
+            WHERE t.relname = ANY(%s) 
+            AND t.relnamespace = 'public'::regnamespace
+            AND NOT i.indisprimary 
+            AND NOT EXISTS (
+                SELECT 1 FROM pg_constraint con WHERE con.conindid = i.indexrelid )
+        """, (bulk_load_tables,))
+        
+        result = []
+        for name,table,first_column,definition in cur.fetchall():
+            if bulk_load_lookup_columns.get(table) == first_column:
+                continue
+            result.append( (name,definition) )
+        return result
+        
+        
+    def _get_bulk_load_foreign_keys( self, cur ):
+        """
+        get foreign keys that may be dropped during bulk_load()
+        
+        return a list of (table name, constraint name, constraint definition) tuples
+        definitions do not include "NOT VALID", even for foreign keys 
+        left unchecked by an earlier bulk load that failed
+        
+        used in bulk_load()
+        """
+        cur.execute("""
+            SELECT t.relname, con.conname, pg_get_constraintdef(con.oid)
+            FROM pg_constraint con
+            JOIN pg_class t ON t.oid = con.conrelid
+            WHERE con.contype = 'f' 
+            AND t.relname = ANY(%s)
+            AND t.relnamespace = 'public'::regnamespace
+        """, (bulk_load_tables,))
+        return [ (table, name, definition.replace(" NOT VALID","")) 
+                 for table,name,definition in cur.fetchall() ]
+        
+        
+    @instrument()
     def write_snapshot( self, output_path ):
         """
         Save a snapshot of the database to a .sql.tar.gz file
         """
         
         dc = self.docker_container
+        if dc is None:
+            raise Exception("snapshots require a database hosted in a docker container")
         
         print( "running pg_dump in docker container..." )
         dc.exec_run( "echo 'localhost:5432:postgres:postgres:postgres' > ~/.pgpass" )
@@ -111,15 +279,18 @@ class ChadoBuilder:
         print( "database snapshot saved to " + output_path )
         
     
+    @instrument()
     def insert_tfomes( self, old_grassius_tfomes ):
         """
         Insert tfome sequences into the chado tabls 'feature' and 
         'feature_relationship'
         
-        also insert data into the grassius-specific 'tfome_metadata' table
+        Tfomes will be related to genomic dna transcripts, so this function 
+        should be called after all other sequences have been inserted 
+        using insert_sequences()
         
-        Tfomes will be related to This function should be called after all other 
-        sequences have been inserted using insert_sequences()
+        Tfomes are copied into staging tables, and then features and 
+        relationships are inserted with one statement each
         
         Arguments:
         ----------
@@ -128,92 +299,86 @@ class ChadoBuilder:
         """
         
         org_id = self.organisms["Maize_v3"]
-        
+        seq_df,frel_df = _get_tfome_staging_data( old_grassius_tfomes )
+        add_rows( len(old_grassius_tfomes.index) )
                 
         # connect to the database
         with psycopg2.connect(self.conn_str) as conn:
             with conn.cursor() as cur:
                 
-                # iterate through tfomes
-                for row in old_grassius_tfomes.index:
-                    utname,dna_seq,prot_seq,gene_id,tn = old_grassius_tfomes.loc[
-                        row,['utname','sequence','translation','gene_id','transcript_number']]
-
-                    # insert dna seq
-                    tfome_dna_fid = self._insert_tfome_sequence( cur, org_id, utname, dna_seq, False)
-
-                    # insert protein seq
-                    tfome_prot_fid = self._insert_tfome_sequence( cur, org_id, utname, prot_seq, True)
-
-                    # insert relationship
-                    # protein -> (derives from) -> dna
-                    self._insert_frel( cur, tfome_prot_fid, "derives_from", tfome_dna_fid )
+                # copy tfomes into staging tables
+                cur.execute("""
+                    CREATE TEMP TABLE tfome_seq_staging (
+                        seq_order int,
+                        name text,
+                        uniquename text,
+                        residues text,
+                        seqlen int,
+                        md5checksum text,
+                        is_protein boolean
+                    ) ON COMMIT DROP;
+                    CREATE TEMP TABLE tfome_frel_staging (
+                        dna_uniquename text,
+                        prot_uniquename text,
+                        gt_name text
+                    ) ON COMMIT DROP;
+                """)
+                _copy_dataframe( cur, "tfome_seq_staging", seq_df )
+                _copy_dataframe( cur, "tfome_frel_staging", frel_df )
+                
+                # insert tfome dna and protein sequences 
+                # skip sequences that already exist
+                cur.execute("""
+                    INSERT INTO feature 
+                    (organism_id, name, uniquename, residues, seqLen, 
+                        md5checksum, type_id)
+                    SELECT %s, s.name, s.uniquename, s.residues, s.seqlen, s.md5checksum,
+                        CASE WHEN s.is_protein THEN %s ELSE %s END
+                    FROM tfome_seq_staging s
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM feature f WHERE f.uniquename = s.uniquename )
+                    ORDER BY s.seq_order
+                """, (org_id, self.cvterms["polypeptide"], self.cvterms["DNA"]))
+                
+                # insert relationships
+                # protein -> (derives from) -> dna
+                self._insert_staged_frels( cur, "prot_uniquename", "derives_from", "dna_uniquename" )
                     
-                    # insert relationship
-                    # tfome dna -> (clone) -> genomic dna transcript
-                    self._insert_tfome_frel( cur, tfome_dna_fid,utname, gene_id,tn )
-            
-            
-    def _insert_tfome_frel( self, cur, tfome_dna_fid,utname, gene_id,tn ):
-        """
-        If necessary, insert one new feature_relationship
-        to relate a tfome to some genomic dna
-        
-        tfome dna -> (clone) -> genomic dna transcript
-        
-        used in insert_tfomes()
-        """
-        if len(gene_id.strip()) == 0:
-            return
-        if "_FG" in gene_id:
-            gt_name = gene_id.split('_')[0] + "_FG" + tn
-        else:
-            gt_name = f'{gene_id}_{tn}'
-        gt_fid = self._get_feature_id( cur, gt_name )
-        if gt_fid is None:
-            #print(f'could not find dna transcript "{gt_name}" for tfome "{utname}". Skipping adding feature_relationship...')
-            pass
-        else:
-            self._insert_frel( cur, tfome_dna_fid, "clone", gt_fid )
+                # insert relationships
+                # tfome dna -> (clone) -> genomic dna transcript
+                # skip tfomes whose genomic transcript is missing
+                self._insert_staged_frels( cur, "dna_uniquename", "clone", "gt_name" )
             
             
-        
-            
-    def _insert_tfome_sequence( self, cur, org_id, utname, sequence, is_protein ):
+    def _insert_staged_frels( self, cur, subject_column, type_name, object_column ):
         """
-        If necessary, insert one new chado feature with the given tfome sequence.
+        insert rows into the feature_relationship table, relating 
+        features by the uniquenames in the given columns of "tfome_frel_staging"
         
-        return the relevant feature_id
+        features are found by uniquename, and existing relationships are 
+        skipped using chado's unique constraint on feature_relationship
         
         used in insert_tfomes()
         """
-        
-        if is_protein:
-            type_id = self.cvterms["polypeptide"]
-            uniquename = utname + "_P"
-        else:
-            type_id = self.cvterms["DNA"]
-            uniquename = utname
-        
-        existing_id = self._get_feature_id( cur, uniquename )
-        if existing_id is not None:
-            return existing_id
+        cur.execute(f"""
+            WITH pairs AS (
+                SELECT DISTINCT
+                    (SELECT min(f.feature_id) FROM feature f 
+                        WHERE f.uniquename = s.{subject_column}) AS subject_id,
+                    (SELECT min(f.feature_id) FROM feature f 
+                        WHERE f.uniquename = s.{object_column}) AS object_id
+                FROM tfome_frel_staging s
+                WHERE COALESCE(s.{object_column},'') <> ''
+            )
+            INSERT INTO feature_relationship (subject_id, type_id, object_id)
+            SELECT p.subject_id, %s, p.object_id
+            FROM pairs p
+            WHERE p.subject_id IS NOT NULL AND p.object_id IS NOT NULL
+            ON CONFLICT DO NOTHING
+        """, (self.cvterms[type_name],))
             
-        # insert feature with sequence and identifiers
-        cur.execute("""
-            INSERT INTO feature 
-            (organism_id, name, uniquename, residues, seqLen, 
-                md5checksum, type_id)
-            VALUES (%s,%s,%s,%s,%s,%s,%s)
-            RETURNING feature_id
-        """, (org_id,utname,uniquename,sequence,len(sequence),
-              self._checksum(sequence),type_id))
-        (feature_id,) = cur.fetchone()
-        
-        return feature_id
-            
-        
         
+    @instrument()
     def insert_sequences( self, organism, metadata_df, fasta_filepath, is_protein ):
         """
         Insert genetic sequences into the database
@@ -253,10 +418,14 @@ class ChadoBuilder:
         with psycopg2.connect(self.conn_str) as conn:
             with conn.cursor() as cur:
                 
+                # feature relationships waiting to be inserted
+                frels = []
+                
                 # iterate through relevant fasta records
                 #for rec in read_records_for_gene_ids(fasta_filepath,all_gene_ids):
                 with open(fasta_filepath) as fin:
                     for rec in SeqIO.parse(fin, "fasta"):
+                        add_rows(1)
                         gene_id = get_gene_id_from_record(rec)
                         transcript_id = rec.id
                         
@@ -279,7 +448,13 @@ class ChadoBuilder:
                                 related_fid = self._get_feature_id( cur, related_tid )
                                 if related_fid is None:
                                     raise Exception(f'missing feature with uniquename "{related_tid}"')
-                                self._insert_frel( cur, fid, "derives_from", related_fid )
+                                frels.append( (fid, "derives_from", related_fid) )
+                                if len(frels) >= frel_batch_size:
+                                    self._insert_frels( cur, frels )
+                                    frels = []
+                                    
+                # insert remaining feature relationships
+                self._insert_frels( cur, frels )
                         
                         
             
@@ -324,28 +499,38 @@ class ChadoBuilder:
         return feature_id
         
             
-    def _insert_frel( self, cur, subject_fid, type_name, object_fid ):
+    def _insert_frels( self, cur, frels ):
         """
-        if necessary, insert a row into the feature_relationship table
+        insert rows into the feature_relationship table, 
+        skipping relationships that already exist
         
-        used in insert_sequences() and insert_tfomes()
+        relationships inserted by this instance are skipped without
+        querying the database. Other relationships are inserted in one
+        statement, which skips existing rows using chado's unique 
+        constraint on (subject_id, object_id, type_id, rank)
+        
+        used in insert_sequences()
+        
+        Arguments:
+        ----------
+        cur -- a database cursor
+        frels -- (list) tuples (subject_fid, type_name, object_fid)
         """
-        type_id = self.cvterms[type_name]
         
-        # check for exiting frel
-        cur.execute("""
-            SELECT feature_relationship_id 
-            FROM feature_relationship
-            WHERE (subject_id = %s) AND (type_id = %s) AND (object_id = %s)
-        """, (subject_fid,type_id,object_fid) )
-        existing = cur.fetchone()
-        
-        # insert new frel if necessary
-        if existing is None:
-            cur.execute("""
-                INSERT INTO feature_relationship (subject_id, type_id, object_id)
-                VALUES (%s,%s,%s)
-            """, (subject_fid,type_id,object_fid))
+        rows = []
+        for subject_fid,type_name,object_fid in frels:
+            row = (subject_fid, self.cvterms[type_name], object_fid)
+            if row not in self.seen_frels:
+                self.seen_frels.add(row)
+                rows.append(row)
+        if len(rows) == 0:
+            return
+        
+        execute_values( cur, """
+            INSERT INTO feature_relationship (subject_id, type_id, object_id)
+            VALUES %s
+            ON CONFLICT DO NOTHING
+        """, rows, page_size=frel_batch_size )
         
                                       
     def _insert_fprop( self, cur, feature_id, type_name, value ):
@@ -379,8 +564,7 @@ class ChadoBuilder:
         return the feature ID of an existing feature with the 
         given uniquename, or None if it does not exist
         
-        used in _insert_sequence(), _insert_tfome_sequence(), 
-        insert_domain_annotations()
+        used in _insert_sequence(), insert_domain_annotations()
         """
         
         cur.execute("""
@@ -396,6 +580,7 @@ class ChadoBuilder:
     
     
     
+    @instrument()
     def build_grassius_tables( self, metadata_df, gene_versions, 
                               family_desc_df, old_grassius_names, 
                               old_grassius_tfomes, gene_interactions, 
@@ -412,7 +597,7 @@ class ChadoBuilder:
         ----------
         metadata_df -- (DataFrame) a dataframe with columns:
                             "gene_id","name","class","family"
-        gene_versions -- (dictionary) where keys are gene_ids,
+        gene_versions -- (GeneVersionIndex or dictionary) where keys are gene_ids,
                             values are genome versions e.g. 'v3'
         family_desc_df -- (DataFrame) a dataframe loaded from private 
                             input "family_descriptions"
@@ -453,6 +638,7 @@ class ChadoBuilder:
                 build_family_tables( cur, metadata_df, family_desc_df )
         
                 
+    @instrument()
     def insert_domain_annotations( self, all_domain_annos ):
         """
         Insert domain annotations into the "featureprop" table.
@@ -480,6 +666,7 @@ class ChadoBuilder:
                 """)
 
                 # iterate through the given annotations
+                add_rows( len(all_domain_annos) )
                 for tid,anno in all_domain_annos.items():
                     all_uns = [tid]
                     if '_P' in tid:
@@ -519,6 +706,7 @@ class ChadoBuilder:
 
                                 i += 1
             
+    @instrument()
     def insert_secondary_structures(self):
         """
         Build into the grassius-specific table "seq_features"
@@ -541,6 +729,7 @@ class ChadoBuilder:
                 df = get_secondary_structures()
                 
                 # iterate through secondary structure data
+                add_rows( len(df.index) )
                 for row in df.index:
                     tid,struct = df.loc[row,['transcript_id','structure']]
                     
@@ -557,13 +746,73 @@ class ChadoBuilder:
                     """, (fid,struct) )
                     
                     
-        
-        
-        
-        
-        
-        
-        
-        
-        
-    
\ No newline at end of file
+                    
+def _get_tfome_staging_data( old_grassius_tfomes ):
+    """
+    Prepare tfomes to be copied into staging tables
+    
+    return two dataframes:
+        - sequences, with one dna row and one protein row for each tfome,
+            with columns matching the staging table "tfome_seq_staging"
+        - relationships, with one row for each tfome, with columns
+            matching the staging table "tfome_frel_staging"
+            "gt_name" is the genomic dna transcript, or an empty 
+            string if the tfome has no gene ID
+    
+    used in ChadoBuilder.insert_tfomes()
+    """
+    df = old_grassius_tfomes
+    utname = df['utname'].astype(str).values
+    gene_id = df['gene_id'].astype(str)
+    tn = df['transcript_number'].astype(str)
+    
+    # build sequence rows, in the order they would be inserted one at a time
+    # (dna, protein, dna, protein, ...)
+    n = len(df.index)
+    dna = pd.DataFrame({
+        "seq_order": np.arange(n)*2,
+        "name": utname,
+        "uniquename": utname,
+        "residues": df['sequence'].astype(str).values,
+        "is_protein": False,
+    })
+    prot = pd.DataFrame({
+        "seq_order": np.arange(n)*2+1,
+        "name": utname,
+        "uniquename": [un + "_P" for un in utname],
+        "residues": df['translation'].astype(str).values,
+        "is_protein": True,
+    })
+    seq_df = pd.concat([dna,prot]).sort_values("seq_order", kind="stable")
+    seq_df = seq_df.drop_duplicates("uniquename")
+    seq_df.insert( 4, "seqlen", seq_df["residues"].str.len() )
+    seq_df.insert( 5, "md5checksum", [hashlib.md5(seq.encode('utf-8')).hexdigest() 
+                                      for seq in seq_df["residues"]] )
+    
+    # get names of genomic dna transcripts
+    # special case for gene IDs containing "_FG"
+    gt_name = np.where( gene_id.str.contains("_FG", regex=False),
+                        gene_id.str.split('_').str[0] + "_FG" + tn,
+                        gene_id + "_" + tn )
+    gt_name[ (gene_id.str.strip().str.len() == 0).values ] = ""
+    
+    frel_df = pd.DataFrame({
+        "dna_uniquename": utname,
+        "prot_uniquename": [un + "_P" for un in utname],
+        "gt_name": gt_name,
+    })
+    return seq_df.reset_index(drop=True), frel_df
+    
+    
+def _copy_dataframe( cur, table_name, df ):
+    """
+    Copy all rows of the given dataframe into an existing table, 
+    using COPY. Column names must match the table.
+    
+    used in ChadoBuilder.insert_tfomes()
+    """
+    buffer = io.StringIO()
+    df.to_csv( buffer, index=False, header=False, quoting=csv.QUOTE_NONNUMERIC )
+    buffer.seek(0)
+    columns = ",".join(df.columns)
+    cur.copy_expert( f"COPY {table_name} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer )
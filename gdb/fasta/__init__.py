@@ -1 +1,2 @@
-from .fasta_util import get_transcript_gene_dict,get_gene_transcript_dict,get_all_gene_ids,get_gene_id_from_record,get_related_tid_from_record,get_value_from_record_description,read_records_for_gene_ids
\ No newline at end of file
+from .fasta_util import get_transcript_gene_dict,get_gene_transcript_dict,get_all_gene_ids,get_gene_id_from_record,get_related_tid_from_record,get_value_from_record_description,read_records_for_gene_ids,split_fasta,write_unique_sequences,expand_unique_sequence_results
+from .gene_version_index import GeneVersionIndex,get_gene_version_from_prefix
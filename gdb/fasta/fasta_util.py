@@ -1,4 +1,7 @@
 from Bio import SeqIO
+import os
+import hashlib
+import pandas as pd
 
 def get_transcript_gene_dict( fasta_filepath ):
     """
@@ -110,4 +113,144 @@ def get_value_from_record_description( record, key ):
         return target_part[len(search_str):]
     except:
         return None
-    
\ No newline at end of file
+    
+
+def split_fasta( fasta_filepath, n_shards, output_folder ):
+    """
+    Split the given fasta file into shards with similar numbers of residues
+    
+    Records are not reordered, so concatenating the shards in order 
+    gives the original file. Fewer shards may be created if there are
+    not enough records.
+    
+    return a list of paths to the new fasta files
+    
+    Arguments:
+    ----------
+    fasta_filepath -- (str) the path to the fasta file to split
+    n_shards -- (int) the desired number of shards
+    output_folder -- (str) an existing folder where shards will be created
+    """
+    
+    # count residues in each record
+    record_sizes = []
+    with open(fasta_filepath) as fin:
+        for line in fin:
+            if line.startswith(">"):
+                record_sizes.append(0)
+            elif len(record_sizes) > 0:
+                record_sizes[-1] += len(line.strip())
+    total = sum(record_sizes)
+    
+    # pick the shard for each record, splitting the cumulative residue count evenly
+    record_shards = []
+    cumulative = 0
+    for size in record_sizes:
+        record_shards.append( min(n_shards-1, (cumulative*n_shards)//max(total,1)) )
+        cumulative += size
+    used_shards = sorted(set(record_shards))
+    
+    # write shards
+    paths = [os.path.join(output_folder, f"shard{i}.fa") for i in range(len(used_shards))]
+    shard_files = {s:open(p,"w") for s,p in zip(used_shards,paths)}
+    try:
+        with open(fasta_filepath) as fin:
+            record_index = -1
+            for line in fin:
+                if line.startswith(">"):
+                    record_index += 1
+                if record_index >= 0:
+                    shard_files[record_shards[record_index]].write(line)
+    finally:
+        for fout in shard_files.values():
+            fout.close()
+            
+    return paths
+
+
+def write_unique_sequences( fasta_filepath, output_path ):
+    """
+    Write a copy of the given fasta file with only one record 
+    for each distinct sequence
+    
+    The first record with each sequence is used as the representative.
+    Sequences are compared using md5 hashes.
+    
+    return a dataframe with columns "id" and "representative_id",
+    with one row for each record in the original fasta file, in order.
+    Use this with expand_unique_sequence_results()
+    
+    Arguments:
+    ----------
+    fasta_filepath -- (str) the path to the fasta file to read
+    output_path -- (str) the path for the resulting fasta file
+    """
+    
+    all_ids = []
+    all_rep_ids = []
+    rep_ids_by_hash = {}
+    
+    def _finish_record( fout, header, seq_lines ):
+        parts = header[1:].split()
+        rec_id = parts[0] if len(parts) > 0 else ""
+        seq = "".join(line.strip() for line in seq_lines)
+        seq_hash = hashlib.md5(seq.encode('utf-8')).hexdigest()
+        if seq_hash not in rep_ids_by_hash.keys():
+            rep_ids_by_hash[seq_hash] = rec_id
+            fout.write(header)
+            fout.writelines(seq_lines)
+        all_ids.append(rec_id)
+        all_rep_ids.append(rep_ids_by_hash[seq_hash])
+    
+    with open(fasta_filepath) as fin, open(output_path, "w") as fout:
+        header = None
+        seq_lines = []
+        for line in fin:
+            if line.startswith(">"):
+                if header is not None:
+                    _finish_record( fout, header, seq_lines )
+                header = line
+                seq_lines = []
+            elif header is not None:
+                seq_lines.append(line)
+        if header is not None:
+            _finish_record( fout, header, seq_lines )
+            
+    return pd.DataFrame(data={
+        "id": all_ids,
+        "representative_id": all_rep_ids
+    })
+
+
+def expand_unique_sequence_results( df, id_column, sequence_map ):
+    """
+    Convert results for unique sequences back into results for every 
+    record of the original fasta file
+    
+    Each row for a representative record is copied for every record 
+    that shares its sequence. The result is ordered by the original 
+    fasta file, as if the original file had been processed.
+    
+    return a new dataframe
+    
+    Arguments:
+    ----------
+    df -- (DataFrame) results based on the output of write_unique_sequences()
+    id_column -- (str) the column in df containing record IDs
+                        e.g. "query name" for hmmscan results
+    sequence_map -- (DataFrame) output from write_unique_sequences()
+    """
+    
+    m = pd.DataFrame(data={
+        "_representative_id": sequence_map["representative_id"].values,
+        "_member_id": sequence_map["id"].values,
+        "_member_order": range(len(sequence_map.index)),
+    })
+    
+    result = df.copy()
+    result["_row_order"] = range(len(result.index))
+    result = result.merge( m, left_on=id_column, right_on="_representative_id", how="inner" )
+    result[id_column] = result["_member_id"]
+    result = result.sort_values( ["_member_order","_row_order"], kind="stable" )
+    result = result.drop( columns=["_representative_id","_member_id","_member_order","_row_order"] )
+    return result.reset_index(drop=True)
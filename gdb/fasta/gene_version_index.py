@@ -0,0 +1,146 @@
+# this file contains an index of which genome version each gene ID belongs to
+
+# most maize gene IDs can be classified by their prefix alone. The rest are
+# looked up in an index built from the headers of the protein fasta files.
+# indices are saved in a cache folder, keyed by the md5 checksums of the fasta files
+
+# local imports
+from ..util import get_known_file_md5, get_cache_folder
+
+import os
+import json
+import hashlib
+
+
+# gene ID prefixes that identify a genome version, checked in order
+gene_version_prefixes = [
+    ("GRMZM", "v3"),
+    ("AC", "v3"),
+    ("Zm00001eb", "v5"),
+    ("Zm00001d", "v4"),
+]
+
+
+def get_gene_version_from_prefix( gene_id ):
+    """
+    Get the genome version for the given gene ID, based on its prefix
+
+    return a genome version e.g. 'v3', or None if the prefix is not recognized
+    """
+    for prefix,version in gene_version_prefixes:
+        if gene_id.startswith(prefix):
+            return version
+    return None
+
+
+class GeneVersionIndex:
+    """
+    The genome version of every gene ID in a set of fasta files
+
+    May be used in place of a dictionary where keys are gene IDs
+    and values are genome versions e.g. 'v3'
+
+    Get an instance using GeneVersionIndex(fasta_paths)
+
+    Attributes:
+    -----------
+    gene_versions : dict
+        keys are gene IDs from the fasta files, values are genome versions
+    """
+
+    def __init__(self, fasta_paths):
+        """
+        Load the index for the given fasta files, building it if necessary
+
+        Arguments:
+        ----------
+        fasta_paths -- (dict) genome version -> path to a fasta file
+                        with gene annotations, e.g. {'v3':im['maize_v3_proteins'],...}
+        """
+
+        # checksums are only computed again if a file's size or mtime changed
+        key = hashlib.md5()
+        for version,path in fasta_paths.items():
+            key.update( version.encode() )
+            key.update( get_known_file_md5(path).encode() )
+
+        index_path = os.path.join( get_cache_folder("gene_version_index"), key.hexdigest() + ".json" )
+        if os.path.exists(index_path):
+            with open(index_path) as fin:
+                self.gene_versions = json.load(fin)
+        else:
+            self.gene_versions = {}
+            for version,path in fasta_paths.items():
+                print( f"indexing gene IDs in fasta file:\n\t{path}" )
+                for gene_id in _read_gene_ids(path):
+                    self.gene_versions[gene_id] = version
+            with open(index_path + ".tmp", "w") as fout:
+                json.dump(self.gene_versions, fout)
+            os.replace(index_path + ".tmp", index_path)
+
+
+    def get(self, gene_id, default=None):
+        """
+        Get the genome version for the given gene ID
+
+        The prefix of the gene ID is checked first, then the index
+
+        return a genome version e.g. 'v3', or the given default value
+        """
+        version = get_gene_version_from_prefix(gene_id)
+        if version is not None:
+            return version
+        return self.gene_versions.get(gene_id, default)
+
+
+    def __getitem__(self, gene_id):
+        version = self.get(gene_id)
+        if version is None:
+            raise KeyError(gene_id)
+        return version
+
+
+    def __contains__(self, gene_id):
+        """
+        return True for gene IDs in the fasta files, and for any
+        gene ID with a recognized prefix (see gene_version_prefixes)
+        """
+        return self.get(gene_id) is not None
+
+
+    def keys(self):
+        """
+        Get the gene IDs from the fasta files
+
+        Gene IDs that are only recognized by their prefix are not
+        included, so "gene_id in index" may be true for IDs that
+        are not in index.keys()
+        """
+        return self.gene_versions.keys()
+
+
+def _read_gene_ids( fasta_path ):
+    """
+    Get the set of gene IDs in the headers of the given fasta file,
+    consistent with get_gene_id_from_record() but without parsing sequences
+
+    used in GeneVersionIndex constructor
+    """
+    result = set()
+    with open(fasta_path) as fin:
+        for line in fin:
+            if not line.startswith(">"):
+                continue
+            parts = line[1:].split()
+            if len(parts) == 0:
+                continue
+
+            # special case for maize v5 records
+            if parts[0].startswith("Zm00001eb"):
+                result.add( parts[0].split("_")[0] )
+                continue
+
+            gene_id = next( (p[5:] for p in parts if p.startswith("gene:")), None )
+            if gene_id is not None:
+                result.add( gene_id )
+    return result
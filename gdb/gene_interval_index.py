@@ -0,0 +1,187 @@
+# this file contains an index of gene regions from a gff3 file,
+# used to efficiently relate genomic coordinates (e.g. blast hits) to genes
+
+import numpy as np
+import pandas as pd
+
+
+class GeneIntervalIndex:
+    """
+    An index of gene regions, built once from the output of
+    gdb.load_gene_annotations()
+
+    For each chromosome, genes are sorted by start position, and the running
+    maximum of end positions is stored. This allows the candidate genes for
+    any query region to be located with two binary searches, instead of
+    comparing the query against every gene.
+
+    Get an instance using GeneIntervalIndex(gff3_data)
+
+    Attributes:
+    -----------
+    chroms : dict
+        keys are chromosome names, values are dictionaries of numpy arrays:
+        "start", "end", "max_end", "rank", "gene_id"
+    """
+
+    def __init__(self, gff3_data):
+        """
+        Construct a new instance of GeneIntervalIndex
+
+        Arguments:
+        ----------
+        gff3_data -- (DataFrame) output from gdb.load_gene_annotations()
+        """
+
+        df = gff3_data
+
+        # extract gene IDs from the "identifiers" column
+        identifiers = df["identifiers"].astype(str)
+        if not identifiers.str.startswith("ID=").all():
+            raise Exception('gff3 "identifiers" column contains values that do not start with "ID="')
+        gene_ids = identifiers.str.split(";").str[0].str[3:].values
+
+        # rank by original row order, which decides ties between matches
+        ranks = np.arange(len(df.index))
+
+        self.chroms = {}
+        all_chroms = df["chrom"].values
+        all_starts = df["start"].values.astype(np.int64)
+        all_ends = df["end"].values.astype(np.int64)
+        for chrom in pd.unique(all_chroms):
+            mask = (all_chroms == chrom)
+            starts = all_starts[mask]
+            order = np.argsort(starts, kind="stable")
+            ends = all_ends[mask][order]
+            self.chroms[chrom] = {
+                "start": starts[order],
+                "end": ends,
+                "max_end": np.maximum.accumulate(ends),
+                "rank": ranks[mask][order],
+                "gene_id": gene_ids[mask][order],
+            }
+
+
+    def get_matching_gene_ids(self, chroms, start_positions, stop_positions):
+        """
+        Find one matching gene for each of the given regions
+
+        A gene that contains the region, or is contained in the region, is
+        preferred. Otherwise a gene that partially overlaps the region is
+        used. Ties are broken by the order of genes in the gff3 file.
+
+        return a numpy array of gene IDs, with "" where there is no match
+
+        Arguments:
+        ----------
+        chroms -- (list-like of str) chromosome name for each region
+        start_positions -- (list-like of int) first position of each region
+        stop_positions -- (list-like of int) last position of each region
+        """
+
+        chroms = np.asarray(chroms)
+        start_positions = np.asarray(start_positions, dtype=np.int64)
+        stop_positions = np.asarray(stop_positions, dtype=np.int64)
+        result = np.full(len(chroms), "", dtype=object)
+
+        # process all queries for one chromosome at a time
+        for chrom in pd.unique(chroms):
+            if chrom not in self.chroms.keys():
+                continue
+            qi = np.flatnonzero(chroms == chrom)
+            lo,hi = self._get_candidate_ranges(chrom, start_positions[qi], stop_positions[qi])
+
+            for q,i,j in zip(qi,lo,hi):
+                if i < j:
+                    result[q] = self._pick_match(chrom, i, j, start_positions[q], stop_positions[q])
+
+        return result
+
+
+    def get_overlapping_gene_ids(self, chrom, start_pos, stop_pos):
+        """
+        Get all genes that overlap the given region, in gff3 file order
+
+        return a list of gene IDs
+
+        Arguments:
+        ----------
+        chrom -- (str) chromosome name
+        start_pos -- (int) first position of the region
+        stop_pos -- (int) last position of the region
+        """
+
+        if chrom not in self.chroms.keys():
+            return []
+        lo,hi = self._get_candidate_ranges(chrom, [start_pos], [stop_pos])
+        c = self.chroms[chrom]
+        window = slice(lo[0],hi[0])
+        mask = c["end"][window] >= start_pos
+        ranks = c["rank"][window][mask]
+        gene_ids = c["gene_id"][window][mask]
+        return list(gene_ids[np.argsort(ranks, kind="stable")])
+
+
+    def get_containing_gene_ids(self, chrom, start_pos, stop_pos):
+        """
+        Get all genes that fully contain the given region, in gff3 file order
+
+        return a list of gene IDs
+
+        Arguments:
+        ----------
+        chrom -- (str) chromosome name
+        start_pos -- (int) first position of the region
+        stop_pos -- (int) last position of the region
+        """
+
+        if chrom not in self.chroms.keys():
+            return []
+
+        # genes that start at or before the region, and may reach its end
+        c = self.chroms[chrom]
+        hi = np.searchsorted(c["start"], start_pos, side="right")
+        lo = np.searchsorted(c["max_end"], stop_pos, side="left")
+        window = slice(lo,max(lo,hi))
+        mask = c["end"][window] >= stop_pos
+        ranks = c["rank"][window][mask]
+        gene_ids = c["gene_id"][window][mask]
+        return list(gene_ids[np.argsort(ranks, kind="stable")])
+
+
+    def _get_candidate_ranges(self, chrom, start_positions, stop_positions):
+        """
+        For each region, locate the range of sorted genes that may overlap it
+
+        Genes before "lo" all end before the region starts, and genes
+        from "hi" onwards all start after the region stops
+
+        used in get_matching_gene_ids() and get_overlapping_gene_ids()
+        """
+        c = self.chroms[chrom]
+        hi = np.searchsorted(c["start"], stop_positions, side="right")
+        lo = np.searchsorted(c["max_end"], start_positions, side="left")
+        return lo,np.maximum(lo,hi)
+
+
+    def _pick_match(self, chrom, i, j, start_pos, stop_pos):
+        """
+        Pick one gene from a candidate range for the given region
+
+        used in get_matching_gene_ids()
+        """
+        c = self.chroms[chrom]
+        gs = c["start"][i:j]
+        ge = c["end"][i:j]
+        ranks = c["rank"][i:j]
+
+        overlap = (ge >= start_pos)
+        contained = overlap & (
+            ((gs <= start_pos) & (stop_pos <= ge)) |  # blast region inside gff region
+            ((start_pos <= gs) & (ge <= stop_pos))    # gff region inside blast region
+        )
+        for mask in contained,overlap:
+            if mask.any():
+                k = np.flatnonzero(mask)
+                return c["gene_id"][i:j][k[np.argmin(ranks[k])]]
+        return ""
@@ -13,7 +13,9 @@
 # ChadoBuilder.build_grassius_tables()
 
 from .grassius_util import get_maize_v3_uniprot_ids, parse_protein_name
+from ..instrumentation import instrument, add_rows
 
+@instrument()
 def build_domain_descriptions( cur, domain_descriptions ):
     """
     Build table "domain_descriptions"
@@ -40,6 +42,7 @@ def build_domain_descriptions( cur, domain_descriptions ):
     
     # insert data
     df = domain_descriptions
+    add_rows( len(df.index) )
     for row in df.index:
         acc,title,desc = df.loc[row,['accession','title','description']]
         cur.execute("""
@@ -48,6 +51,7 @@ def build_domain_descriptions( cur, domain_descriptions ):
         """, (acc,title,desc) )
     
 
+@instrument()
 def build_tfome_metadata( cur, old_grassius_tfomes ):
     """
     Build table "tfome_metadata"
@@ -85,6 +89,7 @@ def build_tfome_metadata( cur, old_grassius_tfomes ):
     
     # insert data
     df = old_grassius_tfomes
+    add_rows( len(df.index) )
     for row in df.index:
         
         values = df.loc[row,['utname', 
@@ -104,6 +109,7 @@ def build_tfome_metadata( cur, old_grassius_tfomes ):
         
 
 
+@instrument()
 def build_gene_clone( cur, old_grassius_tfomes ):
     """
     Build table "gene_clone"
@@ -134,6 +140,7 @@ def build_gene_clone( cur, old_grassius_tfomes ):
     # insert data
     df = old_grassius_tfomes
     all_names = set()
+    add_rows( len(df.index) )
     for row in df.index:
         gid,utn = df.loc[row,['gene_id','utname']]
         cur.execute("""
@@ -144,6 +151,7 @@ def build_gene_clone( cur, old_grassius_tfomes ):
     
 
         
+@instrument()
 def build_gene_interaction( cur, protein_name_dict, gene_interactions ):
     """
     Build table "gene_interaction"
@@ -177,6 +185,7 @@ def build_gene_interaction( cur, protein_name_dict, gene_interactions ):
     
     # insert data
     df = gene_interactions
+    add_rows( len(df.index) )
     for row in df.index:
         gene_id,target_id,pubmed_id,interaction_type,experiment = df.loc[row,[
                 "gene Locus ","target locus","pubmed ID","Interaction type","experiment"]]
@@ -193,6 +202,7 @@ def build_gene_interaction( cur, protein_name_dict, gene_interactions ):
         """, (gene_id,target_id,str(pubmed_id),interaction_type,experiment,protein_name,target_name) )
 
 
+@instrument()
 def build_seq_features( cur ):
     """
     Build table "seq_features"
@@ -218,6 +228,7 @@ def build_seq_features( cur ):
     
     
 
+@instrument()
 def build_uniprot_ids( cur, protein_name_dict ):
     """
     Build table "uniprot_ids".
@@ -243,6 +254,7 @@ def build_uniprot_ids( cur, protein_name_dict ):
     
     # insert data
     all_uniprot_ids = get_maize_v3_uniprot_ids()
+    add_rows( len(all_uniprot_ids) )
     for gene_id,uniprot_id in all_uniprot_ids.items():
         
         gene_name = protein_name_dict.get(gene_id)
@@ -257,6 +269,7 @@ def build_uniprot_ids( cur, protein_name_dict ):
         
     
 
+@instrument()
 def build_searchable_clones( cur, protein_name_dict, old_grassius_tfomes ):
     """
     Build table "searchable_clones", based on the 
@@ -288,6 +301,7 @@ def build_searchable_clones( cur, protein_name_dict, old_grassius_tfomes ):
 
     # insert data
     all_gids = set(old_grassius_tfomes['gene_id'])
+    add_rows( len(all_gids) )
     for gid in all_gids:
         
         name = protein_name_dict.get(gid)
@@ -309,6 +323,7 @@ def build_searchable_clones( cur, protein_name_dict, old_grassius_tfomes ):
                 
         
         
+@instrument()
 def build_comment_system_urls( cur, all_family_names ):
     """
     Build table "comment_system_urls"
@@ -338,6 +353,7 @@ def build_comment_system_urls( cur, all_family_names ):
     """)
 
     # insert one row for each family
+    add_rows( len(all_family_names) )
     for family in all_family_names:
         cur.execute("""
             INSERT INTO comment_system_urls 
@@ -347,6 +363,7 @@ def build_comment_system_urls( cur, all_family_names ):
                     
         
         
+@instrument()
 def build_default_maize_names( cur, metadata_df, gene_versions, 
                               all_family_names, old_grassius_tfomes ):
     """
@@ -365,7 +382,7 @@ def build_default_maize_names( cur, metadata_df, gene_versions,
     ----------
     metadata_df -- (DataFrame) a dataframe with columns:
                         "gene_id","name","class","family"
-    gene_versions -- (dictionary) where keys are gene_ids,
+    gene_versions -- (GeneVersionIndex or dictionary) where keys are gene_ids,
                         values are genome versions e.g. 'v3'
     all_family_names -- (list of str) list of distinct family names
     old_grassius_tfomes -- (DataFrame) output from 
@@ -393,6 +410,7 @@ def build_default_maize_names( cur, metadata_df, gene_versions,
     # insert one row for each distinct protein name
     df = metadata_df
     all_names = set(df["name"])
+    add_rows( len(all_names) )
     for name in all_names:
         df_sub = df[df["name"] == name]
         all_gene_ids = df_sub["gene_id"].values
@@ -433,13 +451,15 @@ def _get_gene_version( gene_versions, gene_id ):
     """
     Used in build_default_maize_names()
     """
-    if gene_id not in gene_versions.keys():
+    version = gene_versions.get(gene_id)
+    if version is None:
         print( " ".join([f'WARNING gene id "{gene_id}" is not in gene_versions dictionary.',
                         'Assuming it is from maize genome v3' ]))
         return 'v3'
               
-    return gene_versions[gene_id]
+    return version
               
+@instrument()
 def build_gene_name( cur, metadata_df, old_grassius_names ):
     """
     Build table "gene_name".
@@ -470,6 +490,7 @@ def build_gene_name( cur, metadata_df, old_grassius_names ):
 
     # insert one row for each protein name
     all_names = set(metadata_df["name"])
+    add_rows( len(all_names) )
     for name in all_names:
         accepted = 'no'
         synonym = ''
@@ -505,6 +526,7 @@ def build_gene_name( cur, metadata_df, old_grassius_names ):
     
     
         
+@instrument()
 def build_family_tables( cur, metadata_df, family_desc_df ):
     """
     Build tables "family" and "class_family".
@@ -543,6 +565,7 @@ def build_family_tables( cur, metadata_df, family_desc_df ):
     # insert values
     # iterate through metadata rows
     inserted_families = []
+    add_rows( len(metadata_df.index) )
     for row in metadata_df.index:
 
         clazz,family = metadata_df.loc[row,["class","family"]]
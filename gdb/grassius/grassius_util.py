@@ -2,6 +2,7 @@
 
 # local imports
 from ..input_manager import InputManager
+from ..instrumentation import instrument, add_rows
 
 
 import pandas as pd
@@ -9,6 +10,7 @@ import gzip
 import json
 
 
+@instrument()
 def assign_protein_names( gene_families, old_grassius_names, mgdb_assoc, report_folder=None ):
     """
     Assign protein names to gene IDs in the traditional grassius form
@@ -269,6 +271,7 @@ def _get_related_gene_ids( gene_id, mgdb_assoc ):
     return df.loc[df["name"] == name, "gene_id"].values
 
 
+@instrument()
 def get_family_descriptions():
     """
     Get desriptions and other metadata about grassius families
@@ -283,6 +286,7 @@ def get_family_descriptions():
     return pd.read_csv(path).fillna('')
 
 
+@instrument()
 def get_old_grassius_names():
     """
     get families, protein names, v3 gene ids
@@ -298,6 +302,7 @@ def get_old_grassius_names():
     return old_grassius_names
 
 
+@instrument()
 def get_old_grassius_tfomes():
     """
     get tfome sequences and metadata from the old grassius website
@@ -310,6 +315,7 @@ def get_old_grassius_tfomes():
     return pd.read_table( path ).fillna('')
 
 
+@instrument()
 def get_domain_descriptions():
     """
     get titles and descriptions for domain annotations, based on accession names.
@@ -322,6 +328,7 @@ def get_domain_descriptions():
     return pd.read_csv( path ).fillna('')
 
         
+@instrument()
 def get_domain_annotations():
     """
     get json data containing domain annotations
@@ -355,6 +362,7 @@ def get_protein_name_dict( metadata_df ):
     }
 
 
+@instrument()
 def get_species_descriptions():
     """
     get a dictionary where keys are organism common names,
@@ -370,6 +378,7 @@ def get_species_descriptions():
     }
 
 
+@instrument()
 def get_secondary_structures():
     """
     get a dataframe containing Jan2022 secondary structures
@@ -379,6 +388,7 @@ def get_secondary_structures():
                        header=None, names=['transcript_id','structure'])
 
 
+@instrument()
 def get_maize_v3_uniprot_ids():
     """
     Get uniprot IDs corresponding with maize v3 gene IDs
@@ -401,6 +411,7 @@ def get_maize_v3_uniprot_ids():
             line = f.readline()
             if not line:
                 break
+            add_rows(1)
                 
             if (gid_search_str in line) and (uid_search_str in line):
                 i = line.index(gid_search_str) + len(gid_search_str)
@@ -417,6 +428,7 @@ def get_maize_v3_uniprot_ids():
         
 
     
+@instrument()
 def get_maizegdb_associations():
     """
     parse the uniquely-formatted public input:
@@ -441,6 +453,7 @@ def get_maizegdb_associations():
             line = fin.readline()
             if not line:
                 break
+            add_rows(1)
 
             parts = line.split("\t")
             for gid in parts[1:]:
@@ -1,5 +1,7 @@
 from .hmmscan_result import HmmscanResult
-from .hmmer_commands import run_hmmpress,run_hmmscan
+from .hmm_index import HmmIndex
+from .hmmer_commands import run_hmmpress,run_hmmscan,run_hmmscan_sharded
 from .score_thresholds import get_filtered_hmmscan_result
-from .hmmer_util import get_acc_dict,concatenate_hmms,get_accessions,build_minified_hmm,read_hmmscan_output
+from .hmmer_util import get_acc_dict,concatenate_hmms,get_accessions,build_minified_hmm,read_hmmscan_output,iter_hmmscan_output
+from .family_rule_engine import FamilyRuleEngine
 from .family_criteria import get_family_criteria,get_relevant_accessions,categorize_all_genes,categorize_all_transcripts,find_matching_transcripts
\ No newline at end of file
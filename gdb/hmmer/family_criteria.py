@@ -6,6 +6,7 @@
 # iTAK-specific utils where added in gdb.itak
 
 from ..input_manager import InputManager
+from .family_rule_engine import FamilyRuleEngine
 import pandas as pd
 
 def get_family_criteria():
@@ -97,20 +98,8 @@ def categorize_all_transcripts( acc_dict, family_criteria_df ):
     family_criteria_df -- (DataFrame) output from get_family_criteria()
     
     """
-    df = family_criteria_df
     
-    tids_by_family = {}
-    for row in df.index:
-        required_accs = df.loc[row,"Required"].split(":")
-        forbidden_accs = df.loc[row,"Forbidden"].split(":")
-        family_name = df.loc[row,"GRASSIUS"]    
-        family_tids = find_matching_transcripts( acc_dict, required_accs, forbidden_accs )
-        
-        if family_name not in tids_by_family.keys():
-            tids_by_family[family_name] = []
-        tids_by_family[family_name] += family_tids
-        
-    return tids_by_family
+    return FamilyRuleEngine( family_criteria_df ).categorize_transcripts( acc_dict )
 
 
 
@@ -0,0 +1,131 @@
+# this file contains a compiled form of the criteria for assigning families to transcripts
+
+# the criteria are parsed once into inverted indices (accession -> rules),
+# so that all rules can be evaluated in a single pass over transcripts
+
+from collections import Counter
+
+
+class FamilyRuleEngine:
+    """
+    Family criteria compiled for fast evaluation against many transcripts
+
+    Gives the same results as calling is_match() for every rule and
+    every transcript, but only looks at the accessions that are actually
+    present in each transcript
+
+    Get an instance using FamilyRuleEngine(family_criteria_df)
+
+    Attributes:
+    -----------
+    family_names : list of str
+        the family name for each rule, in the order of the given criteria
+    n_required : list of int
+        the number of required-accession criteria for each rule
+    required_index : dict
+        keys are accession names, values are lists of (rule index, minimum count)
+    forbidden_index : dict
+        keys are accession names, values are lists of rule indices
+    """
+
+    def __init__(self, family_criteria_df):
+        """
+        Compile the given criteria
+
+        Arguments:
+        ----------
+        family_criteria_df -- (DataFrame) output from get_family_criteria()
+                                must contain columns "Required", "Forbidden", and "GRASSIUS"
+        """
+
+        df = family_criteria_df
+
+        self.family_names = []
+        self.n_required = []
+        self.required_index = {}
+        self.forbidden_index = {}
+
+        for rule_index,row in enumerate(df.index):
+            required_accs = df.loc[row,"Required"].split(":")
+            forbidden_accs = df.loc[row,"Forbidden"].split(":")
+            self.family_names.append( df.loc[row,"GRASSIUS"] )
+            self.n_required.append( len(required_accs) )
+
+            for acc in required_accs:
+                if acc.endswith("#1"):
+                    min_count = 1
+                elif acc.endswith("#2"):
+                    min_count = 2
+                else:
+                    raise Exception( "unrecognized required accession criteria \"{0}\"".format( acc ) )
+                self.required_index.setdefault( acc[:-2], [] ).append( (rule_index,min_count) )
+
+            for acc in forbidden_accs:
+                if acc == '':
+                    continue
+                elif acc.endswith("#1"):
+                    self.forbidden_index.setdefault( acc[:-2], [] ).append( rule_index )
+                else:
+                    raise Exception( "unrecognized forbidden accession criteria \"{0}\"".format( acc ) )
+
+
+    def get_matching_rules(self, t_accs):
+        """
+        Get the indices of all rules that fit the given list of accessions
+
+        return a sorted list of rule indices
+
+        Arguments:
+        ----------
+        t_accs -- (list of str) the list of accession names to check, which may contain repetition
+        """
+
+        counts = Counter(t_accs)
+
+        # count satisfied requirements for each rule
+        n_satisfied = Counter()
+        for acc,count in counts.items():
+            for rule_index,min_count in self.required_index.get(acc,()):
+                if count >= min_count:
+                    n_satisfied[rule_index] += 1
+
+        # exclude rules with forbidden accessions
+        forbidden = set()
+        for acc in counts.keys():
+            forbidden.update( self.forbidden_index.get(acc,()) )
+
+        return sorted(
+            rule_index for rule_index,n in n_satisfied.items()
+            if (n == self.n_required[rule_index]) and (rule_index not in forbidden)
+        )
+
+
+    def categorize_transcripts(self, acc_dict):
+        """
+        categorize transcripts into families
+
+        return a dictionary where
+            keys are family names, in the order of the given criteria
+            values are lists of transcript IDs
+
+        Arguments:
+        ----------
+        acc_dict -- (dict) summary of hmmscan results returned by get_acc_dict
+                    keys are transcript IDs
+                    values are lists of matching accession names
+        """
+
+        # evaluate all rules in one pass over transcripts
+        tids_by_rule = [[] for _ in self.family_names]
+        for t_id,t_accs in acc_dict.items():
+            for rule_index in self.get_matching_rules(t_accs):
+                tids_by_rule[rule_index].append( t_id )
+
+        # combine rules with the same family name
+        tids_by_family = {}
+        for family_name,tids in zip(self.family_names,tids_by_rule):
+            if family_name not in tids_by_family.keys():
+                tids_by_family[family_name] = []
+            tids_by_family[family_name] += tids
+
+        return tids_by_family
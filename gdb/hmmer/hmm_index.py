@@ -0,0 +1,151 @@
+# this file contains an index of models in a (potentially huge) hmm file
+
+# the index records the byte offset and length of each model, so that
+# a subset of models can be copied without parsing the whole file.
+# indices are saved in a cache folder, keyed by the md5 checksum of the hmm file
+
+# local imports
+from ..util import get_known_file_md5, get_cache_folder
+
+import os
+import json
+
+
+class HmmIndex:
+    """
+    The locations of all models in one hmm file
+
+    Get an instance using HmmIndex(hmm_path)
+
+    Attributes:
+    -----------
+    hmm_path : str
+        the path to the indexed hmm file
+    md5sum : str
+        the checksum of the indexed hmm file, or None if
+        the index is not saved and no checksum was given
+    models : list
+        one entry for each model, in file order: [accession, offset, length]
+        accession is None for models without an "ACC" line
+    """
+
+    def __init__(self, hmm_path, md5sum=None, save=True):
+        """
+        Load the index for the given hmm file, building it if necessary
+
+        Arguments:
+        ----------
+        hmm_path -- (str) the path to an hmm file
+        md5sum -- (optional) (str) the known checksum of the hmm file,
+                        to avoid computing it again
+        save -- (optional) (bool) if false, build the index without
+                        saving it in the cache folder, e.g. for temporary files
+        """
+
+        self.hmm_path = hmm_path
+        self.md5sum = md5sum
+        if not save:
+            self.models = _scan_models(hmm_path)
+            return
+
+        if self.md5sum is None:
+            self.md5sum = get_known_file_md5(hmm_path)
+
+        index_path = os.path.join( get_cache_folder("hmm_index"), self.md5sum + ".json" )
+        if os.path.exists(index_path):
+            with open(index_path) as fin:
+                self.models = json.load(fin)
+        else:
+            print( f"building index for hmm file:\n\t{hmm_path}" )
+            self.models = _scan_models(hmm_path)
+            with open(index_path + ".tmp", "w") as fout:
+                json.dump(self.models, fout)
+            os.replace(index_path + ".tmp", index_path)
+
+
+    def get_accessions(self):
+        """
+        Get a list of accession names present in the hmm file
+        """
+        return [acc for acc,_,_ in self.models if acc is not None]
+
+
+    def copy_models(self, accessions, output_path):
+        """
+        Create a new hmm file containing a subset of models
+
+        Models without an accession name are always included
+
+        Arguments:
+        ----------
+        accessions -- (list of str) accession names to include
+        output_path -- (str) the path for the resulting file which will be created or replaced
+        """
+
+        accessions = set(accessions)
+
+        # find byte ranges to copy, merging neighboring models
+        ranges = []
+        for acc,offset,length in self.models:
+            if (acc is not None) and (acc not in accessions):
+                continue
+            if (len(ranges) > 0) and (ranges[-1][0] + ranges[-1][1] == offset):
+                ranges[-1][1] += length
+            else:
+                ranges.append([offset,length])
+
+        with open(self.hmm_path, "rb") as fin:
+            with open(output_path, "wb", buffering=0) as fout:
+                for offset,length in ranges:
+                    _copy_range(fin, fout, offset, length)
+
+
+def _scan_models(hmm_path):
+    """
+    Read the whole hmm file once to find the location of each model
+
+    used in HmmIndex constructor
+    """
+    models = []
+    offset = 0
+    start = 0
+    acc = None
+    with open(hmm_path, "rb") as fin:
+        for line in fin:
+            offset += len(line)
+            if line.startswith(b"ACC"):
+                acc = line.strip().split()[1].split(b".")[0].decode()
+            elif line.startswith(b"//"):
+                models.append([acc, start, offset-start])
+                start = offset
+                acc = None
+    return models
+
+
+def _copy_range(fin, fout, offset, length):
+    """
+    Copy part of one file to another, within the kernel where possible
+    
+    fout should be unbuffered, because sendfile() bypasses python's buffers
+
+    used in HmmIndex.copy_models()
+    """
+    if hasattr(os, "sendfile"):
+        try:
+            while length > 0:
+                n = os.sendfile(fout.fileno(), fin.fileno(), offset, length)
+                if n == 0:
+                    break
+                offset += n
+                length -= n
+            return
+        except OSError:
+            pass
+
+    fin.seek(offset)
+    while length > 0:
+        chunk = fin.read(min(length, 1<<20))
+        if not chunk:
+            break
+        fout.write(chunk)
+        length -= len(chunk)
@@ -2,23 +2,77 @@
 
 # local imports
 from .hmmer_util import read_hmmscan_output
+from .hmmscan_result import HmmscanResult
+from ..fasta import split_fasta,write_unique_sequences,expand_unique_sequence_results
+from ..util import get_file_md5,get_cache_folder
 
 
 import subprocess
 import tempfile
 import shutil
+import os
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 
-def run_hmmpress( hmm_path ):
+def run_hmmpress( hmm_path, use_cache=False ):
     """
     prepare the given hmm file for use with hmmscan
+    
+    By default, the given hmm file is pressed in place. If use_cache 
+    is true, a copy of the hmm file is pressed in a cache folder 
+    keyed by its md5 checksum instead, so pressing an unchanged file 
+    again is instant. The returned path should be passed to hmmscan.
+    
+    return the path to the pressed hmm file
+    
+    Arguments:
+    ----------
+    hmm_path -- (str) the path to an hmm file
+    use_cache -- (optional) (bool) if true, press a cached copy 
+                    of the hmm file instead of the given file
     """
     
-    command = [ "hmmpress", hmm_path ]
-    p = subprocess.Popen(command)
-    p.wait()
+    if not use_cache:
+        _press( hmm_path )
+        return hmm_path
+        
+    cache_folder = get_cache_folder("hmmpress")
+    pressed_folder = os.path.join( cache_folder, get_file_md5(hmm_path) )
+    pressed_path = os.path.join( pressed_folder, "model.hmm" )
+    if os.path.exists(pressed_folder):
+        return pressed_path
+        
+    # press a copy in a temporary folder, then move it into place
+    temp_folder = tempfile.mkdtemp( dir=cache_folder )
+    try:
+        temp_path = os.path.join( temp_folder, "model.hmm" )
+        shutil.copyfile( hmm_path, temp_path )
+        _press( temp_path )
+        os.rename( temp_folder, pressed_folder )
+    except OSError:
+        # another process may have pressed the same file at the same time
+        if not os.path.exists(pressed_folder):
+            raise
+    finally:
+        if os.path.exists(temp_folder):
+            shutil.rmtree(temp_folder)
+        
+    return pressed_path
+
+
+def _press( hmm_path ):
+    """
+    run hmmpress, replacing any existing pressed files
     
+    used in run_hmmpress()
+    """
+    command = [ "hmmpress", "-f", hmm_path ]
+    p = subprocess.run(command)
+    if p.returncode != 0:
+        raise Exception( f"hmmpress failed for {hmm_path}" )
+
 
-def run_hmmscan( hmm_path, fasta_path ):
+def run_hmmscan( hmm_path, fasta_path, cpus=None, deduplicate=False ):
     """
     identify domains in protein sequences
     by executing the command "hmmscan" and parsing the results
@@ -27,21 +81,23 @@ def run_hmmscan( hmm_path, fasta_path ):
     ----------
     hmm_path -- (str) the path to an hmm file containing hidden-markov models
     fasta_path -- (str) the path to a fasta file containing protein sequences
+    cpus -- (optional) (int) the number of worker threads for hmmscan ("--cpu")
+    deduplicate -- (optional) (bool) if true, scan each distinct sequence only once
+                        and copy the results to every record with that sequence
     
     return an instance of HmmscanResult
     """
     
+    if deduplicate:
+        return _scan_unique_sequences( fasta_path, 
+            lambda unique_path: run_hmmscan( hmm_path, unique_path, cpus ) )
+    
     # make a temporary folder
     folder = tempfile.mkdtemp()
     out_path = folder+"/hmmscan_output.txt"
     
      
-    command = [
-        "hmmscan",
-        "--domtblout", out_path,
-        hmm_path,
-        fasta_path
-    ]
+    command = _get_hmmscan_command( hmm_path, fasta_path, out_path, cpus )
     
     p = subprocess.Popen(command)
     p.wait()
@@ -49,4 +105,105 @@ def run_hmmscan( hmm_path, fasta_path ):
     result = read_hmmscan_output(out_path)
     shutil.rmtree(folder)
     
-    return result
\ No newline at end of file
+    return result
+
+
+def run_hmmscan_sharded( hmm_path, fasta_path, n_shards, cpus_per_shard=1, max_retries=2, deduplicate=False ):
+    """
+    identify domains in protein sequences using several
+    concurrent hmmscan processes
+
+    The fasta file is split into shards with similar numbers of residues,
+    and one hmmscan process is run for each shard. Shards that fail are
+    retried. The results are merged in the original order of the fasta file.
+
+    Arguments:
+    ----------
+    hmm_path -- (str) the path to an hmm file containing hidden-markov models
+    fasta_path -- (str) the path to a fasta file containing protein sequences
+    n_shards -- (int) the number of concurrent hmmscan processes
+    cpus_per_shard -- (optional) (int) the number of worker threads for
+                        each hmmscan process ("--cpu")
+    max_retries -- (optional) (int) the number of times a failed shard
+                        will be re-run before giving up
+    deduplicate -- (optional) (bool) if true, scan each distinct sequence only once
+                        and copy the results to every record with that sequence
+
+    return an instance of HmmscanResult
+    """
+
+    if deduplicate:
+        return _scan_unique_sequences( fasta_path, 
+            lambda unique_path: run_hmmscan_sharded( hmm_path, unique_path, 
+                                            n_shards, cpus_per_shard, max_retries ) )
+
+    # make a temporary folder
+    folder = tempfile.mkdtemp()
+
+    try:
+        shard_paths = split_fasta( fasta_path, n_shards, folder )
+        out_paths = [p + ".domtblout" for p in shard_paths]
+        
+        # return an empty result if there are no sequences
+        if len(shard_paths) == 0:
+            return read_hmmscan_output( os.devnull )
+
+        # run one hmmscan process for each shard
+        with ThreadPoolExecutor(max_workers=len(shard_paths)) as pool:
+            results = list(pool.map(
+                lambda paths: _run_hmmscan_shard( hmm_path, *paths, cpus_per_shard, max_retries ),
+                zip(shard_paths,out_paths) ))
+
+        # merge results in original order
+        data = pd.concat( [r.data for r in results], ignore_index=True )
+        return HmmscanResult( data, results[-1].footer )
+
+    finally:
+        shutil.rmtree(folder)
+
+
+def _scan_unique_sequences( fasta_path, scan ):
+    """
+    run the given scan function on the distinct sequences from the given
+    fasta file, then copy the results to every record with each sequence
+
+    return an instance of HmmscanResult
+
+    used in run_hmmscan() and run_hmmscan_sharded()
+    """
+    folder = tempfile.mkdtemp()
+    try:
+        unique_path = os.path.join( folder, os.path.basename(fasta_path) )
+        sequence_map = write_unique_sequences( fasta_path, unique_path )
+        result = scan( unique_path )
+        result.data = expand_unique_sequence_results( result.data, "query name", sequence_map )
+        return result
+    finally:
+        shutil.rmtree(folder)
+
+
+def _run_hmmscan_shard( hmm_path, fasta_path, out_path, cpus, max_retries ):
+    """
+    run hmmscan for one shard, retrying if it fails
+
+    return an instance of HmmscanResult
+
+    used in run_hmmscan_sharded()
+    """
+    command = _get_hmmscan_command( hmm_path, fasta_path, out_path, cpus )
+    for attempt in range(max_retries+1):
+        p = subprocess.run(command, stdout=subprocess.DEVNULL)
+        if p.returncode == 0:
+            return read_hmmscan_output(out_path)
+        print( f"hmmscan failed for shard {fasta_path} (attempt {attempt+1}/{max_retries+1})" )
+    raise Exception( f"hmmscan failed for shard {fasta_path}" )
+
+
+def _get_hmmscan_command( hmm_path, fasta_path, out_path, cpus=None ):
+    """
+    used in run_hmmscan() and _run_hmmscan_shard()
+    """
+    command = [ "hmmscan", "--domtblout", out_path ]
+    if cpus is not None:
+        command += [ "--cpu", str(cpus) ]
+    return command + [ hmm_path, fasta_path ]
@@ -2,8 +2,11 @@
 
 # local imports
 from .hmmscan_result import HmmscanResult
+from .hmm_index import HmmIndex
 
 import pandas as pd
+import io
+import shutil
 
 def get_acc_dict(hmmscan_result):
     """
@@ -17,20 +20,32 @@ def get_acc_dict(hmmscan_result):
     
     Arguments:
     ----------
-    hmmscan_result -- an instance of HmmscanResult
+    hmmscan_result -- an instance of HmmscanResult, or chunks of hmmscan results
+                        e.g. output from iter_hmmscan_output()
     """
     
-    df = hmmscan_result.data
+    if isinstance( hmmscan_result, HmmscanResult ):
+        return _get_acc_dict( hmmscan_result.data )
+    
+    # merge summaries of each chunk
     result = {}
-    for row in df.index:        
-        tid,acc = df.loc[row,["query name","accession"]]
-        acc = df.loc[row,"accession"].split(".")[0]
-        if tid not in result.keys():
-            result[tid] = []
-        result[tid].append( acc )
+    for chunk in hmmscan_result:
+        for tid,accs in _get_acc_dict( chunk.data ).items():
+            if tid not in result.keys():
+                result[tid] = []
+            result[tid] += accs
     return result
 
 
+def _get_acc_dict(df):
+    """
+    used in get_acc_dict()
+    """
+    accs = df["accession"].astype(str).str.split(".").str[0]
+    grouped = accs.groupby( df["query name"], sort=False ).agg(list)
+    return grouped.to_dict()
+
+
 def concatenate_hmms( hmm_paths, output_path ):
     """
     Create a new hmm file containing the contents of two existing hmm files
@@ -42,141 +57,140 @@ def concatenate_hmms( hmm_paths, output_path ):
     output_path -- (str) the path for the resulting file which will be created or replaced
     """
     
-    with open(output_path,"w") as fout:
+    with open(output_path,"wb") as fout:
         for input_path in hmm_paths:
-            with open(input_path) as fin:
-                while True:
-                    line = fin.readline()
-                    if not line:
-                        break
-                    fout.write(line)
+            with open(input_path,"rb") as fin:
+                shutil.copyfileobj(fin, fout, 1<<20)
                 
     
 
-def get_accessions( hmm_path ):
+def get_accessions( hmm_path, md5sum=None, save_index=True ):
     """
     Get a list of accession names present in the given hmm file
-    """
-    result = []
     
-    with open(hmm_path) as fin:
-        while True:
-            line = fin.readline()
-            if not line:
-                break
-            if line.startswith("ACC"):
-                acc = line.strip().split()[1].split(".")[0]
-                result.append(acc)
-
-    return result
+    This uses an index of the hmm file, which is built on first use (see HmmIndex)
+    
+    Arguments:
+    ----------
+    hmm_path -- (str) the path to an existing hmm file
+    md5sum -- (optional) (str) the known checksum of the hmm file
+    save_index -- (optional) (bool) set to false for temporary files,
+                    to avoid saving their index in the cache folder
+    """
+    return HmmIndex(hmm_path, md5sum, save_index).get_accessions()
 
 
-def build_minified_hmm( hmm_path, domain_subset, output_path ):
+def build_minified_hmm( hmm_path, domain_subset, output_path, md5sum=None ):
     """
     Create a new hmm file containing only the necessary domains,
     in order to be used as input for hmmscan
     
+    Models without an "ACC" line are always included
+    
+    This uses an index of the hmm file, which is built on first use (see HmmIndex)
     
     Arguments:
     ----------
     hmm_path -- (str) the path to the existing hmm file containing hidden-markov models
     domain_subset -- (list of str) a subset of "ACC" values present in the existing hmm file
     output_path -- (str) the path for the resulting file which will be created or replaced
+    md5sum -- (optional) (str) the known checksum of the existing hmm file
     """
+    HmmIndex(hmm_path, md5sum).copy_models( domain_subset, output_path )
 
-    missing_acc = set(domain_subset)
-
-    buffer = []
-    with open(hmm_path) as fin:
-        with open(output_path,"w") as fout:
-
-            input_line_index = 0
-            save_section = True
-            
-            while True:
-                line = fin.readline()
-
-                # reached accession label
-                # we may decide to give up on saving the current section
-                if line.startswith("ACC"):
-                    acc = line.strip().split()[1].split(".")[0]
-                    if acc not in domain_subset:
-                        save_section = False
-                    missing_acc.discard(acc)
-
-                # reached end of input section
-                if line.startswith("//"):
-
-                    # save the section that just ended, if necessary
-                    if save_section:
-                        fout.writelines(buffer)
-                        fout.write("//\n")
-                            
-                    # clear the buffer and assume the next section will be save-able
-                    buffer = []
-                    save_section = True
-
-                # reached end of input file
-                if not line:
-                    break
+    
 
-                if save_section and (not line.startswith("//")):
-                    buffer.append( line )
+# columns in hmmscan "--domtblout" output, excluding the free-text description
+hmmscan_columns = [
+    "target name","accession","tlen","query name","_accession","qlen",
+    "E-value","fs_score","fs_bias", # full sequence
+    "#","of","c-Evalue","i-Evalue","td_score","td_bias", # this domain
+    "hmm_from","hmm_to", # hmm coord
+    "ali_from","ali_to", # ali coord
+    "env_from","env_to", # env coord
+    "acc"
+]
 
-                input_line_index += 1
+hmmscan_dtypes = {
+    "target name":str, "accession":str, "tlen":"int64", 
+    "query name":str, "_accession":str, "qlen":"int64",
+    "E-value":"float64", "fs_score":"float64", "fs_bias":"float64",
+    "#":"int64", "of":"int64", "c-Evalue":"float64", "i-Evalue":"float64", 
+    "td_score":"float64", "td_bias":"float64",
+    "hmm_from":"int64", "hmm_to":"int64", "ali_from":"int64", "ali_to":"int64",
+    "env_from":"int64", "env_to":"int64", "acc":"float64"
+}
 
-    #print( f"missing accessions: {missing_acc}" )
-
-    
 
 def read_hmmscan_output(path):
     """
-    Parse a file containing output from hmmscan
+    Parse a file containing output from hmmscan (--domtblout)
     return an instance of HmmscanResult
     """
     
-    # prepare dataframe to contain data
-    colnames = [
-        "target name","accession","tlen","query name","_accession","qlen",
-        "E-value","fs_score","fs_bias", # full sequence
-        "#","of","c-Evalue","i-Evalue","td_score","td_bias", # this domain
-        "hmm_from","hmm_to", # hmm coord
-        "ali_from","ali_to", # ali coord
-        "env_from","env_to", # env coord
-        "acc"
-    ]
-    ncols = len(colnames)
-    df = pd.DataFrame(columns=colnames)
-    
-    # start reading the output file
     with open(path) as fin:
+        text = fin.read()
         
-        # skip 3 lines
-        [fin.readline() for i in range(3)]
-        
-        # parse data
-        i = 0
-        while True:
-            line = fin.readline()
-            if line.startswith("#"):
-                break
-                
-            df.loc[i,:] = line.split()[:ncols]
-            i += 1
-    
-        # extract footer
-        footer = ""
-        while True:
-            line = fin.readline()
-            if not line:
-                break
-            footer += line
-                
-    # remove suffixes from accession names
-    df["accession"] = [s.split(".")[0] for s in df["accession"]]
-                
-    # convert some columns to numeric
-    for col in colnames[4:]:
-        df[col] = pd.to_numeric( df[col], errors="coerce" )
+    # locate data between the comment lines at the top and bottom of the file
+    data_start = 0
+    while text.startswith("#", data_start):
+        data_start = text.find("\n", data_start)+1
+        if data_start == 0:
+            data_start = len(text)
+    data_end = text.find("\n#", data_start-1)
+    data_end = len(text) if data_end == -1 else data_end+1
+    footer = text[data_end:]
+    
+    if data_end > data_start:
+        df = _parse_hmmscan_data( io.StringIO(text[data_start:data_end]) )
+    else:
+        df = pd.DataFrame(columns=hmmscan_columns).astype(hmmscan_dtypes)
+    return HmmscanResult(df, footer)
+
+
+def iter_hmmscan_output(path, chunksize=100000):
+    """
+    Parse a file containing output from hmmscan (--domtblout) in chunks
+    
+    Use this instead of read_hmmscan_output() for outputs larger than memory
+    
+    yields instances of HmmscanResult with at most chunksize rows each. 
+    The footer of each chunk is None
+    
+    Arguments:
+    ----------
+    path -- (str) the path to the hmmscan output file
+    chunksize -- (optional) (int) the maximum number of rows in each chunk
+    """
+    
+    for df in _parse_hmmscan_data( path, chunksize=chunksize ):
+        yield HmmscanResult(df, None)
+    
     
-    return HmmscanResult(df, footer)
\ No newline at end of file
+def _parse_hmmscan_data( source, chunksize=None ):
+    """
+    Tokenize whitespace-delimited hmmscan output in bulk, 
+    skipping comment lines and the free-text description
+    
+    return a DataFrame, or an iterator of DataFrames if chunksize is given
+    
+    used in read_hmmscan_output() and iter_hmmscan_output()
+    """
+    
+    reader = pd.read_csv( source, sep=r"\s+", comment="#", header=None, 
+                        names=hmmscan_columns, usecols=range(len(hmmscan_columns)),
+                        dtype=hmmscan_dtypes, chunksize=chunksize )
+    
+    if chunksize is None:
+        return _clean_hmmscan_data( reader )
+    return (_clean_hmmscan_data(df) for df in reader)
+    
+    
+def _clean_hmmscan_data( df ):
+    """
+    remove suffixes from accession names
+    
+    used in _parse_hmmscan_data()
+    """
+    df["accession"] = df["accession"].str.split(".").str[0]
+    return df
@@ -39,28 +39,25 @@ def get_filtered_hmmscan_result( hmmscan_result ):
     
     returns a new instance of HmmscanResult
     
+    if the input is an iterator of chunks, returns a generator 
+    that yields one filtered HmmscanResult per chunk
+    
     Arguments:
     ----------
-    hmmscan_result -- an instance of HmmscanResult
+    hmmscan_result -- an instance of HmmscanResult, or chunks of hmmscan results
+                        e.g. output from iter_hmmscan_output()
     """
     
+    if not isinstance( hmmscan_result, HmmscanResult ):
+        return (get_filtered_hmmscan_result(chunk) for chunk in hmmscan_result)
+    
     in_df = hmmscan_result.data
-    out_df = pd.DataFrame( columns=in_df.columns )
     
-    # start copying rows from input to output
-    for row in in_df.index:
-        acc_name, score = in_df.loc[row,["accession","fs_score"]]
-        
-        # skip low-scoring rows
-        if acc_name in all_thresholds.keys():
-            threshold = all_thresholds[acc_name]
-            if score < threshold:
-                continue
-                
-        out_df.loc[row,:] = in_df.loc[row,:]
+    # skip low-scoring rows
+    # accessions without a threshold are always kept
+    thresholds = in_df["accession"].map(all_thresholds)
+    low_scoring = in_df["fs_score"] < thresholds
+    out_df = in_df[~low_scoring].copy()
     
     # return filtered data
     return HmmscanResult( out_df, hmmscan_result.footer )
-    
-
-
@@ -2,13 +2,19 @@
 import os
 import pandas as pd
 import gzip
-import hashlib
 import shutil
 import urllib.request as request
 from contextlib import closing
 
-class InputManager:
+# local imports
+from .util import get_file_md5
 
+class InputManager:
+    
+    # local files to use in place of the listed inputs, shared by all instances
+    # see set_override()
+    overrides = {}
+    
     
     def __init__(self):
         
@@ -56,6 +62,25 @@ class InputManager:
         return self.get_input_filepath(name)
     
     
+    @classmethod
+    def set_override(cls, name, path):
+        """
+        use the given local file in place of the input with the given name,
+        for all instances of InputManager. The file's integrity will not be checked.
+        
+        This is intended for tests and benchmarks with synthetic data
+        
+        Arguments:
+        ----------
+        name -- (str) the short name of an input, e.g. "old_grassius_names"
+        path -- (str) the path to use, or None to remove an existing override
+        """
+        if path is None:
+            cls.overrides.pop(name, None)
+        else:
+            cls.overrides[name] = path
+        
+        
     def get_input_filepath(self, name):
         """
         download and extract the file if necessary
@@ -63,6 +88,10 @@ class InputManager:
         return the local path for the given input file
         """
         
+        # check for a local replacement
+        if name in InputManager.overrides.keys():
+            return InputManager.overrides[name]
+        
         # get metadata
         if name not in self.df["name"].values:
             raise Exception(f'unrecognized input name "{name}"')
@@ -100,12 +129,8 @@ class InputManager:
             
         # check integrity
         print( f'checking integrity of input "{name}"...' )
-        with open(filepath, "rb") as f:
-            file_hash = hashlib.md5()
-            while chunk := f.read(8192):
-                file_hash.update(chunk)
-            if file_hash.hexdigest() != md5sum:
-                raise Exception(f'integrity check failed for input "{name}"\n\tlocal path: {filepath}')
+        if get_file_md5(filepath) != md5sum:
+            raise Exception(f'integrity check failed for input "{name}"\n\tlocal path: {filepath}')
         print( 'Integrity is good!' )
         
         return filepath
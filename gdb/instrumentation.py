@@ -0,0 +1,243 @@
+# this file contains lightweight instrumentation for measuring build performance
+
+# a "span" measures one block of code: wall time, cpu time, peak memory,
+# and optionally the number of rows/records processed. Spans may be nested.
+# finished spans are collected, and may be written to a json report
+# to track performance across releases. Finished spans with the same path
+# (e.g. repeated calls to one function) are combined into one entry,
+# so memory use does not grow with the number of calls.
+
+import os
+import sys
+import json
+import time
+import platform
+import threading
+import functools
+from contextlib import contextmanager
+
+# resource is not available on windows
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# keys are span paths, values are combined Span objects, in the order they first finished
+_finished_spans = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class Span:
+    """
+    Measurements for one instrumented block of code
+
+    Get an instance using "with span(name) as s:"
+
+    Attributes:
+    -----------
+    name : str
+        the name of the span, e.g. "ChadoBuilder.insert_sequences"
+    path : str
+        names of all enclosing spans in the same thread, and this span, joined with "/"
+    rows : int
+        the number of rows or records processed, reported with add_rows()
+    wall_time : float
+        elapsed time in seconds
+    cpu_time : float
+        cpu time in seconds used by the thread that ran the span.
+        this does not include subprocesses, or work done in other threads
+    peak_rss_mb : float
+        the peak resident memory of the process in MB, at the end of the span
+        None if it can not be measured on this platform
+    count : int
+        the number of finished spans combined into this one. rows, wall_time
+        and cpu_time are totals, and peak_rss_mb is the maximum
+    """
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.rows = 0
+        self.wall_time = None
+        self.cpu_time = None
+        self.peak_rss_mb = None
+        self.count = 1
+
+
+    def add_rows(self, n):
+        """
+        Record that n more rows or records were processed
+        """
+        self.rows += n
+
+
+    def to_dict(self):
+        """
+        Get a json-compatible summary of this span
+        """
+        rate = None
+        if self.rows > 0 and self.wall_time > 0:
+            rate = self.rows / self.wall_time
+        return {
+            "name": self.name,
+            "path": self.path,
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "peak_rss_mb": self.peak_rss_mb,
+            "rows": self.rows,
+            "rows_per_second": rate,
+            "count": self.count,
+        }
+
+
+@contextmanager
+def span(name):
+    """
+    Context manager to measure a block of code
+
+    e.g.
+        with span("load sequences") as s:
+            for rec in records:
+                ...
+                s.add_rows(1)
+
+    Arguments:
+    ----------
+    name -- (str) the name of the span
+    """
+    stack = _get_stack()
+    path = "/".join( [s.name for s in stack] + [name] )
+    s = Span( name, path )
+
+    stack.append(s)
+    start_wall = time.perf_counter()
+    start_cpu = time.thread_time()
+    try:
+        yield s
+    finally:
+        s.wall_time = time.perf_counter() - start_wall
+        s.cpu_time = time.thread_time() - start_cpu
+        s.peak_rss_mb = get_peak_rss_mb()
+        stack.pop()
+        with _lock:
+            _add_finished_span(s)
+
+
+def instrument(name=None):
+    """
+    Decorator to measure every call to a function with span()
+
+    Arguments:
+    ----------
+    name -- (optional) (str) the name of the span. defaults
+            to the qualified function name, e.g. "ChadoBuilder.insert_sequences"
+    """
+    def decorator(func):
+        span_name = func.__qualname__ if name is None else name
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add_rows(n):
+    """
+    Record that n more rows or records were processed in the
+    innermost span of the current thread
+
+    This has no effect if there is no current span
+    """
+    stack = _get_stack()
+    if len(stack) > 0:
+        stack[-1].add_rows(n)
+
+
+def get_finished_spans():
+    """
+    Get a list of all finished spans, in the order they first finished
+
+    spans with the same path are combined (see Span.count)
+    """
+    with _lock:
+        return list(_finished_spans.values())
+
+
+def clear_finished_spans():
+    """
+    Forget all finished spans, e.g. before starting a new build
+    """
+    with _lock:
+        _finished_spans.clear()
+
+
+def write_report(output_path):
+    """
+    Save all finished spans to a json file
+
+    Arguments:
+    ----------
+    output_path -- (str) the path for the json file which will be created or replaced
+    """
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "spans": [s.to_dict() for s in get_finished_spans()],
+    }
+    with open(output_path, "w") as fout:
+        json.dump(report, fout, indent=2)
+    print( "performance report saved to " + output_path )
+
+
+def get_peak_rss_mb():
+    """
+    Get the peak resident memory of this process so far, in MB
+
+    return None if it can not be measured on this platform
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak / (1<<20)
+    return peak / (1<<10)
+
+
+def _add_finished_span(s):
+    """
+    Add a span to the finished spans, combining it with
+    an earlier span with the same path
+
+    _lock must be held
+
+    used in span()
+    """
+    total = _finished_spans.get(s.path)
+    if total is None:
+        total = Span( s.name, s.path )
+        total.count = 0
+        total.wall_time = 0
+        total.cpu_time = 0
+        _finished_spans[s.path] = total
+
+    total.count += 1
+    total.rows += s.rows
+    total.wall_time += s.wall_time
+    total.cpu_time += s.cpu_time
+    if s.peak_rss_mb is not None:
+        total.peak_rss_mb = max( s.peak_rss_mb, total.peak_rss_mb or 0 )
+
+
+def _get_stack():
+    """
+    Get the list of open spans in the current thread
+    """
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
@@ -1,2 +1,3 @@
 from .itak_runner import ItakRunner
-from .itak_util import get_gene_families
\ No newline at end of file
+from .itak_util import get_gene_families, resolve_transcript_families, read_itak_output, merge_itak_outputs
+from .itak_database import get_itak_database
\ No newline at end of file
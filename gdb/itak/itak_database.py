@@ -0,0 +1,94 @@
+# this file contains a cache of ready-to-use iTAK database folders
+
+# each cached folder is a fresh copy of the original iTAK database
+# (from input "itak_git_repo"), with extra hm models appended to
+# Tfam_domain.hmm and with a replacement TF_Rule.txt
+
+# folders are keyed by hashes of all three inputs, so they are never
+# modified after they are built. iTAK writes files into its database
+# folder while running (e.g. pressed hmm files), so it must be run
+# with a copy of the cached folder, never with the cached folder itself
+
+
+# local imports
+from ..input_manager import InputManager
+from ..util import get_file_md5, get_cache_folder
+from ..hmmer import concatenate_hmms
+from .itak_util import get_rules_text
+
+import os
+import shutil
+import hashlib
+import tempfile
+import zipfile
+
+
+def get_itak_database( hmm_filepath, rules_df ):
+    """
+    Find or build an iTAK database folder that will apply the
+    given hm models and criteria
+
+    return the path to the database folder
+
+    Arguments:
+    ----------
+    hmm_filepath -- (str) the path to an hmm file
+    rules_df -- (DataFrame) the criteria for classifying transcripts
+                       output from gdb.hmmer.get_family_criteria()
+                       must contain columns "Required", "Forbidden", and "GRASSIUS"
+    """
+
+    zip_path = InputManager()["itak_git_repo"]
+    rules_text = get_rules_text(rules_df)
+    key = get_itak_database_key( zip_path, hmm_filepath, rules_text )
+
+    cache_folder = get_cache_folder("itak_database")
+    database_folder = os.path.join( cache_folder, key )
+    if os.path.exists(database_folder):
+        print( f"using cached itak database:\n\t{database_folder}" )
+        return database_folder
+
+    print( f"building itak database:\n\t{database_folder}" )
+    temp_folder = tempfile.mkdtemp( dir=cache_folder )
+    try:
+
+        # extract the original database from the iTAK repository
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            members = [m for m in zip_ref.namelist() if m.startswith("iTAK-master/database/")]
+            zip_ref.extractall( temp_folder, members )
+        new_folder = os.path.join( temp_folder, "iTAK-master", "database" )
+
+        # append hmm file to the original hmm file in the database
+        original_hmm_path = os.path.join( new_folder, "Tfam_domain.hmm" )
+        combined_hmm_path = os.path.join( temp_folder, "combined.hmm" )
+        concatenate_hmms( [original_hmm_path,hmm_filepath], combined_hmm_path )
+        os.replace( combined_hmm_path, original_hmm_path )
+
+        # replace rules
+        with open( os.path.join( new_folder, "TF_Rule.txt" ), "w" ) as fout:
+            fout.write( rules_text )
+
+        os.rename( new_folder, database_folder )
+
+    except OSError:
+        # another process may have built the same database at the same time
+        if not os.path.exists(database_folder):
+            raise
+    finally:
+        shutil.rmtree(temp_folder)
+
+    return database_folder
+
+
+def get_itak_database_key( zip_path, hmm_filepath, rules_text ):
+    """
+    Get a string that identifies the contents of an iTAK database
+
+    used in get_itak_database()
+    """
+
+    h = hashlib.md5()
+    h.update( get_file_md5(zip_path).encode() )
+    h.update( get_file_md5(hmm_filepath).encode() )
+    h.update( rules_text.encode('utf-8') )
+    return h.hexdigest()
@@ -4,20 +4,31 @@
 #  rules will be replaced (iTAK/database/TF_Rule.txt)
 #  hmm files will be replaced (iTAK/database/*.hmm)
 
-# this file contains logic to replace those files
+# this file contains logic to replace those files,
+# by copying a cached database folder into the iTAK folder (see itak_database.py)
 
 
 # local imports
 from ..input_manager import InputManager
-from .itak_util import read_itak_output, build_rules_file
-from ..hmmer import concatenate_hmms
+from .itak_util import read_itak_output, merge_itak_outputs
+from .itak_database import get_itak_database
+from ..fasta import write_unique_sequences, expand_unique_sequence_results, split_fasta
+from ..util import get_file_md5, get_known_file_md5, get_cache_folder
 
 import zipfile
 import os,sys,stat
 import subprocess
 import shutil
 import tempfile
+import hashlib
+import pandas as pd
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+
+# file written into the local iTAK database folder by set_database(),
+# containing the key of the cached database that was copied there
+database_key_filename = "gdb_database_key.txt"
 
 
 
@@ -49,6 +60,9 @@ class ItakRunner:
             with zipfile.ZipFile(zip_path, 'r') as zip_ref:
                 zip_ref.extractall(self.folder)
         
+        # identify the version of iTAK, for caching results
+        self.itak_version = get_file_md5(zip_path)
+        
         # verify that the iTAK executable exists
         exe_path = self.folder + "/iTAK-master/iTAK.pl"
         if not os.path.exists( exe_path ):
@@ -72,6 +86,8 @@ class ItakRunner:
         command = [ "perl", "iTAK.pl", "test_seq" ]
         p = subprocess.Popen(command, cwd=wd)
         p.wait()
+        if p.returncode != 0:
+            raise Exception( f"iTAK failed with exit status {p.returncode}" )
         
         return read_itak_output( wd + "/test_seq_output" )
     
@@ -81,6 +97,12 @@ class ItakRunner:
         Replace the iTAK database, so future runs will apply the 
         given hm models and criteria
         
+        The database is built in a cache (see gdb.itak.get_itak_database), 
+        so a repeated call with unchanged inputs reuses the existing database.
+        The cached database is copied into the local iTAK folder, because 
+        iTAK writes files into its database folder while running. The copy 
+        is skipped if the local iTAK folder already has the same database.
+        
         Arguments:
         ----------
         hmm_filepath -- (str) the path to an hmm file
@@ -89,52 +111,196 @@ class ItakRunner:
                            must contain columns "Required", "Forbidden", and "GRASSIUS"
         """
         
-    
+        cached_folder = get_itak_database( hmm_filepath, rules_df )
+        key = os.path.basename( cached_folder )
+        
+        # check which database is installed
         database_folder = self.folder + "/iTAK-master/database"
+        key_path = os.path.join( database_folder, database_key_filename )
+        if os.path.exists( key_path ):
+            with open( key_path ) as fin:
+                if fin.read().strip() == key:
+                    print( f"using installed itak database:\n\t{database_folder}" )
+                    return
         
-        # append hmm file to the original hmm file in the database
-        temp_folder = tempfile.mkdtemp()
-        original_hmm_path = database_folder + "/Tfam_domain.hmm"
-        combined_hmm_path = temp_folder + "/combined.hmm"
-        concatenate_hmms( [original_hmm_path,hmm_filepath], combined_hmm_path )
-        shutil.copyfile(combined_hmm_path, original_hmm_path)
-        shutil.rmtree(temp_folder)
+        # replace the database folder or previous symlink
+        if os.path.islink( database_folder ):
+            os.unlink( database_folder )
+        elif os.path.exists( database_folder ):
+            shutil.rmtree( database_folder )
+        shutil.copytree( cached_folder, database_folder )
         
-        # rebuild rules
-        build_rules_file(database_folder, rules_df)
+        # the key file is written last, so an incomplete copy is replaced next time
+        with open( key_path, "w" ) as fout:
+            fout.write( key )
         
         
         
-    def run_itak(self, fasta_filepath, n_cores=1):
+    def run_itak(self, fasta_filepath, n_cores=1, deduplicate=False, n_shards=1, use_cache=True):
         """
         classify transcripts from the given fasta file
         
         database should be prepared ahead of time using set_database()
         
+        Each run uses its own working copy of the iTAK folder (hard-linked 
+        where possible), so several runs may happen at the same time.
+        
+        Results are cached, keyed by checksums of the fasta file, the hmm 
+        and rules files in the iTAK database, the iTAK version, and the code 
+        that runs iTAK and parses its output. A repeated run with unchanged 
+        inputs returns the cached result without running iTAK. Empty results 
+        are not cached.
+        
         Arguments:
         ----------
         fasta_filepath -- (str) path to the fasta file to analyze
-        n_cores -- (optional) (int) the number of CPUs to use for hmmscan
+        n_cores -- (optional) (int) the number of CPUs to use for hmmscan, 
+                        in each iTAK process
+        deduplicate -- (optional) (bool) if true, classify each distinct sequence 
+                        only once and copy the results to every transcript 
+                        with that sequence
+        n_shards -- (optional) (int) the number of concurrent iTAK processes.
+                        the fasta file is split into shards with similar 
+                        numbers of residues, and the results are merged
+        use_cache -- (optional) (bool) if false, always run iTAK and 
+                        do not save the result
+        """
+        
+        if not use_cache:
+            return self._classify( fasta_filepath, n_cores, deduplicate, n_shards )
+            
+        cache_path = self._get_result_cache_path( fasta_filepath )
+        if os.path.exists( cache_path ):
+            print( f"using cached itak results:\n\t{cache_path}" )
+            return pd.read_pickle( cache_path )
+            
+        result = self._classify( fasta_filepath, n_cores, deduplicate, n_shards )
+        
+        # an empty result may come from a broken run, so it is not cached
+        if len(result.index) > 0:
+            result.to_pickle( cache_path + ".tmp" )
+            os.replace( cache_path + ".tmp", cache_path )
+        return result
+        
+        
+    def _get_result_cache_path(self, fasta_filepath):
+        """
+        Get the path where results for the given fasta file 
+        and the current iTAK database would be cached
+        
+        used in run_itak()
+        """
+        database_folder = self.folder + "/iTAK-master/database"
+        key = hashlib.md5()
+        for part in [ 
+                get_known_file_md5( fasta_filepath ),
+                get_file_md5( database_folder + "/Tfam_domain.hmm" ),
+                get_file_md5( database_folder + "/TF_Rule.txt" ),
+                self.itak_version,
+                _get_code_version() ]:
+            key.update( part.encode() )
+        return os.path.join( get_cache_folder("itak_results"), key.hexdigest() + ".pkl" )
+        
+        
+    def _classify(self, fasta_filepath, n_cores, deduplicate, n_shards):
+        """
+        run iTAK without caching
+        
+        used in run_itak()
         """
         
-        # copy fasta file to working dir
-        wd = self.folder + "/iTAK-master"
         fname = os.path.basename( fasta_filepath )
-        shutil.copyfile( fasta_filepath, os.path.join( wd, fname ) )
+        job_folder = tempfile.mkdtemp( dir=self.folder, prefix="job_" )
+        try:
+            
+            # copy fasta file to job folder
+            # or just the distinct sequences, if deduplicating
+            input_path = os.path.join( job_folder, fname )
+            if deduplicate:
+                sequence_map = write_unique_sequences( fasta_filepath, input_path )
+            else:
+                shutil.copyfile( fasta_filepath, input_path )
+            
+            # split into shards if necessary
+            if n_shards > 1:
+                shard_folder = os.path.join( job_folder, "shards" )
+                os.mkdir( shard_folder )
+                shard_paths = split_fasta( input_path, n_shards, shard_folder )
+            else:
+                shard_paths = [input_path]
+                
+            # run iTAK for each shard
+            with ThreadPoolExecutor(max_workers=max(1,len(shard_paths))) as pool:
+                output_folders = list(pool.map( 
+                    lambda path: self._run_itak_shard( path, n_cores, job_folder ), 
+                    shard_paths ))
+            
+            # merge results
+            merged_folder = os.path.join( job_folder, f"{fname}_output" )
+            merge_itak_outputs( output_folders, merged_folder )
+            result = read_itak_output( merged_folder )
+            
+        finally:
+            shutil.rmtree( job_folder )
         
-        # run iTAK
-        command = [ "perl", "iTAK.pl", "-a", str(n_cores), fname ]
-        p = subprocess.Popen(command, cwd=wd)
-        p.wait()
+        if deduplicate:
+            result = expand_unique_sequence_results( result, "transcript_id", sequence_map )
+        return result
         
-        return read_itak_output( wd + f"/{fname}_output" )
         
+    def _run_itak_shard(self, fasta_path, n_cores, job_folder):
+        """
+        Run iTAK for one fasta file in an isolated copy of the iTAK folder
         
+        return the path to the iTAK output folder
         
+        used in _classify()
+        """
         
+        # make a working copy of the iTAK folder
+        # files are hard-linked where possible, except for the database folder,
+        # where iTAK writes pressed hmm files. Those files must not be shared.
+        # the fasta file and the output folder are new files in the working copy
+        src = self.folder + "/iTAK-master"
+        wd = os.path.join( tempfile.mkdtemp( dir=job_folder ), "iTAK-master" )
+        shutil.copytree( src, wd, copy_function=_link_or_copy,
+                         ignore=lambda folder,names: ["database"] if folder == src else [] )
+        shutil.copytree( src + "/database", wd + "/database" )
+        
+        # run iTAK
+        fname = os.path.basename( fasta_path )
+        shutil.copyfile( fasta_path, os.path.join( wd, fname ) )
+        command = [ "perl", "iTAK.pl", "-a", str(n_cores), fname ]
+        p = subprocess.Popen(command, cwd=wd)
+        p.wait()
+        if p.returncode != 0:
+            raise Exception( f"iTAK failed with exit status {p.returncode} for {fname}" )
         
+        return wd + f"/{fname}_output"
         
         
+def _link_or_copy( src, dst ):
+    """
+    hard-link a file, or copy it if hard links are not possible
+    (e.g. across devices)
+    
+    used in ItakRunner._run_itak_shard()
+    """
+    try:
+        os.link( src, dst )
+    except OSError:
+        shutil.copy2( src, dst )
         
         
-        
\ No newline at end of file
+def _get_code_version():
+    """
+    Get a checksum of the source files that run iTAK and parse 
+    its output, so that cached results are discarded when they change
+    
+    used in ItakRunner._get_result_cache_path()
+    """
+    folder = os.path.dirname( os.path.abspath(__file__) )
+    key = hashlib.md5()
+    for fname in ["itak_runner.py","itak_util.py","itak_database.py"]:
+        key.update( get_file_md5( os.path.join(folder,fname) ).encode() )
+    return key.hexdigest()
@@ -3,8 +3,63 @@
 #   - parsing and interpreting output from iTAK
 
 import pandas as pd
+import os
 
 
+def resolve_transcript_families( itak_results, transcript_genes, priority_families=(), special_cases=None ):
+    """
+    pick one family for each transcript, based on all 
+    the families that iTAK matched to the transcript
+    
+    the family is chosen using these steps, in order:
+        1. special cases: a family is chosen if it matched the transcript 
+            and the gene is in the given set of gene IDs for that family
+        2. priority families: the first family in the priority 
+            list that matched the transcript
+        3. otherwise, the first family listed in the itak results
+    
+    return a dictionary where
+        keys are transcript IDs, in order of first appearance in itak_results
+        values are family names
+    
+    Arguments:
+    ----------
+    itak_results -- (DataFrame) output from ItakRunner.run_itak() or read_itak_output()
+                    must contain columns "transcript_id" and "family"
+    transcript_genes -- (dict) transcript_id -> gene_id
+                    typically output from gdb.fasta.get_transcript_gene_dict()
+    priority_families -- (optional) (list of str) families to choose first, 
+                    in order of preference
+    special_cases -- (optional) (dict) family name -> list of gene IDs, 
+                    in order of preference 
+                    e.g. {'MYB':old_myb_gids} to keep genes in MYB if 
+                    they were MYB in old grassius
+    """
+    
+    if special_cases is None:
+        special_cases = {}
+    df = itak_results[['transcript_id','family']]
+    
+    # start with the first family listed for each transcript
+    result = df.groupby('transcript_id', sort=False)['family'].first()
+    tids = result.index
+    gids = tids.map(transcript_genes)
+    if gids.isna().any():
+        raise KeyError( tids[gids.isna()][0] )
+    
+    # apply rules from lowest to highest precedence, 
+    # so that later assignments override earlier ones
+    for family in reversed(priority_families):
+        matched_tids = df.loc[df['family'] == family, 'transcript_id']
+        result[tids.isin(matched_tids)] = family
+        
+    for family,family_gids in reversed(list(special_cases.items())):
+        matched_tids = df.loc[df['family'] == family, 'transcript_id']
+        result[tids.isin(matched_tids) & gids.isin(family_gids)] = family
+    
+    return dict(zip( tids.tolist(), result.tolist() ))
+    
+    
 def get_gene_families( transcript_families, transcript_genes, conflict_report_path=None ):
     """
     convert from raw itak results (based on transcript IDs)
@@ -27,23 +82,31 @@ def get_gene_families( transcript_families, transcript_genes, conflict_report_pa
                     conflicting transcripts
     """
    
-    # prepare to store conflicts and results
-    conflict_count = 0
-    conflict_report = ""
-    df = pd.DataFrame(columns=['gene_id','family','transcript_id'])
-    
-    # iterate through itak results
-    for tid,family in transcript_families.items():
-        gid = transcript_genes[tid]
-        if gid in df['gene_id']:
-            ex_fam,ex_tid = df.loc[ df['gene_id'] == gid, ['family','transcript_id'] ].values[0]
-            if ex_fam != family:
-                conflict_count += 1
-                conflict_report += "\n\t".join(["conflict:",
-                        f"transcript {ex_tid} has family {ex_fam}",
-                        f"transcript {tid} has family {family}\n"])
-        else:
-            df.loc[gid,:] = [gid,family,tid]
+    # look up the gene for each transcript
+    df = pd.DataFrame({
+        'transcript_id': list(transcript_families.keys()),
+        'family': list(transcript_families.values()),
+    })
+    df['gene_id'] = df['transcript_id'].map(transcript_genes)
+    missing = df['gene_id'].isna()
+    if missing.any():
+        raise KeyError( df.loc[missing,'transcript_id'].iloc[0] )
+    
+    # keep the first transcript for each gene
+    result = df.drop_duplicates('gene_id')[['gene_id','family','transcript_id']].astype(object)
+    result.index = result['gene_id'].values
+    
+    # find later transcripts that disagree with the first transcript for their gene
+    df['ex_family'] = df['gene_id'].map(result['family'])
+    df['ex_tid'] = df['gene_id'].map(result['transcript_id'])
+    conflicts = df[df['family'] != df['ex_family']]
+    conflict_count = len(conflicts.index)
+    conflict_report = "".join(
+        "\n\t".join(["conflict:",
+                f"transcript {ex_tid} has family {ex_fam}",
+                f"transcript {tid} has family {family}\n"])
+        for tid,family,ex_tid,ex_fam in zip( conflicts['transcript_id'], conflicts['family'],
+                                             conflicts['ex_tid'], conflicts['ex_family'] ))
             
     # write report file if necessary
     if conflict_report_path is not None:
@@ -51,7 +114,7 @@ def get_gene_families( transcript_families, transcript_genes, conflict_report_pa
             fout.write( f"{conflict_count} pairs of transcripts had conflicting families\n\n" )
             fout.write( conflict_report )
             
-    return df
+    return result
     
     
 
@@ -75,19 +138,67 @@ def read_itak_output( output_folder ):
     """
     
     # load custom output file
-    result = pd.read_table(output_folder + "/tf_all_matches.txt", 
-                         header=None, names=['transcript_id','family'])
-    result['final'] = False
+    result = _read_itak_table(output_folder + "/tf_all_matches.txt")
     
     # load traditional output file
-    df = pd.read_table(output_folder + "/tf_classification.txt", header = None)
-    for row in df.index:
-        tid,family = df.loc[row,[0,1]]
-        result.loc[(result['transcript_id']==tid) & (result['family']==family),
-                   "final"] = True
+    df = _read_itak_table(output_folder + "/tf_classification.txt")
+    
+    # mark entries that are present in both files
+    merged = result.merge( df.drop_duplicates(), how='left', 
+                           on=['transcript_id','family'], indicator=True )
+    result['final'] = (merged['_merge'] == 'both').values
         
     return result
     
+    
+def _read_itak_table( path ):
+    """
+    Read the first two columns (transcript ID and family) 
+    from an iTAK output file, which may be empty
+    
+    used in read_itak_output()
+    """
+    
+    names = ['transcript_id','family']
+    if os.path.getsize(path) == 0:
+        return pd.DataFrame({name:pd.Series(dtype=object) for name in names})
+    return pd.read_table(path, header=None, usecols=[0,1], names=names)
+    
+
+
+def merge_itak_outputs( output_folders, merged_folder ):
+    """
+    Combine the output of several iTAK runs into one output folder,
+    which may be parsed with read_itak_output()
+    
+    The files "tf_all_matches.txt" and "tf_classification.txt" are 
+    concatenated in the given order. Both files must exist in every 
+    output folder, otherwise the iTAK run is assumed to have failed.
+    
+    Arguments:
+    ----------
+    output_folders -- (list of str) paths to iTAK output folders
+    merged_folder -- (str) the path for the new output folder
+    """
+    
+    fnames = ["tf_all_matches.txt","tf_classification.txt"]
+    for folder in output_folders:
+        for fname in fnames:
+            path = os.path.join(folder,fname)
+            if not os.path.exists(path):
+                raise Exception( f"missing iTAK output file:\n\t{path}" )
+    
+    os.makedirs( merged_folder, exist_ok=True )
+    for fname in fnames:
+        with open( os.path.join(merged_folder,fname), "wb" ) as fout:
+            for folder in output_folders:
+                path = os.path.join(folder,fname)
+                with open(path, "rb") as fin:
+                    data = fin.read()
+                fout.write(data)
+                if len(data) > 0 and not data.endswith(b"\n"):
+                    fout.write(b"\n")
+    
 
 
 def build_rules_file( database_folder, rules_df ):
@@ -103,26 +214,42 @@ def build_rules_file( database_folder, rules_df ):
                        must contain columns "Required", "Forbidden", and "GRASSIUS"
     """
     
-    
     with open( database_folder + "/TF_Rule.txt", "w") as fout:
-        for row in rules_df.index:
-            req,forb,name = rules_df.loc[row,["Required","Forbidden","GRASSIUS"]]
+        fout.write( get_rules_text(rules_df) )
+        
+        
+def get_rules_text( rules_df ):
+    """
+    Get the contents of an iTAK rules file ("TF_Rule.txt")
+    
+    Arguments:
+    ----------
+    rules_df -- (DataFrame) the criteria for classifying transcripts
+                       output from gdb.hmmer.get_family_criteria()
+                       must contain columns "Required", "Forbidden", and "GRASSIUS"
+    """
+    
+    entries = []
+    for row in rules_df.index:
+        req,forb,name = rules_df.loc[row,["Required","Forbidden","GRASSIUS"]]
+        
+        id = str(row)
+        while(len(id) < 4):
+            id = "0" + id
+            
+        if len(forb.strip()) == 0:
+            forb = "NA"
             
-            id = str(row)
-            while(len(id) < 4):
-                id = "0" + id
-                
-            if len(forb.strip()) == 0:
-                forb = "NA"
-                
-            fout.write( "\n".join([
-                f"ID:T{id}",
-                f"Name:{name}",
-                f"Family:{name}",
-                f"Required:{req}",
-                "Auxiiary:NA",
-                f"Forbidden:{forb}",
-                "Type:TF",
-                "Desc:NA",
-                "//\n\n"
-            ]))
\ No newline at end of file
+        entries.append( "\n".join([
+            f"ID:T{id}",
+            f"Name:{name}",
+            f"Family:{name}",
+            f"Required:{req}",
+            "Auxiiary:NA",
+            f"Forbidden:{forb}",
+            "Type:TF",
+            "Desc:NA",
+            "//\n\n"
+        ]))
+        
+    return "".join(entries)
@@ -6,6 +6,10 @@ at the end of the database builder pipeline. They may
 also be applied to an existing database. Re-applying 
 patches may be necessary if the database is modified, 
 otherwise they will have no effect.
+
+Applied patches are recorded in the table "patch_ledger" 
+in the patched database. A patch is skipped if neither the 
+patch nor the tables it uses have changed since it was applied.
 """
 
 from .apply_patches import apply_all_patches
\ No newline at end of file
@@ -1,32 +1,322 @@
+# local imports
+from ..instrumentation import span, instrument
+from ..util import get_file_md5
+
 import os
+import json
+import hashlib
 import importlib.util
 import sys
+import threading
+import psycopg2
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+# Each patch file may declare the tables it uses, as module-level lists:
+#
+#   depends_on = [...]   tables that the patch reads
+#   modifies = [...]     tables that the patch creates or changes
+#   input_files = [...]  (optional) paths to other files that the patch reads
+#
+# Before a patch is applied, the patch file and the tables and files it
+# reads are fingerprinted, and the fingerprint is recorded in the table
+# "patch_ledger". A patch is skipped if the fingerprint has not changed
+# since it was last applied, so patches must give the same result when
+# they are applied again. Patches that do not share tables are applied
+# at the same time.
+#
+# Patches without declarations are always applied, one at a time.
+
+
+# files in the patches folder that contain code shared by patches.
+# if one of these files changes, all patches are applied again
+patch_helper_files = ["util.py"]
 
-def apply_all_patches(cb):
+# large columns that are left out of table fingerprints.
+# keys are table names, values are lists of column names.
+# columns derived from these (e.g. feature.md5checksum and 
+# feature.seqlen for feature.residues) are still included
+fingerprint_excluded_columns = {
+    "feature": ["residues"],
+}
+
+
+@instrument()
+def apply_all_patches(cb, force=False, max_workers=4, folder=None):
     """
-    Apply all patches in order
-    
+    Apply all patches in order, skipping patches that were
+    already applied to the current state of the database
+
     Arguments:
     ----------
-    cb - a ChadoBuilder instance, connected to the 
+    cb - a ChadoBuilder instance, connected to the
             database that should be patched.
+    force - (optional) (bool) if true, apply all patches
+            even if they were already applied
+    max_workers - (optional) (int) the maximum number of
+            patches that will be applied at the same time
+    folder - (optional) (str) the folder containing patch files.
+            defaults to the folder containing this file
     """
-    folder = os.path.dirname(os.path.abspath(__file__))
+    if folder is None:
+        folder = os.path.dirname(os.path.abspath(__file__))
     all_patch_files = _get_patch_filenames(folder)
-    for fname in all_patch_files:
+    patches = { fname:_load_patch(os.path.join(folder,fname)) for fname in all_patch_files }
+    dependencies = _get_patch_dependencies( all_patch_files, patches )
+
+    ledger = _PatchLedger( cb.conn_str )
+    fingerprinter = _TableFingerprints( cb.conn_str )
+    helper_hashes = [ get_file_md5(os.path.join(folder,fname))
+                      for fname in patch_helper_files
+                      if os.path.exists(os.path.join(folder,fname)) ]
+
+    def apply(fname):
         path = os.path.join(folder,fname)
+        patch = patches[fname]
+        file_hash = _get_code_hash( [get_file_md5(path)] + helper_hashes )
+        declared = not _is_undeclared(patch)
+
+        # fingerprint the patch's inputs before applying it,
+        # and check the ledger
+        fingerprint = _get_patch_fingerprint( patch, fingerprinter ) if declared else None
+        if declared and (not force) and (ledger.get(fname) == (file_hash,fingerprint)):
+            print(f"skipping patch (already applied):\n\t{path}\n")
+            return
+
         print(f"applying patch:\n\t{path}\n")
-        
-        spec = importlib.util.spec_from_file_location("patch", path)
-        patch = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(patch)
-        patch.apply_patch(cb)
-        
-            
+        with span( "patch " + fname ):
+            patch.apply_patch(cb)
+
+        fingerprinter.invalidate( getattr(patch,"modifies",None) )
+        ledger.record( fname, file_hash, fingerprint )
+
+    # apply each patch after the patches it depends on
+    pending = list(all_patch_files)
+    finished = set()
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while len(pending) > 0 or len(running) > 0:
+            for fname in list(pending):
+                if dependencies[fname].issubset(finished):
+                    pending.remove(fname)
+                    running[pool.submit(apply, fname)] = fname
+
+            done,_ = wait( running.keys(), return_when=FIRST_COMPLETED )
+            for future in done:
+                fname = running.pop(future)
+                try:
+                    future.result()
+                except:
+                    for other in running.keys():
+                        other.cancel()
+                    print( f'patch "{fname}" failed' )
+                    raise
+                finished.add(fname)
+
+
 def _get_patch_filenames(folder):
     result = []
     for fname in os.listdir(folder):
         if fname.startswith('p') and fname.endswith('.py'):
             result.append(fname)
     return sorted(result)
-    
\ No newline at end of file
+
+
+def _load_patch(path):
+    """
+    import one patch file
+
+    used in apply_all_patches()
+    """
+    spec = importlib.util.spec_from_file_location("patch", path)
+    patch = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(patch)
+    return patch
+
+
+def _get_patch_dependencies( patch_names, patches ):
+    """
+    Find the earlier patches that each patch must wait for
+
+    A patch must wait for an earlier patch if either one modifies
+    a table that the other one uses. Patches without declared
+    tables must wait for (and be waited for by) all earlier patches
+
+    return a dictionary where keys are patch names, values are
+    sets of patch names
+
+    used in apply_all_patches()
+
+    Arguments:
+    ----------
+    patch_names -- (list of str) names of patches in order
+    patches -- (dict) keys are patch names, values are objects
+                with optional attributes "depends_on" and "modifies"
+    """
+
+    result = {}
+    for i,name in enumerate(patch_names):
+        result[name] = set()
+        patch = patches[name]
+        for other_name in patch_names[:i]:
+            other = patches[other_name]
+            if _is_undeclared(patch) or _is_undeclared(other):
+                result[name].add(other_name)
+                continue
+            uses = set(patch.depends_on) | set(patch.modifies)
+            other_uses = set(other.depends_on) | set(other.modifies)
+            if (set(other.modifies) & uses) or (set(patch.modifies) & other_uses):
+                result[name].add(other_name)
+    return result
+
+
+def _is_undeclared( patch ):
+    """
+    used in _get_patch_dependencies()
+    """
+    return not (hasattr(patch,"depends_on") and hasattr(patch,"modifies"))
+
+
+def _get_code_hash( file_hashes ):
+    """
+    combine the checksums of a patch file and the helper files
+
+    used in apply_all_patches()
+    """
+    if len(file_hashes) == 1:
+        return file_hashes[0]
+    return hashlib.md5( ",".join(file_hashes).encode() ).hexdigest()
+
+
+def _get_patch_fingerprint( patch, fingerprinter ):
+    """
+    Get a string that changes if any of the tables or files
+    read by the given patch have changed
+
+    used in apply_all_patches()
+    """
+    tables = sorted(set(patch.depends_on))
+    result = { "tables": { t:fingerprinter.get(t) for t in tables } }
+    input_files = getattr(patch, "input_files", [])
+    result["files"] = { os.path.basename(p):get_file_md5(p) for p in input_files }
+    return json.dumps(result, sort_keys=True)
+
+
+class _PatchLedger:
+    """
+    The patches that were applied to the database (table "patch_ledger"),
+    with the fingerprint of each patch's inputs before it was applied
+
+    used in apply_all_patches()
+    """
+
+    def __init__(self, conn_str):
+        self.conn_str = conn_str
+        with psycopg2.connect(self.conn_str) as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS patch_ledger (
+                        patch_name text PRIMARY KEY,
+                        file_hash text,
+                        fingerprint text,
+                        applied_at timestamp DEFAULT now()
+                    );
+                """)
+                cur.execute("SELECT patch_name,file_hash,fingerprint FROM patch_ledger")
+                self.entries = { name:(file_hash,fingerprint)
+                                 for name,file_hash,fingerprint in cur.fetchall() }
+
+
+    def get(self, patch_name):
+        """
+        return a (file_hash, fingerprint) tuple, or None if the
+        patch was never applied
+        """
+        return self.entries.get(patch_name)
+
+
+    def record(self, patch_name, file_hash, fingerprint):
+        with psycopg2.connect(self.conn_str) as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO patch_ledger (patch_name,file_hash,fingerprint)
+                    VALUES (%s,%s,%s)
+                    ON CONFLICT (patch_name) DO UPDATE
+                    SET file_hash = EXCLUDED.file_hash,
+                        fingerprint = EXCLUDED.fingerprint,
+                        applied_at = now()
+                """, (patch_name,file_hash,fingerprint))
+        self.entries[patch_name] = (file_hash,fingerprint)
+
+
+class _TableFingerprints:
+    """
+    Row counts and checksums for database tables, computed once
+    and reused until a patch modifies the table
+
+    Columns in fingerprint_excluded_columns are left out of the
+    checksum, so that large values (e.g. feature.residues) are not read
+
+    used in apply_all_patches()
+    """
+
+    def __init__(self, conn_str):
+        self.conn_str = conn_str
+        self.values = {}
+        self.lock = threading.Lock()
+
+
+    def get(self, table):
+        with self.lock:
+            if table in self.values.keys():
+                return self.values[table]
+
+        with psycopg2.connect(self.conn_str) as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT to_regclass(%s)", (table,))
+                if cur.fetchone()[0] is None:
+                    value = "missing"
+                else:
+                    if table not in fingerprint_excluded_columns.keys():
+                        row = "t::text"
+                    else:
+                        columns = _get_fingerprint_columns( cur, table )
+                        row = "ROW(" + ",".join(f't."{c}"' for c in columns) + ")::text"
+                    cur.execute(f"""
+                        SELECT count(*), COALESCE(sum(hashtextextended({row},0)),0)
+                        FROM {table} t
+                    """)
+                    count,checksum = cur.fetchone()
+                    value = f"{count}:{checksum}"
+
+        with self.lock:
+            self.values[table] = value
+        return value
+
+
+    def invalidate(self, tables):
+        """
+        forget the given tables, or all tables if None is given
+        """
+        with self.lock:
+            if tables is None:
+                self.values.clear()
+            else:
+                for table in tables:
+                    self.values.pop(table, None)
+
+
+def _get_fingerprint_columns( cur, table ):
+    """
+    Get the names of the columns in the given table,
+    except for columns in fingerprint_excluded_columns
+
+    used in _TableFingerprints.get()
+    """
+    cur.execute("""
+        SELECT attname FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+        AND NOT attname = ANY(%s)
+        ORDER BY attnum
+    """, (table, fingerprint_excluded_columns[table]))
+    return [x[0] for x in cur.fetchall()]
@@ -11,6 +11,12 @@ from gdb.hmmer import *
 from gdb.itak import *
 from gdb.grassius import *
 from gdb.chado import *
+from gdb.patches.util import rename_proteins, update_erfap2_sort_order
+
+# tables used by this patch (see apply_patches.py)
+depends_on = ['gene_name']
+modifies = ['default_domains', 'default_maize_names', 'feature', 'gene_interaction',
+            'gene_name', 'searchable_clones', 'uniprot_ids']
 
 def apply_patch(cb):
     """
@@ -40,103 +46,13 @@ def apply_patch(cb):
             to_rename = sorted(to_rename, key=lambda x: int(x[1][9:]))
 
             # perform renaming
+            renames = []
             for gn_id,old_protein_name in to_rename:
                 new_protein_name = f'ZmEREB{next_ereb_suffix}'
                 new_synonym = old_protein_name
                 next_ereb_suffix += 1
-                print( f"{old_protein_name} -> {new_protein_name}" )
-
-                # ZmERFAP2_21
-                # grep -n "FROM stdin\|ZmERFAP2_21" build_db.sql
-
-                # default_domains
-                # select * from default_domains where protein_name = 'ZmERFAP2_21'
-                cur.execute("""
-                    UPDATE default_domains
-                    SET protein_name = %s
-                    WHERE protein_name = %s
-                """, (new_protein_name,old_protein_name) )
-
-                # default_maize_names
-                # select * from default_maize_names where name = 'ZmERFAP2_21';
-                cur.execute("""
-                    UPDATE default_maize_names
-                    SET name = %s
-                    WHERE name = %s
-                """, (new_protein_name,old_protein_name) )
-
-
-                # feature
-                # select * from feature where name='ZmERFAP2_21';
-                cur.execute("""
-                    UPDATE feature
-                    SET name = %s
-                    WHERE name = %s
-                """, (new_protein_name,old_protein_name) )
-
-                # gene_interaction
-                # select * from gene_interaction where target_name = 'ZmERFAP2_21';
-                cur.execute("""
-                    UPDATE gene_interaction
-                    SET target_name = %s
-                    WHERE target_name = %s
-                """, (new_protein_name,old_protein_name) )
-
-
-                # gene_name
-                # select * from gene_name where grassius_name = 'ZmERFAP2_21';
-                cur.execute("""
-                    UPDATE gene_name
-                    SET grassius_name = %s, synonym = %s
-                    WHERE gn_id = %s
-                """, (new_protein_name,new_synonym,gn_id) )
-
-
-                # searchable_clones
-                # select * from searchable_clones where name = 'ZmERFAP2_21';
-                cur.execute("""
-                    UPDATE searchable_clones
-                    SET name = %s
-                    WHERE name = %s
-                """, (new_protein_name,old_protein_name) )
-
-
-                # uniprot_ids
-                # select * from uniprot_ids where gene_name = 'ZmERFAP2_21';
-                cur.execute("""
-                    UPDATE uniprot_ids
-                    SET gene_name = %s
-                    WHERE gene_name = %s
-                """, (new_protein_name,old_protein_name) )
-
+                renames.append( (gn_id,old_protein_name,new_protein_name,new_synonym) )
+            rename_proteins( cur, renames )
 
             # update default_maize_names.name_sort_order
-            cur.execute("""
-                SELECT dmn_id,name,name_sort_order 
-                FROM default_maize_names
-                WHERE family = 'AP2/ERF-AP2';
-            """)
-            result = cur.fetchall()
-            base_value = min([x[2] for x in result])
-            all_prefix_offsets = {
-                "ZmEREB": 0,
-                "ZmERFAP2_": 300
-            }
-            for dmn_id,name,_ in result:
-
-                accepted = False
-                for prefix,offset in all_prefix_offsets.items():
-                    if name.startswith( prefix ):
-                        suffix = int( name.replace(prefix,'') )
-                        new_sort_order = base_value + offset + suffix
-                        accepted = True
-                        break
-
-                if not accepted:
-                    raise Exception('unrecognized name: ' + name )
-
-                cur.execute("""
-                    UPDATE default_maize_names
-                    SET name_sort_order = %s
-                    WHERE dmn_id = %s
-                """, (new_sort_order,dmn_id) )
\ No newline at end of file
+            update_erfap2_sort_order( cur )
@@ -6,9 +6,19 @@ import json
 import pickle
 import requests
 import psycopg2
+from psycopg2.extras import execute_values
 
+from gdb import InputManager
 from gdb.hmmer import get_family_criteria
 
+# tables and files used by this patch (see apply_patches.py)
+depends_on = ['feature', 'featureprop']
+modifies = ['family_domain_colors', 'default_domains']
+input_files = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)),'tids_of_interest.pi'),
+    InputManager()['family_rules'],
+]
+
 def apply_patch( cb ):
     """
     create/replace tables 'family_domain_colors' and 'default_domains'
@@ -78,12 +88,12 @@ def apply_patch( cb ):
             """)
 
             # insert rows
-            for family,family_colors in all_color_codes.items():
-                for domain,color in family_colors.items():
-                    cur.execute(f"""
-                        INSERT INTO family_domain_colors (family,domain,color)
-                        VALUES( %s,%s,%s );
-                    """, (family,domain,color) )
+            execute_values( cur, """
+                INSERT INTO family_domain_colors (family,domain,color)
+                VALUES %s
+            """, [ (family,domain,color)
+                   for family,family_colors in all_color_codes.items()
+                   for domain,color in family_colors.items() ] )
 
 
 
@@ -97,61 +107,46 @@ def apply_patch( cb ):
                 );
             """)
 
-            # iterate through protein names
-            for name,tid in tids_of_interest.items():
-                print(name)
-                
-                if len(tid) == 0:
-                    cur.execute("""
-                        INSERT INTO default_domains (protein_name,domains)
-                        VALUES( %s,'');
-                    """, (name,) )
-                    continue
-
-                # get sequence length
-                protein_tid = tid.replace('_T','_P')
-                cur.execute("""
-                    SELECT f.residues FROM feature f
-                    WHERE f.uniquename=%s
-                """, (protein_tid,) )
-                seq = cur.fetchall()[0][0]
-                seqlen = len(seq)
-
-                # get family
-                cur.execute("""
-                    SELECT fp.value FROM featureprop fp
-                    JOIN feature f ON f.feature_id = fp.feature_id
-                    WHERE f.uniquename=%s AND fp.type_id = 1362
-                """, (tid,) )
-                family = cur.fetchall()[0][0]
-                if family in all_color_codes.keys():
-                    color_codes = all_color_codes[family]
-                else:
-                    color_codes = {}
-
-                # get domain annotation
-                cur.execute("""
+            # upload protein names and transcripts of interest
+            cur.execute("""
+                CREATE TEMP TABLE tids_of_interest (
+                    name_order int,
+                    protein_name text,
+                    tid text
+                ) ON COMMIT DROP
+            """)
+            execute_values( cur, """
+                INSERT INTO tids_of_interest (name_order,protein_name,tid)
+                VALUES %s
+            """, [ (i,name,tid) for i,(name,tid) in enumerate(tids_of_interest.items()) ] )
+
+            # insert one row for each protein name
+            # get sequence length from the protein feature,
+            # get family from the transcript feature,
+            # insert color info into domain annotations
+            cur.execute("""
+                INSERT INTO default_domains (protein_name,domains)
+                SELECT t.protein_name,
+                    CASE WHEN t.tid = '' THEN '' ELSE COALESCE((
+                        SELECT jsonb_agg(
+                            fp.value::jsonb || jsonb_build_object(
+                                'color', COALESCE(fdc.color,'none'), 'seqlen', pf.seqlen )
+                            ORDER BY fp.rank, fp.featureprop_id )
+                        FROM featureprop fp
+                        LEFT JOIN family_domain_colors fdc
+                            ON fdc.family = fam.value
+                            AND fdc.domain = split_part(fp.value::jsonb->>'accession', '.', 1)
+                        WHERE fp.feature_id = tf.feature_id AND fp.type_id = 61467
+                    ), '[]'::jsonb)::text END
+                FROM tids_of_interest t
+                LEFT JOIN feature tf ON tf.uniquename = t.tid
+                LEFT JOIN feature pf ON pf.uniquename = replace(t.tid,'_T','_P')
+                LEFT JOIN LATERAL (
                     SELECT fp.value FROM featureprop fp
-                    JOIN feature f ON f.feature_id = fp.feature_id
-                    WHERE f.uniquename=%s AND fp.type_id = 61467
-                """, (tid,) )
-                anno = cur.fetchall()
-                sanno = "[" + ",".join([x[0] for x in anno]) + "]"
-                anno = json.loads(sanno)
-
-                # insert color info into domain annotations
-                for entry in anno:
-                    acc = entry['accession'].split('.')[0]
-                    if acc in color_codes.keys():
-                        color = color_codes[acc]
-                    else:
-                        color = "none"
-                    entry["color"] = color
-                    entry["seqlen"] = seqlen
-                sanno = json.dumps( anno )
-
-                # insert new entry into database
-                cur.execute("""
-                    INSERT INTO default_domains (protein_name,domains)
-                    VALUES( %s,%s );
-                """, (name,sanno) )
+                    WHERE fp.feature_id = tf.feature_id AND fp.type_id = 1362
+                    ORDER BY fp.featureprop_id
+                    LIMIT 1
+                ) fam ON true
+                ORDER BY t.name_order
+            """)
+            print( f"inserted {cur.rowcount} rows into default_domains" )
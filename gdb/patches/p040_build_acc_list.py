@@ -5,6 +5,10 @@ import json
 import pickle
 import requests
 import psycopg2
+
+# tables used by this patch (see apply_patches.py)
+depends_on = ['feature', 'featureprop']
+modifies = ['acc_list']
         
 def apply_patch( cb ):
     """
@@ -27,31 +31,14 @@ def apply_patch( cb ):
                 );
             """)
 
-            # get all domain annotations
+            # insert the set of unique accession names
+            # from all domain annotations
             cur.execute("""
-                SELECT fp.value FROM featureprop fp
+                INSERT INTO acc_list (accession)
+                SELECT DISTINCT split_part(fp.value::jsonb->>'accession', '.', 1)
+                FROM featureprop fp
                 JOIN feature f ON f.feature_id = fp.feature_id
                 WHERE fp.type_id = 61467
-            """ )
-            anno = cur.fetchall()
-            sanno = "[" + ",".join([x[0] for x in anno]) + "]"
-            anno = json.loads(sanno)
-
-
-            # extract set of unique accession names
-            all_accessions = set()
-            for entry in anno:
-                acc = entry['accession'].split('.')[0]
-                print(acc)
-                all_accessions.add(acc)
-
-            # insert rows
-            for acc in all_accessions:
-                cur.execute("""
-                    INSERT INTO acc_list (accession)
-                    VALUES( %s );
-                """, (acc,) )
-
-
-
-
+                ORDER BY 1
+            """)
+            print( f"inserted {cur.rowcount} rows into acc_list" )
@@ -1,23 +1,24 @@
 
-import pandas as pd
-import gzip
-import json
-import pickle
-import requests
 import psycopg2
-from Bio import SeqIO
-    
-from gdb import InputManager
-       
+
+# tables used by this patch (see apply_patches.py)
+depends_on = ['feature', 'featureprop']
+modifies = ['transcript_domains', 'all_domains']
+
 def apply_patch(cb):
     """
     create/replace the table 'transcript_domains'
-    
+
     this table is used to boost performance of the custom family query
     (query transcripts based on required/forbidden domains)
-    """ 
-    
-    
+
+    the table is built in a single statement, with one row for each
+    maize v5 protein transcript. Domain annotations (featureprop) are
+    aggregated per transcript, and the sequence length is taken from
+    the feature table.
+    """
+
+
     with psycopg2.connect(cb.conn_str) as conn:
         with conn.cursor() as cur:
             # create/replace table
@@ -31,53 +32,22 @@ def apply_patch(cb):
                 );
             """)
 
-            
-            # get a list of maize v5 protein transcript IDs
+            # insert one row for each maize v5 protein transcript
+            # insert color and sequence length into domain annotations
             cur.execute("""
-                SELECT f.uniquename FROM feature f
+                INSERT INTO transcript_domains (tid,domains)
+                SELECT f.uniquename, COALESCE(d.domains, '[]'::jsonb)::text
+                FROM feature f
+                LEFT JOIN (
+                    SELECT fp.feature_id, jsonb_agg(
+                        fp.value::jsonb || jsonb_build_object('color','none','seqlen',pf.seqlen)
+                        ORDER BY fp.rank, fp.featureprop_id ) AS domains
+                    FROM featureprop fp
+                    JOIN feature pf ON pf.feature_id = fp.feature_id
+                    WHERE fp.type_id = 61467 AND pf.type_id = 534 AND pf.organism_id = 4
+                    GROUP BY fp.feature_id
+                ) d ON d.feature_id = f.feature_id
                 WHERE f.type_id = 534 AND f.organism_id = 4
-            """ )
-            all_tids = [x[0] for x in cur.fetchall()]
-            
-            i = 0
-            
-            # iterate through protein transcripts
-            fasta_filepath = InputManager()['maize_v5_proteins']
-            with open(fasta_filepath) as fin:
-                for r in SeqIO.parse(fin, "fasta"):
-                    
-                    i += 1
-                    if (i%1000) == 0:
-                        print( i )
-                        
-                    tid = r.id
-                    seq = str(r.seq)
-                    seqlen = len(seq)
-                    
-
-                    # get domain annotation
-                    cur.execute("""
-                        SELECT fp.value FROM featureprop fp
-                        JOIN feature f ON f.feature_id = fp.feature_id
-                        WHERE f.uniquename=%s AND fp.type_id = 61467
-                    """, (tid,) )
-                    anno = cur.fetchall()
-                    sanno = "[" + ",".join([x[0] for x in anno]) + "]"
-                    anno = json.loads(sanno)
-
-
-                    # insert sequence length into domain annotations
-                    for entry in anno:
-                        entry["color"] = "none"
-                        entry["seqlen"] = seqlen
-                    sanno = json.dumps( anno )
-
-                    # append to sql file
-                    cur.execute("""
-                        INSERT INTO transcript_domains (tid,domains)
-                        VALUES( %s, %s );
-                    """, (tid,sanno) )
-
-
-
-
+                ORDER BY f.feature_id
+            """)
+            print( f"inserted {cur.rowcount} rows into transcript_domains" )
@@ -0,0 +1,117 @@
+# this file contains set-based helpers shared by multiple patches
+
+# (the file name must not start with "p", otherwise
+# it would be applied as a patch by apply_all_patches)
+
+from psycopg2.extras import execute_values
+
+
+# tables and columns containing protein names
+# (table name, column name)
+protein_name_columns = [
+    ("default_domains", "protein_name"),
+    ("default_maize_names", "name"),
+    ("feature", "name"),
+    ("gene_interaction", "target_name"),
+    ("searchable_clones", "name"),
+    ("uniprot_ids", "gene_name"),
+]
+
+
+def rename_proteins( cur, renames ):
+    """
+    Rename proteins in all grassius tables, using one statement per table
+
+    Old names and new names should not overlap
+
+    Arguments:
+    ----------
+    cur -- a database cursor
+    renames -- (list) tuples (gn_id, old_name, new_name, new_synonym)
+                where gn_id identifies a row in the table "gene_name"
+    """
+
+    for gn_id,old_name,new_name,new_synonym in renames:
+        print( f"{old_name} -> {new_name}" )
+    if len(renames) == 0:
+        return
+
+    cur.execute("""
+        CREATE TEMP TABLE protein_renames (
+            gn_id int,
+            old_name text,
+            new_name text,
+            new_synonym text
+        ) ON COMMIT DROP
+    """)
+    execute_values( cur, """
+        INSERT INTO protein_renames (gn_id,old_name,new_name,new_synonym)
+        VALUES %s
+    """, renames )
+
+    for table,column in protein_name_columns:
+        cur.execute(f"""
+            UPDATE {table} t
+            SET {column} = r.new_name
+            FROM protein_renames r
+            WHERE t.{column} = r.old_name
+        """)
+
+    cur.execute("""
+        UPDATE gene_name g
+        SET grassius_name = r.new_name, synonym = r.new_synonym
+        FROM protein_renames r
+        WHERE g.gn_id = r.gn_id
+    """)
+
+    cur.execute("DROP TABLE protein_renames")
+
+
+def update_erfap2_sort_order( cur ):
+    """
+    Update default_maize_names.name_sort_order for the "AP2/ERF-AP2" family,
+    so that "ZmEREB..." names are listed before "ZmERFAP2_..." names
+
+    The new values only depend on the current names, so applying
+    this again does not change the sort order
+
+    Arguments:
+    ----------
+    cur -- a database cursor
+    """
+
+    cur.execute("""
+        SELECT dmn_id,name,name_sort_order
+        FROM default_maize_names
+        WHERE family = 'AP2/ERF-AP2';
+    """)
+    result = cur.fetchall()
+
+    # name_sort_order is (family index)*10000 + (name suffix),
+    # see build_default_maize_names()
+    base_value = (min([x[2] for x in result]) // 10000) * 10000
+    all_prefix_offsets = {
+        "ZmEREB": 0,
+        "ZmERFAP2_": 300
+    }
+
+    new_values = []
+    for dmn_id,name,_ in result:
+
+        accepted = False
+        for prefix,offset in all_prefix_offsets.items():
+            if name.startswith( prefix ):
+                suffix = int( name.replace(prefix,'') )
+                new_values.append( (dmn_id, base_value + offset + suffix) )
+                accepted = True
+                break
+
+        if not accepted:
+            raise Exception('unrecognized name: ' + name )
+
+    execute_values( cur, """
+        UPDATE default_maize_names d
+        SET name_sort_order = v.name_sort_order
+        FROM (VALUES %s) AS v (dmn_id, name_sort_order)
+        WHERE d.dmn_id = v.dmn_id
+    """, new_values )
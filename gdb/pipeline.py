@@ -0,0 +1,413 @@
+# this file contains a runner for multi-stage builds
+
+# each stage is a function whose arguments are the outputs of other stages,
+# input files, or fixed values. Stage outputs are cached by a hash of the
+# stage's code, the library code it declares, and its inputs, so a stage
+# is only re-run when something it depends on has changed. Stages that do not depend on each other are run
+# at the same time.
+
+# local imports
+from .util import get_known_file_md5, get_cache_folder
+from .instrumentation import span
+
+import os
+import uuid
+import shutil
+import pickle
+import hashlib
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class Pipeline:
+    """
+    A graph of stages with explicit inputs and outputs
+
+    Get an instance using Pipeline(name), then declare inputs with
+    add_file() and add_value(), declare stages with the stage() decorator,
+    and call run()
+
+    Attributes:
+    -----------
+    name : str
+        the name of the pipeline, used for the cache folder
+    stages : dict
+        keys are stage names, values are dictionaries with keys
+        "func", "inputs", "cache", "version", "depends", "outputs"
+    files : dict
+        keys are input names, values are file paths
+    values : dict
+        keys are input names, values are (value, hash) tuples
+    """
+
+    def __init__(self, name):
+        """
+        Construct a new instance of Pipeline
+
+        Arguments:
+        ----------
+        name -- (str) the name of the pipeline, used to keep
+                cached outputs separate from other pipelines
+        """
+        self.name = name
+        self.stages = {}
+        self.files = {}
+        self.values = {}
+
+
+    def add_file(self, name, path):
+        """
+        Declare an input file, which may be used as an input for stages
+
+        Stages will receive the path. The contents are hashed when the pipeline runs.
+
+        Arguments:
+        ----------
+        name -- (str) the name of the input
+        path -- (str) the path to the file
+        """
+        self._check_new_name(name)
+        self.files[name] = path
+
+
+    def add_value(self, name, value, key=None):
+        """
+        Declare a fixed value, which may be used as an input for stages
+
+        Arguments:
+        ----------
+        name -- (str) the name of the input
+        value -- the value that stages will receive
+        key -- (optional) (str) a string that identifies the value. by
+                default the value is pickled and hashed. A key must be given
+                for values that can not be pickled, e.g. database connections
+        """
+        self._check_new_name(name)
+        if key is None:
+            key = _get_value_hash(value)
+        self.values[name] = (value, _get_hash([name, key]))
+
+
+    def stage(self, name=None, inputs=None, cache=True, version=None, depends=None, outputs=None):
+        """
+        Decorator to declare a stage
+
+        The decorated function is returned unchanged
+
+        Arguments:
+        ----------
+        name -- (optional) (str) the name of the stage, which other stages
+                    may use as an input. defaults to the function name
+        inputs -- (optional) (list of str) names of files, values, and other stages.
+                    defaults to the argument names of the function
+        cache -- (optional) (bool) if false, the stage is run every time
+                    and the output is not saved
+        version -- (optional) (str) change this to force the stage to be re-run,
+                    for example after changing code that is not listed in depends.
+                    changes to the function itself are detected automatically
+        depends -- (optional) (list) modules, classes, or functions that the
+                    stage calls. The stage is re-run if their source code changes
+        outputs -- (optional) (list of str) paths to files that the stage writes,
+                    e.g. reports. The files are saved with the cached output,
+                    and written again when the stage is skipped
+        """
+        def decorator(func):
+            self.add_stage( func.__name__ if name is None else name,
+                            func, inputs, cache, version, depends, outputs )
+            return func
+        return decorator
+
+
+    def add_stage(self, name, func, inputs=None, cache=True, version=None, depends=None, outputs=None):
+        """
+        Declare a stage
+
+        see stage()
+        """
+        self._check_new_name(name)
+        if inputs is None:
+            inputs = list(inspect.signature(func).parameters.keys())
+        self.stages[name] = {
+            "func": func,
+            "inputs": list(inputs),
+            "cache": cache,
+            "version": version,
+            "depends": [] if depends is None else list(depends),
+            "outputs": [] if outputs is None else list(outputs),
+        }
+
+
+    def run(self, targets=None, max_workers=4, force=()):
+        """
+        Run the given stages, and any stages they depend on
+
+        Stages whose code and inputs have not changed since a
+        previous run are skipped, and their saved outputs are used
+
+        return a dictionary where keys are target names,
+        values are stage outputs
+
+        Arguments:
+        ----------
+        targets -- (optional) (list of str) the names of stages to run.
+                    defaults to all stages
+        max_workers -- (optional) (int) the maximum number of stages
+                    that will be run at the same time
+        force -- (optional) (list of str) names of stages that will be
+                    re-run even if a saved output is available
+        """
+        if targets is None:
+            targets = list(self.stages.keys())
+        for name in force:
+            if name not in self.stages.keys():
+                raise Exception( f'unrecognized pipeline stage "{name}"' )
+
+        order = self._get_run_order(targets)
+        return _PipelineRun( self, order, set(force) ).run( targets, max_workers )
+
+
+    def _get_run_order(self, targets):
+        """
+        Get the names of the given stages and their dependencies,
+        such that each stage comes after the stages it depends on
+
+        used in run()
+        """
+        order = []
+        visiting = set()
+
+        def visit(name):
+            if (name in order) or (name in self.files.keys()) or (name in self.values.keys()):
+                return
+            if name not in self.stages.keys():
+                raise Exception( f'unrecognized pipeline input or stage "{name}"' )
+            if name in visiting:
+                raise Exception( f'pipeline stage "{name}" depends on itself' )
+            visiting.add(name)
+            for input_name in self.stages[name]["inputs"]:
+                visit(input_name)
+            visiting.remove(name)
+            order.append(name)
+
+        for name in targets:
+            visit(name)
+        return order
+
+
+    def _check_new_name(self, name):
+        """
+        used in add_file(), add_value(), and add_stage()
+        """
+        if (name in self.stages.keys()) or (name in self.files.keys()) or (name in self.values.keys()):
+            raise Exception( f'pipeline already contains an input or stage named "{name}"' )
+
+
+class _PipelineRun:
+    """
+    The state of one call to Pipeline.run()
+
+    Outputs of skipped stages are only loaded from the cache
+    when they are needed by a stage that is run, or requested as a target
+    """
+
+    def __init__(self, pipeline, order, force):
+        self.pipeline = pipeline
+        self.order = order
+        self.force = force
+        self.cache_folder = get_cache_folder( "pipeline_" + pipeline.name )
+        self.hashes = {}
+        self.outputs = {}
+        self.cached_paths = {}
+        self.lock = threading.Lock()
+
+        for name,path in pipeline.files.items():
+            self.outputs[name] = path
+        for name,(value,value_hash) in pipeline.values.items():
+            self.outputs[name] = value
+            self.hashes[name] = value_hash
+
+
+    def run(self, targets, max_workers):
+        pending = list(self.order)
+        running = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            while len(pending) > 0 or len(running) > 0:
+
+                # start every stage whose inputs are ready
+                # pending stages are in dependency order, so skipping one
+                # stage may allow the next stage to start
+                for name in list(pending):
+                    inputs = self.pipeline.stages[name]["inputs"]
+                    if not all(self._is_done(i) for i in inputs):
+                        continue
+                    pending.remove(name)
+                    key = self._get_stage_key(name)
+                    if not self._load_cached_hash(name, key):
+                        print( f'running pipeline stage "{name}"' )
+                        running[pool.submit(self._run_stage, name, key)] = name
+
+                if len(running) == 0:
+                    continue
+
+                # wait for at least one stage to finish
+                done,_ = wait( running.keys(), return_when=FIRST_COMPLETED )
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        self.hashes[name] = future.result()
+                    except:
+                        for other in running.keys():
+                            other.cancel()
+                        print( f'pipeline stage "{name}" failed' )
+                        raise
+
+        return { name:self._get_output(name) for name in targets }
+
+
+    def _is_done(self, name):
+        if name in self.pipeline.files.keys():
+            if name not in self.hashes.keys():
+                self.hashes[name] = _get_hash([name, get_known_file_md5(self.pipeline.files[name])])
+            return True
+        return name in self.hashes.keys()
+
+
+    def _get_stage_key(self, name):
+        """
+        get a hash that changes if the stage's code, the code it 
+        depends on, or the stage's inputs change
+        """
+        stage = self.pipeline.stages[name]
+        sources = [_get_source(obj) for obj in [stage["func"]] + stage["depends"]]
+        return _get_hash( [name, str(stage["version"])] + sources
+                          + [self.hashes[i] for i in stage["inputs"]] )
+
+
+    def _load_cached_hash(self, name, key):
+        """
+        check for a saved output of the given stage
+
+        return True if the stage may be skipped
+        """
+        stage = self.pipeline.stages[name]
+        if (not stage["cache"]) or (name in self.force):
+            return False
+        path = os.path.join( self.cache_folder, name, key )
+        if not os.path.exists( path + ".pkl" ):
+            return False
+        if (len(stage["outputs"]) > 0) and (not os.path.exists( path + ".files" )):
+            return False
+        with open( path + ".md5" ) as fin:
+            self.hashes[name] = fin.read().strip()
+        self.cached_paths[name] = path + ".pkl"
+        print( f'using cached output for pipeline stage "{name}"' )
+
+        # write the files that the stage would have written
+        for i,output_path in enumerate(stage["outputs"]):
+            shutil.copyfile( os.path.join( path + ".files", str(i) ), output_path )
+        return True
+
+
+    def _run_stage(self, name, key):
+        """
+        run the given stage in a worker thread
+
+        return a hash of the stage's output
+        """
+        stage = self.pipeline.stages[name]
+        args = [self._get_output(i) for i in stage["inputs"]]
+        with span( "stage " + name ):
+            value = stage["func"](*args)
+
+        # stages with no output are identified by their inputs,
+        # otherwise identify the output by its contents, so that
+        # later stages are not re-run if the output did not change
+        if value is None:
+            value_hash = key
+        elif stage["cache"]:
+            value_hash = _get_value_hash(value)
+        else:
+            try:
+                value_hash = _get_value_hash(value)
+            except Exception:
+                value_hash = uuid.uuid4().hex
+
+        if stage["cache"]:
+            folder = os.path.join( self.cache_folder, name )
+            os.makedirs( folder, exist_ok=True )
+            path = os.path.join( folder, key )
+            with open( path + ".md5.tmp", "w" ) as fout:
+                fout.write( value_hash )
+            with open( path + ".pkl.tmp", "wb" ) as fout:
+                pickle.dump( value, fout, protocol=pickle.HIGHEST_PROTOCOL )
+            if len(stage["outputs"]) > 0:
+                _save_output_files( stage["outputs"], path + ".files" )
+            os.replace( path + ".md5.tmp", path + ".md5" )
+            os.replace( path + ".pkl.tmp", path + ".pkl" )
+
+        with self.lock:
+            self.outputs[name] = value
+        return value_hash
+
+
+    def _get_output(self, name):
+        """
+        get the output of a stage, loading it from the cache if necessary
+        """
+        with self.lock:
+            if name not in self.outputs.keys():
+                with open( self.cached_paths[name], "rb" ) as fin:
+                    self.outputs[name] = pickle.load(fin)
+            return self.outputs[name]
+
+
+def _get_hash(parts):
+    """
+    combine the given strings into one hash
+    """
+    h = hashlib.md5()
+    for part in parts:
+        h.update( part.encode("utf-8") )
+        h.update( b"\0" )
+    return h.hexdigest()
+
+
+def _save_output_files(output_paths, folder):
+    """
+    copy the files written by a stage into the cache,
+    named by their position in the list of outputs
+
+    used in _PipelineRun._run_stage()
+    """
+    for output_path in output_paths:
+        if not os.path.exists(output_path):
+            raise Exception( f'missing pipeline stage output file "{output_path}"' )
+    if os.path.exists( folder + ".tmp" ):
+        shutil.rmtree( folder + ".tmp" )
+    os.makedirs( folder + ".tmp" )
+    for i,output_path in enumerate(output_paths):
+        shutil.copyfile( output_path, os.path.join( folder + ".tmp", str(i) ) )
+    if os.path.exists( folder ):
+        shutil.rmtree( folder )
+    os.rename( folder + ".tmp", folder )
+
+
+def _get_source(obj):
+    """
+    get the source code of a module, class, or function,
+    or its name if the source code is not available
+
+    used in _PipelineRun._get_stage_key()
+    """
+    try:
+        return inspect.getsource(obj)
+    except (OSError,TypeError):
+        return getattr(obj, "__qualname__", getattr(obj, "__name__", repr(obj)))
+
+
+def _get_value_hash(value):
+    """
+    get a hash of the contents of the given value
+    """
+    return hashlib.md5( pickle.dumps(value, protocol=4) ).hexdigest()
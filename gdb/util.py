@@ -2,11 +2,16 @@
 # submodules like "blast" or "fasta"
 
 import pandas as pd
+import hashlib
+import json
+import os
+import threading
 
 def load_gene_annotations(gff3_path):
     """
     load a subset of annotations from a gff3 file
-    returns a dataframe that may be passed to annotate_blast_result()
+    returns a dataframe that may be used to build a GeneIntervalIndex
+    for use with annotate_blast_result()
     """
     
     df = pd.read_table(gff3_path, skiprows=6, header=None)
@@ -14,4 +19,62 @@ def load_gene_annotations(gff3_path):
     df = df[df['type'] == 'gene']
     
     return df
-    
\ No newline at end of file
+    
+    
+def get_file_md5(path):
+    """
+    compute the md5 checksum of the given file
+    returns a hex string
+    """
+    
+    with open(path, "rb") as f:
+        file_hash = hashlib.md5()
+        while chunk := f.read(1<<20):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+    
+    
+def get_known_file_md5(path):
+    """
+    get the md5 checksum of the given file, reusing the checksum
+    from an earlier call if the file's size and mtime have not changed
+    
+    checksums are remembered in a cache folder, so this should only be
+    used for files that are kept, not for temporary files
+    returns a hex string
+    """
+    
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = [path, stat.st_size, stat.st_mtime_ns]
+    
+    memo_name = hashlib.md5(path.encode()).hexdigest() + ".json"
+    memo_path = os.path.join( get_cache_folder("file_md5"), memo_name )
+    if os.path.exists(memo_path):
+        with open(memo_path) as fin:
+            memo = json.load(fin)
+        if memo["key"] == key:
+            return memo["md5"]
+    
+    # the temporary name is unique, in case several threads hash the same file
+    md5sum = get_file_md5(path)
+    tmp_path = f"{memo_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as fout:
+        json.dump({ "key":key, "md5":md5sum }, fout)
+    os.replace(tmp_path, memo_path)
+    return md5sum
+    
+    
+def get_cache_folder(name):
+    """
+    get the path to a gitignored folder for cached intermediate files
+    the folder is created if necessary
+    
+    Arguments:
+    ----------
+    name -- (str) the name of a subfolder, e.g. "hmm_index"
+    """
+    
+    folder = os.path.join( os.path.dirname(__file__), "../inputs/cache", name )
+    os.makedirs(folder, exist_ok=True)
+    return os.path.abspath(folder)
@@ -25,12 +25,9 @@ gene_interactions = pd.read_excel(im['gene_interactions'])
 df = pd.read_csv('metadata.csv')
 
     
-# build gene_id -> genome_version dictionary
-gene_versions = {}
-for version in ['v3','v4','v5']:
-    all_gene_ids = get_all_gene_ids( im[f'maize_{version}_proteins'] )
-    for gid in all_gene_ids:
-        gene_versions[gid] = version
+# build gene_id -> genome_version index
+gene_versions = GeneVersionIndex({ version:im[f'maize_{version}_proteins'] 
+                                  for version in ['v3','v4','v5'] })
     
     
 # start building database
@@ -0,0 +1,133 @@
+# local imports
+from gdb.patches import apply_patches
+from gdb.patches.apply_patches import _get_patch_dependencies, apply_all_patches
+
+
+import os
+import tempfile
+from types import SimpleNamespace
+
+
+def test_get_patch_dependencies():
+    patches = {
+        "p1": SimpleNamespace( depends_on=["gene_name"], modifies=["gene_name","feature"] ),
+        "p2": SimpleNamespace( depends_on=["feature"], modifies=["acc_list"] ),
+        "p3": SimpleNamespace( depends_on=["feature"], modifies=["transcript_domains"] ),
+        "p4": SimpleNamespace( depends_on=["acc_list"], modifies=["other"] ),
+        "p5": SimpleNamespace(),
+        "p6": SimpleNamespace( depends_on=[], modifies=["unrelated"] ),
+    }
+    result = _get_patch_dependencies( list(patches.keys()), patches )
+
+    assert result == {
+        "p1": set(),
+        "p2": {"p1"},
+        "p3": {"p1"},
+        "p4": {"p2"},
+        "p5": {"p1","p2","p3","p4"},
+        "p6": {"p5"},
+    }
+
+
+# patch files for testing the ledger
+# each patch derives one table from another, like the real patches
+# tables are stored in cb.tables instead of a database
+_test_patches = {
+    "p010_feature.py": (["gene_name"], ["feature"]),
+    "p020_acc_list.py": (["feature"], ["acc_list"]),
+    "p030_other.py": (["unrelated"], ["other"]),
+}
+
+
+class _FakeLedger:
+    """
+    stores the patch ledger in memory instead of a database
+    """
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, patch_name):
+        return self.entries.get(patch_name)
+
+    def record(self, patch_name, file_hash, fingerprint):
+        self.entries[patch_name] = (file_hash,fingerprint)
+
+
+class _FakeFingerprints:
+    """
+    reads table fingerprints from cb.tables instead of a database
+    """
+    def __init__(self, tables):
+        self.tables = tables
+
+    def get(self, table):
+        return str(self.tables.get(table,"missing"))
+
+    def invalidate(self, tables):
+        pass
+
+
+def _write_test_patches( folder ):
+    for fname,(depends_on,modifies) in _test_patches.items():
+        with open(os.path.join(folder,fname),"w") as fout:
+            fout.write(f"depends_on = {depends_on!r}\n")
+            fout.write(f"modifies = {modifies!r}\n")
+            fout.write("def apply_patch(cb):\n")
+            fout.write(f"    cb.applied.append({fname!r})\n")
+            fout.write(f"    cb.tables[{modifies[0]!r}] = 'from ' + str(cb.tables.get({depends_on[0]!r}))\n")
+
+
+def _get_test_setup( monkeypatch ):
+    folder = tempfile.mkdtemp()
+    _write_test_patches( folder )
+    cb = SimpleNamespace( conn_str=None, applied=[], tables={"gene_name":1,"unrelated":1} )
+    ledger = _FakeLedger()
+    monkeypatch.setattr( apply_patches, "_PatchLedger", lambda conn_str: ledger )
+    monkeypatch.setattr( apply_patches, "_TableFingerprints", lambda conn_str: _FakeFingerprints(cb.tables) )
+    return folder, cb
+
+
+def test_apply_all_patches_skip(monkeypatch):
+    folder,cb = _get_test_setup( monkeypatch )
+    apply_all_patches( cb, folder=folder )
+    assert sorted(cb.applied) == sorted(_test_patches.keys())
+
+    # nothing changed, so all patches are skipped
+    cb.applied.clear()
+    apply_all_patches( cb, folder=folder )
+    assert cb.applied == []
+
+
+def test_apply_all_patches_reapply(monkeypatch):
+    folder,cb = _get_test_setup( monkeypatch )
+    apply_all_patches( cb, folder=folder )
+
+    # a changed table is re-applied, along with patches that read its output
+    cb.applied.clear()
+    cb.tables["gene_name"] = 2
+    apply_all_patches( cb, folder=folder )
+    assert cb.applied == ["p010_feature.py","p020_acc_list.py"]
+    assert cb.tables["acc_list"] == "from from 2"
+
+    # a changed patch file is re-applied
+    cb.applied.clear()
+    with open(os.path.join(folder,"p030_other.py"),"a") as fout:
+        fout.write("# changed\n")
+    apply_all_patches( cb, folder=folder )
+    assert cb.applied == ["p030_other.py"]
+
+    # a changed helper file is used by all patches, so all patches are re-applied
+    cb.applied.clear()
+    with open(os.path.join(folder,"util.py"),"w") as fout:
+        fout.write("# shared code\n")
+    apply_all_patches( cb, folder=folder )
+    assert sorted(cb.applied) == sorted(_test_patches.keys())
+
+
+def test_apply_all_patches_force(monkeypatch):
+    folder,cb = _get_test_setup( monkeypatch )
+    apply_all_patches( cb, folder=folder )
+
+    cb.applied.clear()
+    apply_all_patches( cb, force=True, folder=folder )
+    assert sorted(cb.applied) == sorted(_test_patches.keys())
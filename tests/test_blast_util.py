@@ -0,0 +1,164 @@
+# local imports
+from gdb import InputManager
+from gdb.blast import read_blast_output, iter_blast_hits
+from gdb.blast.blast_pipeline import _write_hits, result_columns
+
+
+import os
+import math
+import tempfile
+import pandas as pd
+import pytest
+
+
+multi_query_output = """BLASTN 2.9.0+
+
+
+Database: test.fa
+           2 sequences; 2,000 total letters
+
+
+
+Query= q1
+Length=20
+
+>chr1
+Length=1000
+
+ Score = 37.4 bits (40),  Expect = 1e-05
+ Identities = 20/20 (100%), Gaps = 0/20 (0%)
+ Strand=Plus/Plus
+
+Query  1    ACGTACGTACGTACGTACGT  20
+            ||||||||||||||||||||
+Sbjct  101  ACGTACGTACGTACGTACGT  120
+
+
+
+Lambda      K        H
+    1.33    0.621     1.12
+
+Effective search space used: 18000
+
+
+Query= q2 some description
+Length=20
+
+***** No hits found *****
+
+
+
+Lambda      K        H
+    1.33    0.621     1.12
+
+Effective search space used: 18000
+
+
+Query= q3
+Length=20
+
+>chr2
+Length=1000
+
+ Score = 30.1 bits (32),  Expect = 0.002
+ Identities = 18/20 (90%), Gaps = 0/20 (0%)
+ Strand=Plus/Minus
+
+Query  1    ACGTACGTACGTACGTACGT  20
+            |||||||||||||||| |||
+Sbjct  520  ACGTACGTACGTACGTTCGT  501
+
+
+
+Lambda      K        H
+    1.33    0.621     1.12
+
+Effective search space used: 18000
+
+
+  Database: test.fa
+  Number of sequences in database:  2
+"""
+
+
+def test_read_blast_output():
+    path = InputManager()["blast_output_example"]
+    result = read_blast_output(path)
+
+    assert len(result.data.index) == 14
+    assert list(result.data.loc[0,["Chrom","Start_Pos","Stop_Pos","Identities%"]]) == [
+        "chr4",182381379,182381471,84]
+    assert result.header.startswith("TBLASTN")
+    assert result.footer.startswith("Lambda")
+
+
+def test_multi_query_output():
+    folder = tempfile.mkdtemp()
+    path = os.path.join(folder,"blast_output.txt")
+    with open(path,"w") as fout:
+        fout.write(multi_query_output)
+
+    result = read_blast_output(path)
+    df = result.data
+    assert list(df["Query ID"]) == ["q1","q3"]
+    assert list(df["Chrom"]) == ["chr1","chr2"]
+    assert list(df["Start_Pos"]) == [101,501]
+    assert list(df["Stop_Pos"]) == [120,520]
+    assert list(df["Identities%"]) == [100,90]
+    assert "Database: test.fa" in result.footer
+
+    # lazy parsing gives the same hits
+    hits = list(iter_blast_hits(path))
+    assert [h["Query ID"] for h in hits] == ["q1","q3"]
+
+
+def _get_sample_hits( n ):
+    """
+    get results in the same format as iter_blast_and_annotate()
+    the first hit has no matching gene and no identity percentage
+    """
+    hits = []
+    for i in range(n):
+        hits.append( dict(zip(result_columns, [
+            f"GRMZM2G{i:06d}", f"GRMZM2G{i:06d}_T01", "chr1", 100*i, 100*i+50,
+            None if i == 0 else f"Zm00001eb{i:06d}",
+            math.nan if i == 0 else 95.5 ])))
+    return hits
+
+
+def test_write_hits_csv():
+    path = os.path.join(tempfile.mkdtemp(), "hits.csv")
+    assert _write_hits( iter(_get_sample_hits(5)), path, batch_size=2 ) == 5
+
+    df = pd.read_csv(path)
+    assert list(df.columns) == result_columns
+    assert list(df["v3_gene_id"]) == [f"GRMZM2G{i:06d}" for i in range(5)]
+    assert list(df["matching_start_pos"]) == [0,100,200,300,400]
+    assert df["Identities%"].isna().sum() == 1
+
+
+def test_write_hits_parquet():
+    pytest.importorskip("pyarrow")
+    path = os.path.join(tempfile.mkdtemp(), "hits.parquet")
+
+    # the first batch has all-NaN columns, later batches do not
+    hits = _get_sample_hits(5)
+    hits[1]["matching_gene_id"] = None
+    hits[1]["Identities%"] = math.nan
+    assert _write_hits( iter(hits), path, batch_size=2 ) == 5
+
+    df = pd.read_parquet(path)
+    assert list(df.columns) == result_columns
+    assert list(df["matching_start_pos"]) == [0,100,200,300,400]
+    assert list(df["matching_gene_id"][2:]) == [f"Zm00001eb{i:06d}" for i in range(2,5)]
+    assert df["Identities%"].isna().sum() == 2
+
+
+def test_write_hits_parquet_empty():
+    pytest.importorskip("pyarrow")
+    path = os.path.join(tempfile.mkdtemp(), "hits.parquet")
+    assert _write_hits( iter([]), path ) == 0
+
+    df = pd.read_parquet(path)
+    assert list(df.columns) == result_columns
+    assert len(df.index) == 0
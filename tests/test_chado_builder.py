@@ -2,9 +2,11 @@
 import gdb
 from gdb import InputManager
 from gdb.chado import ChadoBuilder
+from gdb.chado.chado_builder import _get_tfome_staging_data, bulk_load_tables
 
 
 import pandas as pd
+import pytest
 
 
 def test_chado_builder_constructor():
@@ -37,4 +39,68 @@ def test_chado_builder():
     assert len(response) == 3
     
     
-    
\ No newline at end of file
+
+def _get_bulk_load_state( cb ):
+    """
+    get the names of indexes, and the names and validation 
+    status of foreign keys, on tables affected by bulk_load()
+    """
+    indexes = cb.query("""
+        SELECT indexname FROM pg_indexes 
+        WHERE schemaname = 'public' AND tablename = ANY(%s)
+    """, (bulk_load_tables,))
+    foreign_keys = cb.query("""
+        SELECT conname, convalidated FROM pg_constraint
+        WHERE contype = 'f' AND conrelid::regclass::text = ANY(%s)
+    """, (bulk_load_tables,))
+    return set(indexes), set(foreign_keys)
+    
+    
+def test_bulk_load():
+    cb = ChadoBuilder()
+    indexes,foreign_keys = _get_bulk_load_state( cb )
+    assert all( validated for name,validated in foreign_keys )
+    
+    with cb.bulk_load():
+        
+        # foreign keys and some indexes are dropped while loading
+        loading_indexes,loading_foreign_keys = _get_bulk_load_state( cb )
+        assert loading_indexes < indexes
+        assert len(loading_foreign_keys) == 0
+        
+    # everything is restored, and foreign keys have checked all rows
+    assert _get_bulk_load_state( cb ) == (indexes,foreign_keys)
+    
+    
+def test_bulk_load_failure():
+    cb = ChadoBuilder()
+    indexes,foreign_keys = _get_bulk_load_state( cb )
+    
+    with pytest.raises(Exception, match="loading failed"):
+        with cb.bulk_load():
+            raise Exception("loading failed")
+            
+    # indexes are restored, foreign keys are added again without checking rows
+    assert _get_bulk_load_state( cb ) == (indexes, {(n,False) for n,v in foreign_keys})
+    
+    # a later bulk load checks the rows again
+    with cb.bulk_load():
+        pass
+    assert _get_bulk_load_state( cb ) == (indexes,foreign_keys)
+    
+        
+def test_get_tfome_staging_data():
+    df = pd.DataFrame(data={
+        "utname": ["pUT1","pUT2","pUT3"],
+        "gene_id": ["GRMZM2G000001","","AC1234_FG002"],
+        "transcript_number": ["T01","T02","T03"],
+        "sequence": ["ACGT","","AAA"],
+        "translation": ["M","MK",""],
+    })
+    seq_df,frel_df = _get_tfome_staging_data( df )
+    
+    assert list(seq_df["uniquename"]) == ["pUT1","pUT1_P","pUT2","pUT2_P","pUT3","pUT3_P"]
+    assert list(seq_df["seqlen"]) == [4,1,0,2,3,0]
+    assert seq_df["md5checksum"].values[0] == "f1f8f4bf413b16ad135722aa4591043e"
+    assert list(seq_df["is_protein"]) == [False,True] * 3
+    assert list(frel_df["gt_name"]) == ["GRMZM2G000001_T01","","AC1234_FGT03"]
@@ -0,0 +1,45 @@
+# local imports
+from gdb.hmmer import FamilyRuleEngine, categorize_all_transcripts, find_matching_transcripts
+
+
+import pandas as pd
+
+
+def _get_sample_criteria():
+    return pd.DataFrame(data={
+        "GRASSIUS": ["MYB","MYB-related","MYB","bHLH"],
+        "Required": ["PF00249#2","PF00249#1","PF00249#1:PF00010#1","PF00010#1"],
+        "Forbidden": ["","PF00010#1","","PF00249#1:PF00096#1"],
+    })
+
+
+def test_categorize_all_transcripts():
+    acc_dict = {
+        "t1": ["PF00249","PF00249"],
+        "t2": ["PF00249"],
+        "t3": ["PF00249","PF00010"],
+        "t4": ["PF00010"],
+        "t5": ["PF00010","PF00096"],
+        "t6": [],
+    }
+    result = categorize_all_transcripts( acc_dict, _get_sample_criteria() )
+    assert result == {
+        "MYB": ["t1","t3"],
+        "MYB-related": ["t1","t2"],
+        "bHLH": ["t4"],
+    }
+
+
+def test_rule_engine_matches_per_rule_evaluation():
+    df = _get_sample_criteria()
+    engine = FamilyRuleEngine(df)
+    acc_dict = {
+        f"t{i}": ["PF00249","PF00010","PF00096","PF00249"][:i%5]
+        for i in range(20)
+    }
+    for rule_index,row in enumerate(df.index):
+        expected = find_matching_transcripts( acc_dict,
+                        df.loc[row,"Required"].split(":"), df.loc[row,"Forbidden"].split(":") )
+        result = [tid for tid,accs in acc_dict.items() 
+                  if rule_index in engine.get_matching_rules(accs)]
+        assert result == expected
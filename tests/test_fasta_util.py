@@ -0,0 +1,69 @@
+# local imports
+from gdb.fasta import split_fasta, write_unique_sequences, expand_unique_sequence_results, get_all_gene_ids, GeneVersionIndex
+
+
+import os
+import tempfile
+import pandas as pd
+
+
+def test_split_fasta():
+    folder = tempfile.mkdtemp()
+    path = os.path.join(folder,"input.fa")
+    text = "".join( f">t{i} gene:g{i}\n{'M'*60}\n{'A'*(10*i)}\n" for i in range(10) )
+    with open(path,"w") as fout:
+        fout.write(text)
+
+    shard_paths = split_fasta( path, 3, folder )
+    assert len(shard_paths) == 3
+
+    # shards are balanced and concatenate back to the original file
+    shard_texts = [open(p).read() for p in shard_paths]
+    assert "".join(shard_texts) == text
+    sizes = [len(s) for s in shard_texts]
+    assert max(sizes) < 2*min(sizes)
+
+
+def test_unique_sequences():
+    folder = tempfile.mkdtemp()
+    path = os.path.join(folder,"input.fa")
+    with open(path,"w") as fout:
+        fout.write(">t1 gene:g1\nMKV\nLL\n>t2 gene:g1\nMKVLL\n>t3 gene:g2\nMAA\n>t4 gene:g3\nMKVLL\n")
+
+    unique_path = os.path.join(folder,"unique.fa")
+    sequence_map = write_unique_sequences( path, unique_path )
+    assert open(unique_path).read() == ">t1 gene:g1\nMKV\nLL\n>t3 gene:g2\nMAA\n"
+    assert list(sequence_map["representative_id"]) == ["t1","t1","t3","t1"]
+
+    # results for representatives are copied to all records, in original order
+    df = pd.DataFrame(data={
+        "transcript_id": ["t3","t1","t1"],
+        "family": ["A","B","C"],
+    })
+    result = expand_unique_sequence_results( df, "transcript_id", sequence_map )
+    assert list(result["transcript_id"]) == ["t1","t1","t2","t2","t3","t4","t4"]
+    assert list(result["family"]) == ["B","C","B","C","A","B","C"]
+
+
+def test_gene_version_index():
+    folder = tempfile.mkdtemp()
+    fasta_paths = {}
+    for version,header in [
+            ("v3","GRMZM2G000001_P01 gene:GRMZM2G000001 transcript:GRMZM2G000001_T01"),
+            ("v4","Zm00001d000001_P001 gene:Zm00001d000001"),
+            ("v5","Zm00001eb000010_P001 description"),
+            ("v9","other_P1 gene:other_gene")]:
+        fasta_paths[version] = os.path.join(folder,f"{version}.fa")
+        with open(fasta_paths[version],"w") as fout:
+            fout.write(f">{header}\nMAAA\n")
+
+    for i in range(2):
+        # second iteration loads a cached index
+        index = GeneVersionIndex(fasta_paths)
+        assert get_all_gene_ids(fasta_paths["v4"]) <= set(index.keys())
+        assert index["GRMZM2G000001"] == "v3"
+        assert index["Zm00001d999999"] == "v4"
+        assert index["Zm00001eb000010"] == "v5"
+        assert index["other_gene"] == "v9"
+        assert index.get("unknown") is None
+        assert "unknown" not in index
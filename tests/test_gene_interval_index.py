@@ -0,0 +1,55 @@
+# local imports
+from gdb import GeneIntervalIndex
+from gdb.blast import BlastResult, annotate_blast_result
+
+
+import pandas as pd
+
+
+def _get_sample_gff_data():
+    """
+    build a dataframe similar to the output from gdb.load_gene_annotations()
+    """
+    return pd.DataFrame(data={
+        "chrom": ["chr1","chr1","chr1","chr2"],
+        "type": ["gene"] * 4,
+        "start": [100,500,450,100],
+        "end": [200,900,550,200],
+        "identifiers": ["ID=geneA;x=1","ID=geneB","ID=geneC;","ID=geneD"],
+    })
+
+
+def test_containment():
+    index = GeneIntervalIndex(_get_sample_gff_data())
+    result = index.get_matching_gene_ids(
+        ["chr1","chr1","chr2"], [120,600,50], [180,700,300])
+    assert list(result) == ["geneA","geneB","geneD"]
+
+
+def test_partial_overlap():
+    """
+    partial overlaps are used when there is no containment
+    """
+    index = GeneIntervalIndex(_get_sample_gff_data())
+    result = index.get_matching_gene_ids(
+        ["chr1","chr1","chr1","chr3"], [50,880,300,1], [110,1000,400,10])
+    assert list(result) == ["geneA","geneB","",""]
+
+
+def test_overlap_queries():
+    index = GeneIntervalIndex(_get_sample_gff_data())
+    assert index.get_overlapping_gene_ids("chr1", 520, 530) == ["geneB","geneC"]
+    assert index.get_containing_gene_ids("chr1", 520, 530) == ["geneB","geneC"]
+    assert index.get_containing_gene_ids("chr1", 400, 530) == []
+
+
+def test_annotate_blast_result():
+    data = pd.DataFrame(data={
+        "Chrom": ["chr1","chr2"],
+        "Start_Pos": [150,1000],
+        "Stop_Pos": [160,1100],
+        "Identities%": [95,90],
+    })
+    blast_result = BlastResult("",data,"")
+    annotate_blast_result( blast_result, _get_sample_gff_data() )
+    assert list(blast_result.data["Gene ID"]) == ["geneA",""]
@@ -0,0 +1,90 @@
+# local imports
+from gdb import InputManager
+from gdb.hmmer import read_hmmscan_output, iter_hmmscan_output, get_filtered_hmmscan_result, get_acc_dict, HmmscanResult, get_accessions, build_minified_hmm, run_hmmscan_sharded
+
+
+import os
+import tempfile
+import pandas as pd
+
+
+def test_read_hmmscan_output():
+    path = InputManager()["hmmer_output_example"]
+    result = read_hmmscan_output(path)
+    df = result.data
+
+    assert len(df.index) == 2
+    assert list(df["accession"]) == ["PF00249","PF00249"]
+    assert list(df["query name"]) == ["GRMZM2G005066"] * 2
+    assert list(df["ali_from"]) == [14,74]
+    assert df["fs_score"].dtype == "float64"
+    assert "# Program:         hmmscan" in result.footer
+
+
+def test_iter_hmmscan_output():
+    path = InputManager()["hmmer_output_example"]
+    chunks = list(iter_hmmscan_output(path, chunksize=1))
+
+    assert len(chunks) == 2
+    df = pd.concat([c.data for c in chunks], ignore_index=True)
+    pd.testing.assert_frame_equal( df, read_hmmscan_output(path).data )
+
+
+def _get_sample_hmmscan_result():
+    """
+    build a small hmmscan result with one low-scoring row
+    """
+    df = pd.DataFrame(data={
+        "query name": ["t1","t1","t2","t3"],
+        "accession": ["PF00249","PF00096","PF00096","PF00010.3"],
+        "fs_score": [101.3,5.0,8.0,1.0],
+    })
+    return HmmscanResult(df, "")
+
+
+def test_get_filtered_hmmscan_result():
+    result = get_filtered_hmmscan_result( _get_sample_hmmscan_result() )
+    assert list(result.data.index) == [0,2,3]
+
+
+def test_get_acc_dict():
+    result = get_filtered_hmmscan_result( _get_sample_hmmscan_result() )
+    assert get_acc_dict(result) == {
+        "t1": ["PF00249"],
+        "t2": ["PF00096"],
+        "t3": ["PF00010"],
+    }
+
+
+def test_get_acc_dict_chunks():
+    df = _get_sample_hmmscan_result().data
+    chunks = [HmmscanResult(df.iloc[:1], None), HmmscanResult(df.iloc[1:], None)]
+    result = get_acc_dict( get_filtered_hmmscan_result(iter(chunks)) )
+    assert result == get_acc_dict( get_filtered_hmmscan_result(_get_sample_hmmscan_result()) )
+
+
+def test_build_minified_hmm():
+    path = InputManager()["selfbuild_hmm"]
+    all_accessions = get_accessions(path)
+    assert len(all_accessions) == 16
+
+    subset = all_accessions[3:6]
+    output_path = os.path.join(tempfile.mkdtemp(), "min.hmm")
+    build_minified_hmm( path, subset, output_path )
+    assert get_accessions(output_path, save_index=False) == subset
+
+    # models are copied unchanged
+    with open(output_path) as fin:
+        text = fin.read()
+    assert text.startswith("HMMER3/f")
+    assert text in open(path).read()
+
+
+def test_run_hmmscan_sharded_empty_fasta():
+    folder = tempfile.mkdtemp()
+    fasta_path = os.path.join(folder, "empty.fa")
+    open(fasta_path, "w").close()
+
+    # no hmmscan process is started when there are no sequences
+    result = run_hmmscan_sharded( "unused.hmm", fasta_path, n_shards=4 )
+    assert len(result.data.index) == 0
@@ -6,4 +6,11 @@ def test_constructor():
 
 #def test_prepare_all_inputs():
 #    im = InputManager()
-#    im.prepare_all_inputs()
\ No newline at end of file
+#    im.prepare_all_inputs()
+def test_set_override():
+    InputManager.set_override( "old_grassius_names", "synthetic.xlsx" )
+    try:
+        assert InputManager()["old_grassius_names"] == "synthetic.xlsx"
+    finally:
+        InputManager.set_override( "old_grassius_names", None )
+    assert "old_grassius_names" not in InputManager.overrides.keys()
@@ -0,0 +1,59 @@
+# local imports
+from gdb.instrumentation import span, instrument, add_rows, write_report, get_finished_spans, clear_finished_spans
+
+
+import os
+import json
+import tempfile
+
+
+@instrument()
+def _count_to( n ):
+    for i in range(n):
+        add_rows(1)
+    return n
+
+
+def test_spans():
+    clear_finished_spans()
+    with span("outer") as s:
+        assert _count_to(100) == 100
+        s.add_rows(5)
+    add_rows(1) # no effect outside of spans
+
+    inner,outer = get_finished_spans()
+    assert inner.path == "outer/_count_to"
+    assert inner.rows == 100
+    assert outer.path == "outer"
+    assert outer.rows == 5
+    assert outer.wall_time >= inner.wall_time
+    assert outer.cpu_time >= 0
+
+
+def test_write_report():
+    clear_finished_spans()
+    _count_to(10)
+    path = os.path.join(tempfile.mkdtemp(), "report.json")
+    write_report(path)
+
+    with open(path) as fin:
+        report = json.load(fin)
+    assert len(report["spans"]) == 1
+    entry = report["spans"][0]
+    assert entry["name"] == "_count_to"
+    assert entry["rows"] == 10
+    assert entry["rows_per_second"] > 0
+    assert entry["peak_rss_mb"] > 0
+
+
+def test_repeated_spans():
+    clear_finished_spans()
+    for i in range(1000):
+        _count_to(2)
+
+    # repeated calls are combined into one span
+    spans = get_finished_spans()
+    assert len(spans) == 1
+    assert spans[0].count == 1000
+    assert spans[0].rows == 2000
+    assert spans[0].to_dict()["count"] == 1000
@@ -0,0 +1,97 @@
+# local imports
+from gdb.itak import read_itak_output, merge_itak_outputs, get_gene_families, resolve_transcript_families
+
+
+import os
+import pytest
+import tempfile
+import pandas as pd
+
+
+def _write_itak_output( folder, all_matches, classification ):
+    """
+    write files in the same format as a (modified) iTAK output folder
+    """
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder,"tf_all_matches.txt"),"w") as fout:
+        fout.write("".join(f"{tid}\t{fam}\n" for tid,fam in all_matches))
+    with open(os.path.join(folder,"tf_classification.txt"),"w") as fout:
+        fout.write("".join(f"{tid}\t{fam}\n" for tid,fam in classification))
+
+
+def test_merge_itak_outputs():
+    folder = tempfile.mkdtemp()
+    shard_folders = [os.path.join(folder,f"shard{i}") for i in range(2)]
+    _write_itak_output( shard_folders[0], [("t1","MYB"),("t1","ARR-B")], [("t1","MYB")] )
+    _write_itak_output( shard_folders[1], [("t2","bHLH")], [("t2","bHLH")] )
+
+    merged_folder = os.path.join(folder,"merged")
+    merge_itak_outputs( shard_folders, merged_folder )
+    df = read_itak_output( merged_folder )
+
+    assert list(df["transcript_id"]) == ["t1","t1","t2"]
+    assert list(df["family"]) == ["MYB","ARR-B","bHLH"]
+    assert list(df["final"]) == [True,False,True]
+
+
+def test_merge_itak_outputs_missing_file():
+    folder = tempfile.mkdtemp()
+    shard_folders = [os.path.join(folder,f"shard{i}") for i in range(2)]
+    _write_itak_output( shard_folders[0], [("t1","MYB")], [("t1","MYB")] )
+    _write_itak_output( shard_folders[1], [("t2","bHLH")], [("t2","bHLH")] )
+    os.remove( os.path.join(shard_folders[1],"tf_classification.txt") )
+
+    # a missing file means that one iTAK run failed
+    with pytest.raises(Exception):
+        merge_itak_outputs( shard_folders, os.path.join(folder,"merged") )
+
+
+def test_read_itak_output():
+    folder = tempfile.mkdtemp()
+    _write_itak_output( folder, 
+        [("t1","MYB"),("t1","MYB-related"),("t2","bHLH"),("t3","NAC")], 
+        [("t1","MYB-related"),("t2","bHLH")] )
+    df = read_itak_output( folder )
+
+    assert list(df["transcript_id"]) == ["t1","t1","t2","t3"]
+    assert list(df["final"]) == [False,True,True,False]
+
+
+def test_read_itak_output_empty():
+    folder = tempfile.mkdtemp()
+    _write_itak_output( folder, [], [] )
+    df = read_itak_output( folder )
+
+    assert len(df.index) == 0
+    assert list(df.columns) == ["transcript_id","family","final"]
+
+
+def test_resolve_transcript_families():
+    itak_results = pd.DataFrame( columns=["transcript_id","family"], data=[
+        ("t1","bHLH"), ("t1","MYB"),         # priority family
+        ("t2","ARR-B"), ("t2","MYB"),        # special case
+        ("t3","ARR-B"), ("t3","MYB"),        # special case does not apply
+        ("t4","NAC"), ("t4","bHLH"),         # first listed family
+    ])
+    transcript_genes = {"t1":"g1", "t2":"g2", "t3":"g3", "t4":"g4"}
+    result = resolve_transcript_families( itak_results, transcript_genes, 
+                        priority_families=["AP2/ERF-AP2","MYB"],
+                        special_cases={"ARR-B":["g2"]} )
+
+    assert result == {"t1":"MYB", "t2":"ARR-B", "t3":"MYB", "t4":"NAC"}
+
+
+def test_get_gene_families():
+    transcript_families = {"t1":"MYB", "t2":"MYB", "t3":"bHLH", "t4":"NAC", "t5":"bHLH"}
+    transcript_genes = {"t1":"g1", "t2":"g1", "t3":"g2", "t4":"g1", "t5":"g3"}
+    report_path = os.path.join(tempfile.mkdtemp(), "conflicts.txt")
+    df = get_gene_families( transcript_families, transcript_genes, report_path )
+
+    assert list(df.index) == ["g1","g2","g3"]
+    assert list(df["family"]) == ["MYB","bHLH","bHLH"]
+    assert list(df["transcript_id"]) == ["t1","t3","t5"]
+    with open(report_path) as fin:
+        assert fin.read() == "".join([
+            "1 pairs of transcripts had conflicting families\n\n",
+            "conflict:\n\ttranscript t1 has family MYB\n\ttranscript t4 has family NAC\n",
+        ])
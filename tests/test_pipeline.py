@@ -0,0 +1,174 @@
+# local imports
+from gdb import Pipeline
+from gdb.util import get_cache_folder
+
+
+import os
+import time
+import uuid
+import shutil
+import tempfile
+import linecache
+import importlib.util
+import pytest
+
+
+def _build_pipeline( input_path, calls ):
+    """
+    build a small pipeline that records which stages were run
+    """
+    pipeline = Pipeline( "test_" + uuid.uuid4().hex )
+    pipeline.add_file( "numbers_file", input_path )
+    pipeline.add_value( "factor", 10 )
+
+    @pipeline.stage()
+    def numbers( numbers_file ):
+        calls.append("numbers")
+        with open(numbers_file) as fin:
+            return [int(x) for x in fin.read().split()]
+
+    @pipeline.stage()
+    def total( numbers ):
+        calls.append("total")
+        return sum(numbers)
+
+    @pipeline.stage()
+    def scaled( numbers, factor ):
+        calls.append("scaled")
+        return [x*factor for x in numbers]
+
+    @pipeline.stage( inputs=["total","scaled"] )
+    def report( t, s ):
+        calls.append("report")
+        return f"{t} {s}"
+
+    return pipeline
+
+
+def test_pipeline_cache():
+    folder = tempfile.mkdtemp()
+    input_path = os.path.join(folder,"numbers.txt")
+    with open(input_path,"w") as fout:
+        fout.write("1 2 3")
+
+    calls = []
+    pipeline = _build_pipeline( input_path, calls )
+    try:
+        assert pipeline.run(["report"]) == {"report":"6 [10, 20, 30]"}
+        assert sorted(calls) == ["numbers","report","scaled","total"]
+
+        # nothing changed, so nothing is run
+        calls.clear()
+        assert pipeline.run(["report","total"]) == {"report":"6 [10, 20, 30]", "total":6}
+        assert calls == []
+
+        # the input changed, but the total did not
+        with open(input_path,"w") as fout:
+            fout.write("3 2 1")
+        calls.clear()
+        assert pipeline.run(["report"]) == {"report":"6 [30, 20, 10]"}
+        assert sorted(calls) == ["numbers","report","scaled","total"]
+        calls.clear()
+        pipeline.run(["report"], force=["total"])
+        assert calls == ["total"]
+    finally:
+        shutil.rmtree( get_cache_folder("pipeline_" + pipeline.name) )
+
+
+def test_pipeline_parallel():
+    pipeline = Pipeline( "test_" + uuid.uuid4().hex )
+
+    @pipeline.stage( cache=False )
+    def a():
+        time.sleep(0.5)
+        return 1
+
+    @pipeline.stage( cache=False )
+    def b():
+        time.sleep(0.5)
+        return 2
+
+    @pipeline.stage( cache=False )
+    def c( a, b ):
+        return a+b
+
+    start = time.time()
+    assert pipeline.run(["c"]) == {"c":3}
+    assert time.time() - start < 0.9
+    shutil.rmtree( get_cache_folder("pipeline_" + pipeline.name) )
+
+
+def test_pipeline_errors():
+    pipeline = Pipeline( "test_" + uuid.uuid4().hex )
+    pipeline.add_stage( "a", lambda b: b )
+    pipeline.add_stage( "b", lambda a: a )
+    with pytest.raises(Exception, match="depends on itself"):
+        pipeline.run(["a"])
+    with pytest.raises(Exception, match="already contains"):
+        pipeline.add_value( "a", 1 )
+    with pytest.raises(Exception, match="unrecognized"):
+        pipeline.run(["missing"])
+
+
+def test_pipeline_depends():
+    folder = tempfile.mkdtemp()
+    module_path = os.path.join(folder, "pipeline_test_lib.py")
+    with open(module_path,"w") as fout:
+        fout.write("def f():\n    return 1\n")
+    spec = importlib.util.spec_from_file_location("pipeline_test_lib", module_path)
+    lib = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(lib)
+
+    calls = []
+    pipeline = Pipeline( "test_" + uuid.uuid4().hex )
+
+    @pipeline.stage( depends=[lib] )
+    def a():
+        calls.append("a")
+        return 1
+
+    @pipeline.stage()
+    def b():
+        calls.append("b")
+        return 2
+
+    try:
+        pipeline.run()
+        assert sorted(calls) == ["a","b"]
+
+        # only the stage that depends on the changed code is re-run
+        with open(module_path,"w") as fout:
+            fout.write("def f():\n    return 2\n")
+        linecache.clearcache()
+        calls.clear()
+        pipeline.run()
+        assert calls == ["a"]
+    finally:
+        shutil.rmtree( get_cache_folder("pipeline_" + pipeline.name) )
+
+
+def test_pipeline_outputs():
+    folder = tempfile.mkdtemp()
+    report_path = os.path.join(folder, "report.txt")
+    calls = []
+    pipeline = Pipeline( "test_" + uuid.uuid4().hex )
+
+    @pipeline.stage( outputs=[report_path] )
+    def a():
+        calls.append("a")
+        with open(report_path,"w") as fout:
+            fout.write("report")
+        return 1
+
+    try:
+        pipeline.run()
+        os.remove(report_path)
+
+        # the report is written again when the stage is skipped
+        calls.clear()
+        assert pipeline.run() == {"a":1}
+        assert calls == []
+        with open(report_path) as fin:
+            assert fin.read() == "report"
+    finally:
+        shutil.rmtree( get_cache_folder("pipeline_" + pipeline.name) )